@@ -1,24 +1,335 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from tkinter.messagebox import askyesno
-import json
+import argparse
+import bisect
+import heapq
+import multiprocessing
 import os
+import queue
+import time
 from datetime import datetime, timedelta
 import threading
-import time
+
+from todo_engine import (FILTERS, SORT_KEYS, STORAGE_ERRORS, AsyncStorage,
+                         ChangeTracker, MappedTasks, Priority, Probes, ReminderScheduler,
+                         Recurrence, SearchIndex, SortedOrders, Task, TaskArchive,
+                         TaskCounters, Workspace, bulk_format, completion_changes,
+                         content_hashes, convert_task_file, deadline_changes, export_tasks,
+                         matches_filter, open_storage, parse_deadline, read_import,
+                         task_fields, time_remaining, time_remaining_until)
+
+
+# Column heading -> SORT_KEYS order; the ID column sorts by creation time
+SORT_COLUMNS = {'ID': 'created', 'Priority': 'priority', 'Deadline': 'deadline',
+                'Status': 'urgency', 'Time Left': 'urgency'}
+# Repeat choices in the add form -> Recurrence unit
+REPEAT_UNITS = {'Never': None, 'Days': 'day', 'Weeks': 'week', 'Months': 'month'}
+PATCH_LIMIT = 200  # above this many changed rows, redraw the list instead
+ARCHIVE_AFTER_DAYS = 30  # completed tasks older than this move to the archive
+POLL_INTERVAL = 1000  # ms between checks for changes other programs saved
+# Import/export pools start fresh interpreters: forking would copy the Tk
+# and worker threads' locks in whatever state they happen to be
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+BULK_FILETYPES = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.ndjson"),
+                  ("iCalendar", "*.ics"), ("All files", "*.*")]
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+
+class VirtualTaskList:
+    """Render a long task sequence into a Treeview one viewport at a time.
+
+    The full filtered result is kept in ``rows`` as task ids, ordered by a
+    sort key, and ``get_task`` looks a task up again when its row is drawn,
+    so the list holds no task objects of its own. Only the rows in view
+    plus ``overscan`` rows either side exist as
+    Treeview items. The tree scrolls natively within that window, and the
+    window is re-centred whenever the view nears one of its edges. The
+    vertical scrollbar maps onto the whole sequence, so redraw cost depends
+    on the window height, not on the number of tasks.
+
+    ``upsert_row`` and ``remove_row`` patch single rows in place, keeping
+    the selection and the rows in view where they are.
+    """
+
+    def __init__(self, tree, scrollbar, format_row, get_task, overscan=20):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.format_row = format_row
+        self.get_task = get_task
+        self.overscan = overscan
+        self.sort_key = lambda task: task.id
+        self.rows = []
+        self.keys = []      # sort keys parallel to rows, for bisect
+        self.row_keys = {}  # task id -> sort key the row was placed with
+        self.offset = 0     # index of the first row in view
+        self.start = 0      # index of the first materialized row
+        self.rendered = []  # ids of the materialized rows, in order
+        self.selected_ids = set()
+        self.pending_render = None
+
+        scrollbar.configure(command=self.yview)
+        tree.configure(yscrollcommand=self.on_tree_scroll)
+        tree.bind('<Configure>', lambda e: self.render(), add='+')
+        tree.bind('<<TreeviewSelect>>', self.on_select, add='+')
+        tree.bind('<ButtonPress-1>', self.on_click, add='+')
+
+    def visible_rows(self):
+        """Return how many rows fit in the tree at its current size."""
+        style = self.tree.cget('style') or 'Treeview'
+        rowheight = int(ttk.Style().lookup(style, 'rowheight') or 20)
+        return max(1, self.tree.winfo_height() // rowheight)
+
+    def row_key(self, task):
+        return (self.sort_key(task), task.id)
+
+    def set_rows(self, entries, sort_key=None):
+        """Replace the rows, keeping the scroll position if possible.
+
+        ``entries`` are ``(sort_key(task), task.id)`` pairs already in
+        order, as ``SortedOrders`` keeps them.
+        """
+        if sort_key is not None:
+            self.sort_key = sort_key
+        self.keys = list(entries)
+        self.rows = [task_id for _, task_id in self.keys]
+        self.row_keys = dict(zip(self.rows, self.keys))
+        self.selected_ids.intersection_update(self.row_keys)
+        self.render()
+
+    def selection(self):
+        """Return the ids of the selected tasks, including rows out of view."""
+        shown = [int(iid) for iid in self.tree.selection()]
+        return shown + sorted(self.selected_ids.difference(shown))
+
+    def select_all(self):
+        """Select every row, including those out of view."""
+        self.selected_ids = set(self.row_keys)
+        self.tree.selection_set([str(i) for i in self.rendered])
+
+    def render(self):
+        """Materialize the rows around the current offset."""
+        self.pending_render = None
+        total = len(self.rows)
+        visible = self.visible_rows()
+        self.offset = max(0, min(self.offset, total - visible))
+        start = max(0, self.offset - self.overscan)
+        end = min(total, self.offset + visible + self.overscan)
+
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.rendered = []
+        for task_id in self.rows[start:end]:
+            task = self.get_task(task_id)
+            # A task removed a moment ago keeps its row until the patch arrives
+            values = self.format_row(task) if task is not None else (task_id,)
+            self.tree.insert('', 'end', iid=str(task_id), values=values)
+            self.rendered.append(task_id)
+        self.start = start
+
+        self.tree.selection_set([str(i) for i in self.rendered if i in self.selected_ids])
+        self.scroll_to_offset()
+        self.update_scrollbar(visible)
+
+    def scroll_to_offset(self):
+        if self.rendered:
+            self.tree.yview_moveto((self.offset - self.start) / len(self.rendered))
+
+    def remove_row(self, task_id):
+        """Drop a task's row if present."""
+        key = self.row_keys.pop(task_id, None)
+        if key is None:
+            return
+        i = bisect.bisect_left(self.keys, key)
+        del self.keys[i]
+        del self.rows[i]
+
+        if i < self.start:
+            self.start -= 1
+        elif i < self.start + len(self.rendered):
+            del self.rendered[i - self.start]
+            self.tree.delete(str(task_id))
+        self.selected_ids.discard(task_id)
+        if i < self.offset:
+            self.offset -= 1
+
+    def upsert_row(self, task):
+        """Insert a task's row, or move and redraw it if already present."""
+        key = self.row_key(task)
+        if self.row_keys.get(task.id) == key:
+            if task.id in self.rendered:
+                self.tree.item(str(task.id), values=self.format_row(task))
+            return
+
+        selected = task.id in self.selected_ids
+        self.remove_row(task.id)
+        if selected:
+            self.selected_ids.add(task.id)
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.rows.insert(i, task.id)
+        self.row_keys[task.id] = key
+
+        if i < self.start or (i == self.start and self.start > 0):
+            self.start += 1
+        elif i <= self.start + len(self.rendered):
+            self.rendered.insert(i - self.start, task.id)
+            self.tree.insert('', i - self.start, iid=str(task.id),
+                             values=self.format_row(task))
+            if task.id in self.selected_ids:
+                self.tree.selection_add(str(task.id))
+        if i < self.offset:
+            self.offset += 1
+
+    def finish_patch(self):
+        """Restore the view after a round of row patches."""
+        visible = self.visible_rows()
+        end = self.start + len(self.rendered)
+        uncovered = (self.offset < self.start or
+                     (self.offset + visible > end and end < len(self.rows)))
+        if uncovered or len(self.rendered) > visible + 4 * self.overscan:
+            self.render()
+            return
+        self.scroll_to_offset()
+        self.update_scrollbar(visible)
+
+    def update_scrollbar(self, visible):
+        total = len(self.rows)
+        if total <= visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + visible) / total)
+
+    def on_tree_scroll(self, first, last):
+        """Track native tree scrolling and re-centre near the window edges."""
+        count = len(self.rendered)
+        if not count:
+            self.scrollbar.set(0, 1)
+            return
+
+        visible = self.visible_rows()
+        top = int(round(float(first) * count))
+        self.offset = self.start + top
+        self.update_scrollbar(visible)
+
+        margin = self.overscan // 2
+        near_top = top < margin and self.start > 0
+        near_bottom = (count - top - visible < margin and
+                       self.start + count < len(self.rows))
+        if (near_top or near_bottom) and self.pending_render is None:
+            self.pending_render = self.tree.after_idle(self.render)
+
+    def yview(self, *args):
+        """Scrollbar command: jumps re-render, steps scroll natively."""
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.rows))
+            self.render()
+        else:
+            self.tree.yview(*args)
+
+    def on_click(self, event):
+        """A plain click starts a new selection, dropping rows out of view."""
+        if not event.state & (SHIFT_MASK | CONTROL_MASK):
+            self.selected_ids = set()
+
+    def on_select(self, event=None):
+        """Remember selected ids so they survive rows being swapped out."""
+        rendered = set(self.rendered)
+        shown = {int(iid) for iid in self.tree.selection()}
+        if str(self.tree.cget('selectmode')) == 'browse' and shown:
+            self.selected_ids = shown
+        else:
+            self.selected_ids = {i for i in self.selected_ids if i not in rendered} | shown
+
+
+class TimeLabelCache:
+    """Memoized deadline and "time left" strings for the task list.
+
+    Each cached label is filed in a bucket for the minute after it next
+    changes, so a once-a-minute tick only has to look at the rows whose
+    text is actually due to flip.
+    """
+
+    def __init__(self):
+        self.labels = {}     # task id -> (deadline, label, changes_at)
+        self.deadlines = {}  # task id -> (deadline, "%m/%d %H:%M" text)
+        self.buckets = {}    # minute -> ids whose label changes before it
+        self.minutes = []    # heap of bucket minutes
+
+    def deadline_text(self, task):
+        cached = self.deadlines.get(task.id)
+        if cached is None or cached[0] != task.deadline:
+            text = task.deadline.strftime("%m/%d %H:%M") if task.deadline else ''
+            cached = self.deadlines[task.id] = (task.deadline, text)
+        return cached[1]
+
+    def time_left(self, task, now):
+        if not task.deadline:
+            return ""
+        cached = self.labels.get(task.id)
+        if cached is not None and cached[0] == task.deadline and now <= cached[2]:
+            return cached[1]
+
+        label, changes_at = time_remaining_until(task.deadline, now)
+        self.labels[task.id] = (task.deadline, label, changes_at)
+        self.file(task.id, changes_at)
+        return label
+
+    def file(self, task_id, changes_at):
+        """Put a label in the bucket of the first minute after it changes."""
+        minute = changes_at.replace(second=0, microsecond=0)
+        if minute < changes_at:
+            minute += timedelta(minutes=1)
+        if minute not in self.buckets:
+            self.buckets[minute] = set()
+            heapq.heappush(self.minutes, minute)
+        self.buckets[minute].add(task_id)
+
+    def due(self, now):
+        """Return ``{task_id: old_label}`` for labels that changed by ``now``."""
+        changed = {}
+        later = []
+        while self.minutes and self.minutes[0] <= now:
+            for task_id in self.buckets.pop(heapq.heappop(self.minutes)):
+                cached = self.labels.get(task_id)
+                if cached is None:
+                    continue
+                if cached[2] < now:
+                    changed[task_id] = self.labels.pop(task_id)[1]
+                else:
+                    later.append((task_id, cached[2] + timedelta(microseconds=1)))
+        for task_id, changes_at in later:
+            self.file(task_id, changes_at)
+        return changed
+
 
 class TodoGUI:
-    def __init__(self, root):
+    def __init__(self, root, filename="todos_gui.json", probes=False, mapped=False,
+                 memory_budget=256, open_lists=4):
         self.root = root
-        self.root.title("📝 Advanced To-Do List Manager")
         self.root.geometry("900x700")
         self.root.configure(bg='#f0f0f0')
         
-        # Data management
-        self.filename = "todos_gui.json"
-        self.todos = self.load_todos()
+        # Data management (worker threads reach the UI only via ui_queue)
+        self.ui_queue = queue.Queue()
+        self.mapped = mapped
+        # Timing probes only wrap anything when enabled (--probes)
+        self.probes = Probes(enabled=probes)
+        self.probes.instrument(self, ['filter_tasks', 'refresh_task_list', 'apply_changes',
+                                      'update_task_count', 'check_reminders', 'receive_tasks'])
+        # Each named list is its own task file; only recently used ones stay loaded
+        self.workspace = Workspace(os.path.splitext(filename)[0] + ".lists.json", filename,
+                                   make_storage=self.make_storage,
+                                   budget=memory_budget << 20, max_open=open_lists)
+        self.perf_panel = None
+        self.sort_order = 'urgency'
+        self.search_job = None
+        self.load_refresh_job = None
+        self.editable = False  # set once the loader reports 'ready'
         self.running = True
-        self.reminder_thread = None
+        self.bind_list(self.workspace.active)
         
         # Color scheme
         self.colors = {
@@ -33,8 +344,13 @@ class TodoGUI:
         
         self.setup_styles()
         self.create_widgets()
-        self.refresh_task_list()
+        self.probes.instrument(self.task_list, ['set_rows', 'render'], prefix='tree:')
+        self.set_sort_order(self.sort_order)
         self.start_reminder_system()
+        self.load_todos()
+        self.process_ui_queue()
+        self.schedule_tick()
+        self.root.after(POLL_INTERVAL, self.poll_file_changes)
         
         # Handle window closing
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -50,7 +366,7 @@ class TodoGUI:
         style.configure('Priority.High.TLabel', foreground='#e74c3c', font=('Arial', 10, 'bold'))
         style.configure('Priority.Medium.TLabel', foreground='#f39c12', font=('Arial', 10, 'bold'))
         style.configure('Priority.Low.TLabel', foreground='#27ae60', font=('Arial', 10, 'bold'))
-        style.configure('Custom.Treeview', font=('Arial', 10))
+        style.configure('Custom.Treeview', font=('Arial', 10), rowheight=22)
         style.configure('Custom.Treeview.Heading', font=('Arial', 11, 'bold'))
     
     def create_widgets(self):
@@ -140,6 +456,19 @@ class TodoGUI:
         tk.Button(quick_frame, text="1 Week", command=lambda: self.set_quick_deadline("week"),
                  font=('Arial', 8), bg='#ecf0f1').pack(side='left', padx=1)
         
+        # Repeat rule; a recurring task is stored once and moves on when completed
+        repeat_frame = tk.Frame(deadline_frame, bg='#f0f0f0')
+        repeat_frame.pack(fill='x', padx=5, pady=2)
+        
+        tk.Label(repeat_frame, text="Repeat every", bg='#f0f0f0').pack(side='left')
+        self.repeat_interval = tk.Spinbox(repeat_frame, from_=1, to=99, width=3,
+                                          font=('Arial', 9))
+        self.repeat_interval.pack(side='left', padx=(5, 0))
+        self.repeat_var = tk.StringVar(value="Never")
+        ttk.Combobox(repeat_frame, textvariable=self.repeat_var,
+                     values=list(REPEAT_UNITS), state="readonly",
+                     font=('Arial', 9), width=7).pack(side='left', padx=(5, 0))
+        
         # Add task button
         add_button = tk.Button(parent, text="➕ Add Task", command=self.add_task,
                               font=('Arial', 11, 'bold'), bg='#3498db', fg='white',
@@ -154,6 +483,26 @@ class TodoGUI:
     
     def create_task_list_section(self, parent):
         """Create the task list section."""
+        # List switcher
+        list_frame = tk.Frame(parent, bg='#f0f0f0')
+        list_frame.pack(fill='x', pady=(0, 5))
+        
+        tk.Label(list_frame, text="List:", font=('Arial', 10, 'bold'), 
+                bg='#f0f0f0').pack(side='left')
+        
+        self.list_var = tk.StringVar(value=self.list_name)
+        self.list_combo = ttk.Combobox(list_frame, textvariable=self.list_var,
+                                      values=self.workspace.names,
+                                      state="readonly", font=('Arial', 9), width=20)
+        self.list_combo.pack(side='left', padx=5)
+        self.list_combo.bind('<<ComboboxSelected>>',
+                             lambda e: self.switch_list(self.list_var.get()))
+        
+        tk.Button(list_frame, text="➕ New List", command=self.new_list,
+                 font=('Arial', 9), bg='#ecf0f1', relief='flat').pack(side='left', padx=2)
+        tk.Button(list_frame, text="📋 Due Across Lists", command=self.show_due_across_lists,
+                 font=('Arial', 9), bg='#ecf0f1', relief='flat').pack(side='right', padx=2)
+        
         # Filter frame
         filter_frame = tk.Frame(parent, bg='#f0f0f0')
         filter_frame.pack(fill='x', pady=(0, 5))
@@ -163,8 +512,7 @@ class TodoGUI:
         
         self.filter_var = tk.StringVar(value="All Tasks")
         filter_combo = ttk.Combobox(filter_frame, textvariable=self.filter_var,
-                                   values=["All Tasks", "Pending", "Completed", "Overdue", 
-                                          "Due Today", "Due This Week"],
+                                   values=FILTERS,
                                    state="readonly", font=('Arial', 9), width=15)
         filter_combo.pack(side='left', padx=5)
         filter_combo.bind('<<ComboboxSelected>>', lambda e: self.refresh_task_list())
@@ -180,7 +528,7 @@ class TodoGUI:
         search_entry = tk.Entry(search_frame, textvariable=self.search_var,
                                font=('Arial', 9), width=15)
         search_entry.pack(side='left', padx=5)
-        search_entry.bind('<KeyRelease>', lambda e: self.refresh_task_list())
+        search_entry.bind('<KeyRelease>', lambda e: self.schedule_search())
         
         # Task list with scrollbar
         list_frame = tk.Frame(parent, bg='#f0f0f0')
@@ -189,15 +537,17 @@ class TodoGUI:
         # Create Treeview
         columns = ('ID', 'Task', 'Priority', 'Deadline', 'Status', 'Time Left')
         self.task_tree = ttk.Treeview(list_frame, columns=columns, show='headings',
-                                     style='Custom.Treeview', height=15)
-        
-        # Configure columns
-        self.task_tree.heading('ID', text='ID')
-        self.task_tree.heading('Task', text='Task Description')
-        self.task_tree.heading('Priority', text='Priority')
-        self.task_tree.heading('Deadline', text='Deadline')
-        self.task_tree.heading('Status', text='Status')
-        self.task_tree.heading('Time Left', text='Time Remaining')
+                                     style='Custom.Treeview', height=15,
+                                     selectmode='extended')
+        
+        # Configure columns; clicking a sortable heading sorts by it
+        self.headings = {'ID': 'ID', 'Task': 'Task Description', 'Priority': 'Priority',
+                         'Deadline': 'Deadline', 'Status': 'Status',
+                         'Time Left': 'Time Remaining'}
+        for column, text in self.headings.items():
+            self.task_tree.heading(column, text=text)
+        for column, order in SORT_COLUMNS.items():
+            self.task_tree.heading(column, command=lambda order=order: self.set_sort_order(order))
         
         self.task_tree.column('ID', width=40, minwidth=40)
         self.task_tree.column('Task', width=200, minwidth=150)
@@ -210,7 +560,9 @@ class TodoGUI:
         v_scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.task_tree.yview)
         h_scrollbar = ttk.Scrollbar(list_frame, orient='horizontal', command=self.task_tree.xview)
         
-        self.task_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.task_tree.configure(xscrollcommand=h_scrollbar.set)
+        self.task_list = VirtualTaskList(self.task_tree, v_scrollbar, self.format_task_row,
+                                         self.lookup_task)
         
         # Pack scrollbars and treeview
         self.task_tree.pack(side='left', fill='both', expand=True)
@@ -219,6 +571,7 @@ class TodoGUI:
         
         # Bind double-click to edit
         self.task_tree.bind('<Double-1>', self.edit_task)
+        self.task_tree.bind('<Control-a>', lambda e: self.task_list.select_all())
     
     def create_control_buttons(self, parent):
         """Create control buttons."""
@@ -262,6 +615,50 @@ class TodoGUI:
                               font=('Arial', 10, 'bold'), bg='#34495e', fg='white',
                               relief='flat', padx=15, pady=5)
         refresh_btn.pack(side='left', padx=2)
+        
+        # Bulk actions apply to every selected task
+        bulk_frame = tk.Frame(parent, bg='#f0f0f0')
+        bulk_frame.pack(fill='x', pady=(0, 10))
+        
+        select_all_btn = tk.Button(bulk_frame, text="☑️ Select All", 
+                                 command=self.task_list.select_all,
+                                 font=('Arial', 9), bg='#95a5a6', fg='white',
+                                 relief='flat', padx=10, pady=3)
+        select_all_btn.pack(side='left', padx=2)
+        
+        priority_btn = tk.Menubutton(bulk_frame, text="🏷️ Set Priority", 
+                                   font=('Arial', 9), bg='#3498db', fg='white',
+                                   relief='flat', padx=10, pady=3)
+        priority_menu = tk.Menu(priority_btn, tearoff=0)
+        for priority in Priority:
+            priority_menu.add_command(label=priority.label,
+                                      command=lambda p=priority: self.set_priority(p))
+        priority_btn.configure(menu=priority_menu)
+        priority_btn.pack(side='left', padx=2)
+        
+        shift_btn = tk.Button(bulk_frame, text="⏩ Shift Deadlines", 
+                            command=self.shift_deadlines,
+                            font=('Arial', 9), bg='#9b59b6', fg='white',
+                            relief='flat', padx=10, pady=3)
+        shift_btn.pack(side='left', padx=2)
+        
+        archive_btn = tk.Button(bulk_frame, text="📦 Archive Completed", 
+                              command=self.archive_completed,
+                              font=('Arial', 9), bg='#34495e', fg='white',
+                              relief='flat', padx=10, pady=3)
+        archive_btn.pack(side='right', padx=2)
+        
+        export_btn = tk.Button(bulk_frame, text="📤 Export", 
+                             command=self.export_tasks,
+                             font=('Arial', 9), bg='#16a085', fg='white',
+                             relief='flat', padx=10, pady=3)
+        export_btn.pack(side='right', padx=2)
+        
+        import_btn = tk.Button(bulk_frame, text="📥 Import", 
+                             command=self.import_tasks,
+                             font=('Arial', 9), bg='#16a085', fg='white',
+                             relief='flat', padx=10, pady=3)
+        import_btn.pack(side='right', padx=2)
     
     def create_status_bar(self):
         """Create status bar at the bottom."""
@@ -283,30 +680,330 @@ class TodoGUI:
         self.reminder_label = tk.Label(self.status_frame, text="🔔 Reminders Active", 
                                      bg='#2c3e50', fg='#f39c12', font=('Arial', 9))
         self.reminder_label.pack(side='right', padx=10, pady=2)
+        
+        # Performance panel toggle (only with timing probes enabled)
+        if self.probes.enabled:
+            perf_btn = tk.Button(self.status_frame, text="⏱️ Perf", 
+                               command=self.toggle_perf_panel,
+                               bg='#34495e', fg='white', font=('Arial', 9),
+                               relief='flat', padx=5)
+            perf_btn.pack(side='right', padx=5, pady=1)
+            self.root.bind('<F12>', lambda e: self.toggle_perf_panel())
     
-    def load_todos(self):
-        """Load todos from JSON file."""
-        if os.path.exists(self.filename):
+    def toggle_perf_panel(self):
+        """Show or hide the probe statistics above the status bar."""
+        if self.perf_panel is not None:
+            self.perf_panel.destroy()
+            self.perf_panel = None
+            return
+        
+        self.perf_panel = tk.Frame(self.root, bg='#34495e')
+        self.perf_panel.pack(side='bottom', fill='x')
+        
+        buttons = tk.Frame(self.perf_panel, bg='#34495e')
+        buttons.pack(side='right', fill='y', padx=5, pady=5)
+        for text, command in (("Export JSON...", self.export_probes),
+                              ("Reset", self.probes.reset)):
+            tk.Button(buttons, text=text, command=command, font=('Arial', 9),
+                      relief='flat').pack(fill='x', pady=1)
+        self.profile_btn = tk.Button(buttons, text="Start cProfile", command=self.toggle_profile,
+                                     font=('Arial', 9), relief='flat')
+        self.profile_btn.pack(fill='x', pady=1)
+        
+        self.perf_text = tk.Label(self.perf_panel, bg='#34495e', fg='white', justify='left',
+                                  anchor='nw', font=('Courier', 9))
+        self.perf_text.pack(side='left', fill='both', expand=True, padx=5, pady=5)
+        self.update_perf_panel()
+    
+    def update_perf_panel(self):
+        """Redraw the probe table once a second while the panel is open."""
+        if self.perf_panel is None or not self.running:
+            return
+        lines = [f"{'probe':<26}{'calls':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, stats in self.probes.summary().items():
+            lines.append(f"{name:<26}{stats['calls']:>8}{stats['p50_ms']:>10.2f}"
+                         f"{stats['p90_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+        self.perf_text.config(text="\n".join(lines))
+        self.root.after(1000, self.update_perf_panel)
+    
+    def export_probes(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")],
+                                            initialfile="todo-probes.json")
+        if path:
+            self.probes.export_json(path)
+            self.update_status(f"Probe statistics saved to {os.path.basename(path)}")
+    
+    def toggle_profile(self):
+        """Start a cProfile session, or stop it and save the dump."""
+        if not self.probes.profiling:
+            self.probes.start_profile()
+            self.profile_btn.config(text="Stop cProfile...")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".prof",
+                                            filetypes=[("cProfile dump", "*.prof")],
+                                            initialfile="todo.prof")
+        self.probes.stop_profile(path or os.devnull)
+        self.profile_btn.config(text="Start cProfile")
+        if path:
+            self.update_status(f"Profile saved to {os.path.basename(path)}")
+    
+    def make_storage(self, path):
+        """Open a list's task file for the workspace.
+        
+        Writes go to disk on a background thread, coalesced per burst of edits.
+        """
+        storage = open_storage(path, mapped=self.mapped)
+        self.probes.instrument(storage,
+                               ['put', 'delete', 'write_batch', 'compact'], prefix='save:')
+        return AsyncStorage(storage, on_error=self.show_save_error)
+    
+    def bind_list(self, name):
+        """Make ``name`` the active list and build the views over its store.
+        
+        Returns whether the store was newly opened and still needs loading.
+        """
+        fresh = name not in self.workspace.open_lists
+        self.list_name = name
+        self.filename = self.workspace.file(name)
+        self.root.title(f"📝 Advanced To-Do List Manager - {name}")
+        self.store = self.workspace.open(name, load=False)
+        self.store.on_save_error = self.show_save_error
+        if fresh:
+            self.editable = False
+            if self.mapped:
+                # Only the indexes are built here; tasks are read from the map when drawn
+                try:
+                    self.store.load()
+                except STORAGE_ERRORS as e:
+                    print(f"Could not load tasks: {e}")
+        
+        subscribed = len(self.store.listeners)
+        self.time_labels = TimeLabelCache()
+        self.archive = TaskArchive(self.filename + ".archive.gz")
+        self.archived = None  # id -> Task, read from the archive on first need
+        self.archive_loading = False
+        self.changes = ChangeTracker(self.store)
+        self.search_index = SearchIndex(self.store, background=True)
+        self.sort_orders = SortedOrders(self.store)
+        # Reminders fire 2 hours before the deadline (or at once if overdue)
+        store = self.store
+        self.reminder_scheduler = ReminderScheduler(
+            store, lambda due: self.post_to_ui(self.check_reminders, due, store))
+        self.counters = TaskCounters(
+            self.store, self.reminder_scheduler,
+            on_rollover=lambda: self.post_to_ui(self.update_task_count))
+        self.list_listeners = self.store.listeners[subscribed:]
+        return fresh
+    
+    def switch_list(self, name):
+        """Show another list, loading it unless it is still open."""
+        if name == self.list_name:
+            return
+        if self.store.loading:
+            self.list_var.set(self.list_name)
+            messagebox.showinfo("Info", "Tasks are still loading. Please try again in a moment.")
+            return
+        
+        # The old store may stay open; it just stops feeding these views
+        self.reminder_scheduler.stop()
+        for listener in self.list_listeners:
+            self.store.unsubscribe(listener)
+        self.task_list.selected_ids.clear()
+        fresh = self.bind_list(name)
+        self.list_var.set(name)
+        self.reminder_scheduler.start()
+        if fresh:
+            self.task_list.set_rows([])
+            self.load_todos()
+        else:
+            self.finish_loading()
+    
+    def new_list(self):
+        """Ask for a name, create the list and switch to it."""
+        name = simpledialog.askstring("New List", "Name of the new list:", parent=self.root)
+        if name is None:
+            return
+        try:
+            self.workspace.create(name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.list_combo.config(values=self.workspace.names)
+        self.switch_list(name.strip())
+    
+    def show_due_across_lists(self):
+        """Open a window listing overdue and upcoming tasks from every list."""
+        DueAcrossListsWindow(self)
+    
+    def import_tasks(self):
+        """Import a CSV, JSON Lines or iCalendar file into the current list.
+        
+        The file is parsed on a worker thread (which fans out to a process
+        pool) and the new tasks are added in one batch on the Tk thread.
+        """
+        if not self.check_editable():
+            return
+        path = filedialog.askopenfilename(title="Import Tasks", filetypes=BULK_FILETYPES)
+        if not path:
+            return
+        store = self.store
+        self.status_label.config(text=f"Importing {os.path.basename(path)}...")
+        
+        def worker():
             try:
-                with open(self.filename, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return []
-        return []
-    
-    def save_todos(self):
-        """Save todos to JSON file."""
+                with store.lock:
+                    existing = content_hashes(store)
+                result = read_import(path, existing=existing, mp_context=POOL_CONTEXT)
+            except (ValueError, OSError) as e:
+                self.post_to_ui(self.update_status, f"⚠️ Could not import: {e}", True)
+                return
+            self.post_to_ui(self.finish_import, result, store)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def finish_import(self, result, store):
+        """Add the tasks a finished import produced and report what was skipped."""
+        if store is not self.store:
+            messagebox.showinfo("Import", "The list was switched during the import, "
+                                "so nothing was added. Please import again.")
+            return
+        store.add_many(result.tasks)
+        self.apply_changes()
+        summary = f"Imported {len(result.tasks)} tasks"
+        self.update_status(summary)
+        if result.duplicates or result.skipped:
+            details = [f"{summary}; skipped {result.duplicates} duplicates "
+                       f"and {result.skipped} invalid rows."] + result.errors
+            messagebox.showinfo("Import", "\n".join(details))
+    
+    def export_tasks(self):
+        """Write the current list to a CSV, JSON Lines or iCalendar file."""
+        path = filedialog.asksaveasfilename(title="Export Tasks", defaultextension=".csv",
+                                            filetypes=BULK_FILETYPES,
+                                            initialfile=f"{self.list_name}.csv")
+        if not path:
+            return
         try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.todos, f, indent=2)
-        except IOError:
-            messagebox.showerror("Error", "Could not save tasks to file.")
+            fmt = bulk_format(path)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        # Copies, so edits made while the worker writes cannot tear a row
+        tasks = [Task(*task_fields(task)) for task in sorted(self.store, key=lambda t: t.id)]
+        
+        def worker():
+            try:
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    count = export_tasks(tasks, f, fmt, mp_context=POOL_CONTEXT)
+            except OSError as e:
+                self.post_to_ui(self.update_status, f"⚠️ Could not export: {e}", True)
+                return
+            self.post_to_ui(self.update_status,
+                            f"Exported {count} tasks to {os.path.basename(path)}")
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def load_todos(self):
+        """Stream todos from the storage backend on a worker thread.
+        
+        The worker parses batches and queues them for the Tk thread, so the
+        window is up straight away and pending tasks show first. Editing is
+        held off until the loader reports ``'ready'``.
+        """
+        if self.mapped:
+            self.finish_loading()  # loaded up front from the memory map
+            return
+        
+        self.store.loading = True
+        self.status_label.config(text="Loading tasks...")
+        
+        def worker():
+            started = time.perf_counter()
+            try:
+                for kind, payload in self.store.storage.stream():
+                    self.post_to_ui(self.receive_tasks, kind, payload)
+                    time.sleep(0)  # let the Tk thread have the GIL
+            except STORAGE_ERRORS as e:
+                print(f"Could not load tasks: {e}")  # keep what we have, as before
+            finally:
+                # Whatever went wrong, the UI must not stay stuck loading
+                if self.probes.enabled:
+                    self.probes.record('load_todos', time.perf_counter() - started)
+                self.post_to_ui(self.finish_loading)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def receive_tasks(self, kind, payload):
+        """Apply one event from the streaming loader."""
+        if kind == 'next_id':
+            self.store.advance_next_id(payload)
+        elif kind == 'ready':
+            self.editable = True
+        else:
+            self.store.extend(payload)
+            self.status_label.config(text=f"Loading tasks... {len(self.store)} loaded")
+            # Throttle full refreshes while batches keep arriving
+            if self.load_refresh_job is None:
+                self.load_refresh_job = self.root.after(200, self.run_load_refresh)
+    
+    def run_load_refresh(self):
+        self.load_refresh_job = None
+        self.refresh_task_list()
+    
+    def finish_loading(self):
+        """Re-enable compaction and editing once every task is in."""
+        self.store.loading = False
+        self.editable = True
+        if self.load_refresh_job is not None:
+            self.root.after_cancel(self.load_refresh_job)
+            self.load_refresh_job = None
+        self.refresh_task_list()
+        self.update_status(f"Loaded {len(self.store)} tasks")
+        self.search_index.build_in_background()
+        self.auto_archive()
+    
+    def check_editable(self):
+        """Return whether edits are allowed yet, telling the user if not."""
+        if not self.editable:
+            messagebox.showinfo("Info", "Tasks are still loading. Please try again in a moment.")
+        return self.editable
+    
+    def show_save_error(self, error):
+        """Report a failed write to the task file (called from the writer thread).
+
+        The change stays queued and is retried, so this goes to the status
+        bar rather than a dialog that would pop up on every retry.
+        """
+        self.post_to_ui(self.update_status, f"⚠️ Could not save tasks ({error}); retrying", True)
+    
+    def post_to_ui(self, callback, *args):
+        """Queue ``callback(*args)`` to run on the Tk thread.
+        
+        Worker threads must never touch widgets directly; everything they
+        need done in the UI goes through this queue.
+        """
+        self.ui_queue.put((callback, args))
     
-    def get_next_id(self):
-        """Get the next available ID."""
-        if not self.todos:
-            return 1
-        return max(task.get('id', 0) for task in self.todos) + 1
+    def process_ui_queue(self, budget=0.05):
+        """Run callbacks queued by worker threads, then poll again.
+        
+        At most ``budget`` seconds are spent per pass so a backlog (such as
+        a large load) cannot freeze the window; leftovers run on the next
+        pass, which comes sooner while the queue is non-empty.
+        """
+        stop = time.monotonic() + budget
+        while time.monotonic() < stop:
+            try:
+                callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"UI callback error: {e}")
+        if self.running:
+            self.root.after(10 if self.ui_queue.qsize() else 100, self.process_ui_queue)
     
     def set_quick_deadline(self, period):
         """Set quick deadline in the form."""
@@ -331,6 +1028,9 @@ class TodoGUI:
         self.date_entry.insert(0, "YYYY-MM-DD")
         self.time_entry.delete(0, tk.END)
         self.time_entry.insert(0, "HH:MM (24h)")
+        self.repeat_var.set("Never")
+        self.repeat_interval.delete(0, tk.END)
+        self.repeat_interval.insert(0, "1")
         self.update_status("Form cleared")
     
     def parse_deadline(self, date_str, time_str):
@@ -340,82 +1040,195 @@ class TodoGUI:
             return None
         
         try:
-            if time_str and time_str != "HH:MM (24h)":
-                datetime_str = f"{date_str} {time_str}"
-                return datetime.strptime(datetime_str, "%Y-%m-%d %H:%M")
-            else:
-                return datetime.strptime(date_str, "%Y-%m-%d").replace(hour=23, minute=59)
+            return parse_deadline(date_str, time_str)
         except ValueError:
             return None
     
     def add_task(self):
         """Add a new task."""
+        if not self.check_editable():
+            return
         description = self.task_entry.get(1.0, tk.END).strip()
         if not description:
             messagebox.showwarning("Warning", "Please enter a task description.")
             return
         
-        priority = self.priority_var.get().lower()
+        priority = Priority(self.priority_var.get().lower())
         deadline = self.parse_deadline(self.date_entry.get(), self.time_entry.get())
         
-        task = {
-            "id": self.get_next_id(),
-            "description": description,
-            "completed": False,
-            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "priority": priority,
-            "deadline": deadline.strftime("%Y-%m-%d %H:%M:%S") if deadline else None,
-            "reminded": False
-        }
-        
-        self.todos.append(task)
-        self.save_todos()
+        recurrence = None
+        unit = REPEAT_UNITS[self.repeat_var.get()]
+        if unit:
+            if deadline is None:
+                messagebox.showwarning("Warning", "A repeating task needs a deadline.")
+                return
+            try:
+                recurrence = Recurrence(int(self.repeat_interval.get()), unit, deadline)
+            except ValueError:
+                messagebox.showwarning("Warning", "Please enter how often the task repeats.")
+                return
+        
+        task = Task(None, description,
+                    created=datetime.now().replace(microsecond=0),
+                    priority=priority,
+                    deadline=deadline,
+                    recurrence=recurrence)
+        
+        self.store.add(task)
         self.clear_form()
-        self.refresh_task_list()
+        self.apply_changes()
         self.update_status(f"Added task: {description[:30]}...")
     
     def get_selected_task(self):
-        """Get the currently selected task."""
-        selection = self.task_tree.selection()
-        if not selection:
+        """Get the first selected task."""
+        tasks = self.get_selected_tasks()
+        return tasks[0] if tasks else None
+    
+    def get_selected_tasks(self):
+        """Get every selected task, including rows scrolled out of view."""
+        if not self.check_editable():
+            return []
+        tasks = [self.store.get(task_id) for task_id in self.task_list.selection()]
+        tasks = [task for task in tasks if task is not None]
+        if not tasks:
             messagebox.showwarning("Warning", "Please select a task.")
-            return None
-        
-        item = self.task_tree.item(selection[0])
-        task_id = int(item['values'][0])
-        
-        for task in self.todos:
-            if task['id'] == task_id:
-                return task
-        return None
+        return tasks
     
     def complete_task(self):
-        """Mark selected task as completed."""
-        task = self.get_selected_task()
-        if not task:
+        """Mark the selected tasks as completed."""
+        tasks = self.get_selected_tasks()
+        if not tasks:
             return
         
-        if task['completed']:
+        pending = [task for task in tasks if not task.completed]
+        if not pending:
             messagebox.showinfo("Info", "Task is already completed.")
             return
         
-        task['completed'] = True
-        task['completed_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_todos()
-        self.refresh_task_list()
-        self.update_status(f"Completed task: {task['description'][:30]}...")
+        # Recurring tasks move on to their next occurrence instead
+        completed_date = datetime.now().replace(microsecond=0)
+        self.store.update_many({task.id: completion_changes(task, completed_date)
+                                for task in pending})
+        self.apply_changes()
+        if len(pending) == 1 and pending[0].recurrence:
+            next_due = pending[0].deadline.strftime('%Y-%m-%d %H:%M')
+            self.update_status(f"Completed occurrence, next due {next_due}")
+        elif len(pending) == 1:
+            self.update_status(f"Completed task: {pending[0].description[:30]}...")
+        else:
+            self.update_status(f"Completed {len(pending)} tasks")
     
     def delete_task(self):
-        """Delete selected task."""
-        task = self.get_selected_task()
-        if not task:
+        """Delete the selected tasks."""
+        tasks = self.get_selected_tasks()
+        if not tasks:
             return
         
-        if askyesno("Confirm Delete", f"Are you sure you want to delete:\n'{task['description']}'?"):
-            self.todos.remove(task)
-            self.save_todos()
-            self.refresh_task_list()
-            self.update_status(f"Deleted task: {task['description'][:30]}...")
+        if len(tasks) == 1:
+            question = f"Are you sure you want to delete:\n'{tasks[0].description}'?"
+        else:
+            question = f"Are you sure you want to delete {len(tasks)} tasks?"
+        if askyesno("Confirm Delete", question):
+            self.store.remove_many([task.id for task in tasks])
+            self.apply_changes()
+            if len(tasks) == 1:
+                self.update_status(f"Deleted task: {tasks[0].description[:30]}...")
+            else:
+                self.update_status(f"Deleted {len(tasks)} tasks")
+    
+    def set_priority(self, priority):
+        """Give every selected task the same priority."""
+        tasks = self.get_selected_tasks()
+        if not tasks:
+            return
+        
+        self.store.update_many({task.id: {'priority': priority} for task in tasks})
+        self.apply_changes()
+        self.update_status(f"Set {len(tasks)} task(s) to {priority.label} priority")
+    
+    def shift_deadlines(self):
+        """Move the deadlines of the selected tasks by a number of days."""
+        tasks = [task for task in self.get_selected_tasks() if task.deadline]
+        if not tasks:
+            return
+        
+        days = simpledialog.askinteger(
+            "Shift Deadlines",
+            f"Shift {len(tasks)} deadline(s) by how many days?\n(negative moves them earlier)",
+            parent=self.root)
+        if not days:
+            return
+        
+        # Reset reminder flags along with the new deadlines
+        shift = timedelta(days=days)
+        self.store.update_many({task.id: deadline_changes(task, task.deadline + shift)
+                                for task in tasks})
+        self.apply_changes()
+        self.update_status(f"Shifted {len(tasks)} deadline(s) by {days} day(s)")
+    
+    def archive_completed(self):
+        """Move every completed task into the archive file."""
+        if not self.check_editable():
+            return
+        
+        task_ids = [task.id for task in self.store.completed()]
+        if not task_ids:
+            messagebox.showinfo("Info", "There are no completed tasks to archive.")
+            return
+        
+        if askyesno("Confirm Archive", f"Move {len(task_ids)} completed tasks to the archive?"):
+            try:
+                tasks = self.store.archive(task_ids, self.archive)
+            except STORAGE_ERRORS:
+                messagebox.showerror("Error", "Could not write the archive file.")
+                return
+            self.remember_archived(tasks)
+            self.update_status(f"Archived {len(task_ids)} tasks")
+    
+    def auto_archive(self):
+        """Archive tasks completed more than ARCHIVE_AFTER_DAYS ago."""
+        cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+        try:
+            tasks = self.store.archive_completed_before(cutoff, self.archive)
+        except STORAGE_ERRORS as e:
+            print(f"Could not archive old tasks: {e}")
+            return
+        if tasks:
+            self.remember_archived(tasks)
+    
+    def remember_archived(self, tasks):
+        """Keep just-archived tasks visible if the archive is already loaded."""
+        if self.archived is not None:
+            self.archived.update((task.id, task) for task in tasks)
+        self.refresh_task_list()
+    
+    def wants_archive(self, filter_type, search_query):
+        """The Completed filter and history searches include archived tasks."""
+        return filter_type == "Completed" or (filter_type == "All Tasks" and bool(search_query))
+    
+    def load_archive(self):
+        """Read the archive on a worker thread, then refresh the list."""
+        if self.archive_loading:
+            return
+        self.archive_loading = True
+        archive = self.archive
+        
+        def worker():
+            try:
+                tasks = [Task.from_dict(record) for record in archive.load()]
+            except (STORAGE_ERRORS, ValueError) as e:
+                print(f"Could not read the archive: {e}")
+                tasks = []
+            self.post_to_ui(self.receive_archive, tasks, archive)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def receive_archive(self, tasks, archive):
+        if archive is not self.archive:
+            return  # read for a list that is no longer shown
+        self.archived = {task.id: task for task in tasks}
+        self.archive_loading = False
+        self.refresh_task_list()
     
     def edit_task(self, event=None):
         """Edit selected task."""
@@ -426,178 +1239,235 @@ class TodoGUI:
         # Create edit dialog
         dialog = EditTaskDialog(self.root, task)
         if dialog.result:
-            updated_task = dialog.result
-            # Update the task in the list
-            for i, t in enumerate(self.todos):
-                if t['id'] == task['id']:
-                    self.todos[i] = updated_task
-                    break
-            
-            self.save_todos()
-            self.refresh_task_list()
-            self.update_status(f"Updated task: {updated_task['description'][:30]}...")
+            updated_task = self.store.update(task.id, **dialog.result)
+            self.apply_changes()
+            self.update_status(f"Updated task: {updated_task.description[:30]}...")
     
     def set_deadline_dialog(self):
-        """Show deadline setting dialog."""
-        task = self.get_selected_task()
-        if not task:
+        """Show deadline setting dialog for the selected tasks."""
+        tasks = self.get_selected_tasks()
+        if not tasks:
             return
         
-        dialog = DeadlineDialog(self.root, task.get('deadline'))
+        dialog = DeadlineDialog(self.root, tasks[0].deadline)
         if dialog.result:
-            if dialog.result == "remove":
-                task['deadline'] = None
-            else:
-                task['deadline'] = dialog.result
-            
-            task['reminded'] = False  # Reset reminder flag
-            self.save_todos()
-            self.refresh_task_list()
+            deadline = None if dialog.result == "remove" else dialog.result
+            # Reset reminder flag along with the new deadline
+            self.store.update_many({task.id: deadline_changes(task, deadline)
+                                    for task in tasks})
+            self.apply_changes()
             self.update_status("Deadline updated")
 
-    def get_time_remaining(self, deadline_str):
+    def get_time_remaining(self, deadline):
         """Calculate time remaining until deadline."""
-        if not deadline_str:
-            return ""
-        
-        deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-        now = datetime.now()
-        diff = deadline - now
-        
-        if diff.total_seconds() < 0:
-            days_overdue = abs(diff.days)
-            return f"OVERDUE {days_overdue}d"
-        elif diff.days > 0:
-            return f"{diff.days}d left"
-        elif diff.seconds > 3600:
-            hours = diff.seconds // 3600
-            return f"{hours}h left"
-        else:
-            minutes = diff.seconds // 60
-            return f"{minutes}m left"
+        return time_remaining(deadline)
     
-    def filter_tasks(self, tasks):
-        """Filter tasks based on current filter and search."""
+    def filter_tasks(self):
+        """Filter tasks based on current filter and search.
+        
+        Returns the ids of the matching tasks in the store, or None when
+        that is all of them, and the matching archived tasks. Only ids are
+        handled, so a memory-mapped store builds no tasks here.
+        """
         filter_type = self.filter_var.get()
-        search_query = self.search_var.get().lower()
+        search_query = self.search_var.get().strip()
+        
+        # Apply type filter (indexed in memory or in the storage backend)
+        ids = None
+        if filter_type != "All Tasks":
+            ids = self.store.filter_ids(filter_type, datetime.now())
         
         # Apply search filter
         if search_query:
-            tasks = [t for t in tasks if search_query in t['description'].lower()]
-        
-        # Apply type filter
-        now = datetime.now()
-        if filter_type == "Pending":
-            tasks = [t for t in tasks if not t['completed']]
-        elif filter_type == "Completed":
-            tasks = [t for t in tasks if t['completed']]
-        elif filter_type == "Overdue":
-            tasks = [t for t in tasks if not t['completed'] and t.get('deadline') and 
-                    datetime.strptime(t['deadline'], "%Y-%m-%d %H:%M:%S") < now]
-        elif filter_type == "Due Today":
-            today = now.date()
-            tasks = [t for t in tasks if not t['completed'] and t.get('deadline') and 
-                    datetime.strptime(t['deadline'], "%Y-%m-%d %H:%M:%S").date() == today]
-        elif filter_type == "Due This Week":
-            week_end = now + timedelta(days=7)
-            tasks = [t for t in tasks if not t['completed'] and t.get('deadline') and 
-                    datetime.strptime(t['deadline'], "%Y-%m-%d %H:%M:%S") <= week_end]
+            matching = self.search_index.match(search_query)
+            ids = matching if ids is None else [i for i in ids if i in matching]
+        
+        # Archived history is only read when a view needs it
+        archived = []
+        if self.wants_archive(filter_type, search_query):
+            if self.archived is None:
+                self.load_archive()
+            else:
+                archived = [t for t in self.archived.values()
+                            if t.id not in self.store.tasks and
+                            (not search_query or self.search_index.matches(t, search_query))]
         
-        return tasks
+        return ids, archived
+    
+    def schedule_search(self, delay=150):
+        """Debounce search keystrokes into a single refresh."""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(delay, self.run_search)
+    
+    def run_search(self):
+        self.search_job = None
+        self.refresh_task_list()
     
     def refresh_task_list(self):
         """Refresh the task list display."""
-        # Clear existing items
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-        
         # Filter tasks
-        filtered_tasks = self.filter_tasks(self.todos)
-        
-        # Sort tasks (pending first, then by deadline)
-        def sort_key(task):
-            if task['completed']:
-                return (2, task.get('completed_date', ''))
-            if not task.get('deadline'):
-                return (1, datetime.max)
-            deadline = datetime.strptime(task['deadline'], "%Y-%m-%d %H:%M:%S")
-            if deadline < datetime.now():
-                return (0, deadline)  # Overdue first
-            return (1, deadline)
-        
-        filtered_tasks.sort(key=lambda t: t['id'])
-        
-        # Populate tree
-        for task in filtered_tasks:
-            task_id = task['id']
-            description = task['description']
-            priority = task['priority'].title()
-            deadline = task.get('deadline', '')
-            if deadline:
-                deadline = datetime.strptime(deadline, "%Y-%m-%d %H:%M:%S").strftime("%m/%d %H:%M")
-            
-            status = "✅ Done" if task['completed'] else "⏳ Pending"
-            time_left = "" if task['completed'] else self.get_time_remaining(task.get('deadline'))
-            
-            # Insert item
-            item = self.task_tree.insert('', 'end', values=(
-                task_id, description, priority, deadline, status, time_left
-            ))
-            
-            # Color coding
-            if task['completed']:
-                self.task_tree.set(item, 'Task', f"✅ {description}")
-            elif task.get('deadline') and datetime.strptime(task['deadline'], "%Y-%m-%d %H:%M:%S") < datetime.now():
-                self.task_tree.set(item, 'Task', f"⚠️ {description}")
-            elif task['priority'] == 'high':
-                self.task_tree.set(item, 'Task', f"🔴 {description}")
-            elif task['priority'] == 'medium':
-                self.task_tree.set(item, 'Task', f"🟡 {description}")
+        ids, archived = self.filter_tasks()
+        
+        # Take the rows from the maintained sort order instead of sorting them
+        sort_key = SORT_KEYS[self.sort_order]
+        entries = self.sort_orders.sorted(self.sort_order)
+        if ids is not None:
+            if len(ids) < len(entries) // 16 and not isinstance(self.store.tasks, MappedTasks):
+                # A narrow result, e.g. a search, is quicker to sort on its own
+                entries = sorted((sort_key(self.store.tasks[i]), i) for i in ids)
             else:
-                self.task_tree.set(item, 'Task', f"🟢 {description}")
+                wanted = set(ids)
+                entries = [entry for entry in entries if entry[1] in wanted]
+        if archived:
+            archived = sorted((sort_key(task), task.id) for task in archived)
+            entries = list(heapq.merge(entries, archived))
+        
+        # A full rebuild supersedes any pending row patches
+        self.changes.drain()
+        
+        # Only the rows in view are materialized in the tree
+        self.task_list.set_rows(entries, sort_key=sort_key)
         
         # Update status
         self.update_task_count()
     
+    def set_sort_order(self, order):
+        """Sort the list by one of ``SORT_KEYS`` (column heading clicks)."""
+        self.sort_order = order
+        for column, text in self.headings.items():
+            marker = " ▲" if SORT_COLUMNS.get(column) == order else ""
+            self.task_tree.heading(column, text=text + marker)
+        self.refresh_task_list()
+    
+    def task_matches(self, task, now):
+        """Return whether a single task passes the current filter and search."""
+        filter_type = self.filter_var.get()
+        search_query = self.search_var.get().strip()
+        
+        if search_query and not self.search_index.matches(task, search_query):
+            return False
+        
+        return matches_filter(task, filter_type, now)
+    
+    def apply_changes(self):
+        """Patch the task list with only the tasks changed since the last update.
+        
+        Large batches are cheaper to redraw in one go than row by row.
+        """
+        added, modified, removed = self.changes.drain()
+        if len(added) + len(modified) + len(removed) > PATCH_LIMIT:
+            self.refresh_task_list()
+            return
+        now = datetime.now()
+        
+        for task_id in removed:
+            self.task_list.remove_row(task_id)
+        for task_id in added | modified:
+            task = self.store.get(task_id)
+            if self.task_matches(task, now):
+                self.task_list.upsert_row(task)
+            else:
+                self.task_list.remove_row(task_id)
+        self.task_list.finish_patch()
+        
+        self.update_task_count()
+    
+    def lookup_task(self, task_id):
+        """Find a listed task by id, looking in the archive too."""
+        task = self.store.get(task_id)
+        if task is None and self.archived is not None:
+            task = self.archived.get(task_id)
+        return task
+    
+    def format_task_row(self, task, now=None):
+        """Build the Treeview values for a task row."""
+        now = now or datetime.now()
+        description = task.description
+        deadline = self.time_labels.deadline_text(task)
+        status = "✅ Done" if task.completed else "⏳ Pending"
+        if task.recurrence and not task.completed:
+            status = f"🔁 {task.recurrence.label}"
+        if self.store.get(task.id) is None:
+            status = "📦 Archived"
+        time_left = "" if task.completed else self.time_labels.time_left(task, now)
+        
+        # Color coding
+        if task.completed:
+            description = f"✅ {description}"
+        elif task.deadline and task.deadline < now:
+            description = f"⚠️ {description}"
+        elif task.priority is Priority.HIGH:
+            description = f"🔴 {description}"
+        elif task.priority is Priority.MEDIUM:
+            description = f"🟡 {description}"
+        else:
+            description = f"🟢 {description}"
+        
+        return (task.id, description, task.priority.label, deadline, status, time_left)
+    
+    def schedule_tick(self):
+        """Run ``tick_time_left`` just after the next minute boundary."""
+        now = datetime.now()
+        delay = 60 - now.second - now.microsecond / 1e6
+        self.root.after(int(delay * 1000) + 50, self.tick_time_left)
+    
+    def tick_time_left(self):
+        """Redraw only the rendered rows whose time-left label has flipped."""
+        if not self.running:
+            return
+        now = datetime.now()
+        changed = self.time_labels.due(now)
+        for task_id in set(self.task_list.rendered).intersection(changed):
+            task = self.store.get(task_id)
+            if task is not None and not task.completed:
+                if self.time_labels.time_left(task, now) != changed[task_id]:
+                    self.task_list.tree.item(str(task_id), values=self.format_task_row(task, now))
+        self.schedule_tick()
+    
+    def poll_file_changes(self):
+        """Merge in tasks another window or the CLI saved to the same file."""
+        if not self.running:
+            return
+        if self.editable and not self.store.loading:
+            changes = self.store.storage.poll_changes()
+            if changes:
+                count = self.store.merge(*changes)
+                if count:
+                    self.apply_changes()
+                    self.update_status(f"Merged {count} change(s) saved by another program")
+        self.root.after(POLL_INTERVAL, self.poll_file_changes)
+    
     def update_task_count(self):
         """Update task count in status bar."""
-        total = len(self.todos)
-        pending = len([t for t in self.todos if not t['completed']])
-        completed = len([t for t in self.todos if t['completed']])
-        overdue = len([t for t in self.todos if not t['completed'] and t.get('deadline') and 
-                      datetime.strptime(t['deadline'], "%Y-%m-%d %H:%M:%S") < datetime.now()])
+        counters = self.counters
+        counters.roll()
         
-        count_text = f"Total: {total} | Pending: {pending} | Completed: {completed}"
-        if overdue > 0:
-            count_text += f" | ⚠️ Overdue: {overdue}"
+        count_text = (f"Total: {counters.total} | Pending: {counters.pending} | "
+                      f"Completed: {counters.completed}")
+        if counters.due_today > 0:
+            count_text += f" | 📅 Due Today: {counters.due_today}"
+        if counters.overdue > 0:
+            count_text += f" | ⚠️ Overdue: {counters.overdue}"
         
         self.count_label.config(text=count_text)
     
-    def update_status(self, message):
+    def update_status(self, message, error=False):
         """Update status bar message."""
-        self.status_label.config(text=message)
-        self.root.after(3000, lambda: self.status_label.config(text="Ready"))
+        self.status_label.config(text=message, fg=self.colors['warning'] if error else 'white')
+        self.root.after(3000, lambda: self.status_label.config(text="Ready", fg='white'))
     
-    def check_reminders(self):
-        """Check for tasks that need reminders."""
-        now = datetime.now()
-        reminders = []
-        
-        for task in self.todos:
-            if (not task['completed'] and 
-                task.get('deadline') and 
-                not task.get('reminded', False)):
-                
-                deadline = datetime.strptime(task['deadline'], "%Y-%m-%d %H:%M:%S")
-                time_diff = deadline - now
-                
-                # Send reminder if deadline is within 2 hours or overdue
-                if time_diff.total_seconds() <= 7200:  # 2 hours
-                    reminders.append(task)
-                    task['reminded'] = True
+    def check_reminders(self, due, store=None):
+        """Send the reminders the scheduler found due (runs on the Tk thread).
+        
+        Reminders queued for a list that has since been switched away from
+        are dropped; its scheduler re-arms them when it is shown again.
+        """
+        if store is not None and store is not self.store:
+            return []
+        reminders = self.reminder_scheduler.claim(due)
         
         if reminders:
-            self.save_todos()
             self.show_reminders(reminders)
         
         return reminders
@@ -606,35 +1476,21 @@ class TodoGUI:
         """Show reminder popup."""
         reminder_text = "🔔 DEADLINE REMINDERS:\n\n"
         for task in reminders:
-            time_info = self.get_time_remaining(task['deadline'])
-            reminder_text += f"• {task['description']}\n  {time_info}\n\n"
+            time_info = self.get_time_remaining(task.deadline)
+            reminder_text += f"• {task.description}\n  {time_info}\n\n"
         
         messagebox.showwarning("Deadline Reminders", reminder_text)
-        self.refresh_task_list()
+        self.apply_changes()
     
     def start_reminder_system(self):
         """Start the background reminder system."""
-        def reminder_loop():
-            while self.running:
-                try:
-                    self.check_reminders()
-                    # Check every 10 minutes
-                    for _ in range(600):
-                        if not self.running:
-                            break
-                        time.sleep(1)
-                except Exception as e:
-                    print(f"Reminder system error: {e}")
-                    time.sleep(60)
-        
-        self.reminder_thread = threading.Thread(target=reminder_loop, daemon=True)
-        self.reminder_thread.start()
+        self.reminder_scheduler.start()
     
     def on_closing(self):
         """Handle application closing."""
         self.running = False
-        if self.reminder_thread:
-            self.reminder_thread.join(timeout=1)
+        self.reminder_scheduler.stop()
+        self.workspace.close_all()  # writes out anything still queued
         self.root.destroy()
 
 
@@ -648,23 +1504,27 @@ class EditTaskDialog(simpledialog.Dialog):
         tk.Label(master, text="Description:").grid(row=0, column=0, sticky="w")
         self.desc_entry = tk.Text(master, height=3, width=40)
         self.desc_entry.grid(row=0, column=1, padx=5, pady=5)
-        self.desc_entry.insert("1.0", self.task['description'])
+        self.desc_entry.insert("1.0", self.task.description)
 
         tk.Label(master, text="Priority:").grid(row=1, column=0, sticky="w")
-        self.priority_var = tk.StringVar(value=self.task.get('priority', 'medium').capitalize())
+        self.priority_var = tk.StringVar(value=self.task.priority.label)
         priorities = ["High", "Medium", "Low"]
         self.priority_combo = ttk.Combobox(master, textvariable=self.priority_var, values=priorities, state="readonly")
         self.priority_combo.grid(row=1, column=1, padx=5, pady=5)
 
+        self.repeat_var = tk.BooleanVar(value=self.task.recurrence is not None)
+        if self.task.recurrence:
+            tk.Checkbutton(master, text=f"Repeats: {self.task.recurrence.label}",
+                           variable=self.repeat_var).grid(row=2, column=1, sticky="w", padx=5)
+
         return self.desc_entry
 
     def apply(self):
         description = self.desc_entry.get("1.0", "end").strip()
-        priority = self.priority_var.get().lower()
-        updated_task = self.task.copy()
-        updated_task['description'] = description
-        updated_task['priority'] = priority
-        self.result = updated_task
+        priority = Priority(self.priority_var.get().lower())
+        self.result = {'description': description, 'priority': priority}
+        if self.task.recurrence and not self.repeat_var.get():
+            self.result['recurrence'] = None  # stop repeating after this occurrence
     
 class DeadlineDialog(simpledialog.Dialog):
     def __init__(self, parent, current_deadline):
@@ -678,11 +1538,7 @@ class DeadlineDialog(simpledialog.Dialog):
         self.deadline_entry.grid(row=0, column=1, padx=5, pady=5)
         if self.current_deadline:
             # Show only up to minutes for editing
-            try:
-                dt = datetime.strptime(self.current_deadline, "%Y-%m-%d %H:%M:%S")
-                self.deadline_entry.insert(0, dt.strftime("%Y-%m-%d %H:%M"))
-            except Exception:
-                self.deadline_entry.insert(0, self.current_deadline)
+            self.deadline_entry.insert(0, self.current_deadline.strftime("%Y-%m-%d %H:%M"))
         return self.deadline_entry
 
     def buttonbox(self):
@@ -709,14 +1565,94 @@ class DeadlineDialog(simpledialog.Dialog):
         if not value:
             self.result = None
         else:
-            dt = datetime.strptime(value, "%Y-%m-%d %H:%M")
-            self.result = dt.strftime("%Y-%m-%d %H:%M:%S")
+            self.result = datetime.strptime(value, "%Y-%m-%d %H:%M")
 
     def remove_deadline(self):
         self.result = "remove"
         self.ok()
 
+class DueAcrossListsWindow(tk.Toplevel):
+    """Overdue and upcoming tasks from every list of the workspace.
+    
+    Lists that are not open are answered from their deadline summaries.
+    Double-clicking a task switches the main window to its list.
+    """
+    
+    def __init__(self, app):
+        super().__init__(app.root)
+        self.app = app
+        self.title("Due Across Lists")
+        self.geometry("700x400")
+        self.configure(bg='#f0f0f0')
+        
+        top = tk.Frame(self, bg='#f0f0f0')
+        top.pack(fill='x', padx=10, pady=5)
+        tk.Label(top, text="Show:", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(side='left')
+        self.filter_var = tk.StringVar(value="Due Today")
+        filter_combo = ttk.Combobox(top, textvariable=self.filter_var,
+                                    values=["Overdue", "Due Today", "Due This Week"],
+                                    state="readonly", font=('Arial', 9), width=15)
+        filter_combo.pack(side='left', padx=5)
+        filter_combo.bind('<<ComboboxSelected>>', lambda e: self.refresh())
+        
+        columns = ('List', 'Task', 'Priority', 'Deadline', 'Time Left')
+        self.tree = ttk.Treeview(self, columns=columns, show='headings',
+                                 style='Custom.Treeview', selectmode='browse')
+        for column in columns:
+            self.tree.heading(column, text=column)
+        self.tree.column('List', width=100)
+        self.tree.column('Task', width=280)
+        self.tree.column('Priority', width=70)
+        self.tree.column('Deadline', width=120)
+        self.tree.column('Time Left', width=110)
+        self.tree.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        self.tree.bind('<Double-1>', self.open_selected)
+        self.rows = {}  # tree item -> list name
+        self.refresh()
+    
+    def refresh(self):
+        now = datetime.now()
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+        for name, task in self.app.workspace.due(self.filter_var.get(), now):
+            item = self.tree.insert('', 'end', values=(
+                name, task.description, task.priority.label,
+                task.deadline.strftime("%Y-%m-%d %H:%M"), time_remaining(task.deadline, now)))
+            self.rows[item] = name
+    
+    def open_selected(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            self.app.switch_list(self.rows[selection[0]])
+            self.destroy()
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = TodoGUI(root)
-    root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Advanced To-Do List Manager")
+    parser.add_argument("filename", nargs="?", default="todos_gui.json",
+                        help="task file to open (.json, .todo for binary, or .db for SQLite)")
+    parser.add_argument("--migrate", nargs=2, metavar=("SRC", "DST"),
+                        help="copy a task file into a new file of the format DST's "
+                             "extension names, and exit")
+    parser.add_argument("--compression", choices=["none", "zlib", "lzma"], default="zlib",
+                        help="description compression for --migrate to a .todo file")
+    parser.add_argument("--probes", action="store_true",
+                        default=bool(os.environ.get("TODO_PROBES")),
+                        help="time hot paths and add a performance panel (F12)")
+    parser.add_argument("--mapped", action="store_true",
+                        help="memory-map the task file instead of loading it "
+                             "(needs a .todo file saved with --compression none)")
+    parser.add_argument("--memory-budget", type=int, default=256, metavar="MB",
+                        help="estimated memory the open lists may use before the "
+                             "least recently used ones are closed (default 256)")
+    parser.add_argument("--open-lists", type=int, default=4, metavar="N",
+                        help="most lists kept open at once (default 4)")
+    args = parser.parse_args()
+    
+    if args.migrate:
+        count = convert_task_file(*args.migrate, compression=args.compression)
+        print(f"Migrated {count} tasks to {args.migrate[1]}")
+    else:
+        root = tk.Tk()
+        app = TodoGUI(root, args.filename, probes=args.probes, mapped=args.mapped,
+                      memory_budget=args.memory_budget, open_lists=args.open_lists)
+        root.mainloop()
\ No newline at end of file
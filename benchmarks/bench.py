@@ -0,0 +1,323 @@
+"""Benchmark the task engine on synthetic task files.
+
+    python benchmarks/bench.py --sizes 10000,100000 --output results.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json
+    python benchmarks/bench.py --sizes 10000 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --tk   # adds the Treeview refresh, starting Xvfb if needed
+
+Every timing is the best of ``--repeat`` runs, in seconds. Results are
+written as JSON and, given a baseline, compared against it: a benchmark
+fails when it is more than ``--threshold`` times slower than the baseline
+(and slower by more than the ``--noise`` floor). The exit status is 1 if
+anything failed.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from todo_engine import (FILTERS, Priority, ReminderScheduler, SearchIndex,
+                         SortedOrders, Task, TaskCounters, TaskJournal, TaskStore,
+                         convert_task_file, open_storage)
+
+
+WORDS = ("review update draft plan call email meeting report budget client "
+         "project design test deploy fix bug release notes invoice schedule "
+         "research write read prepare presentation slides quarterly team "
+         "follow up with about the for and on before after weekly monthly "
+         "doctor groceries car insurance renew passport tickets flight hotel "
+         "python kotlin android calculus statistics workout jogging garden").split()
+
+SEARCHES = ["report", "client meeting", "pre", "quarterly budget review"]
+
+
+def synthetic_tasks(count, seed=0, now=None):
+    """Generate ``count`` tasks with a realistic mix of fields.
+
+    About 40% are completed; 70% have a deadline, clustered around the
+    coming days with a long tail both ways; priorities are weighted
+    towards Medium; descriptions run from 5 to 40 words.
+    """
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(microsecond=0)
+    priorities = [Priority.HIGH] * 2 + [Priority.MEDIUM] * 5 + [Priority.LOW] * 3
+    tasks = []
+    for task_id in range(1, count + 1):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        deadline = None
+        if rng.random() < 0.7:
+            deadline = now + timedelta(minutes=int(rng.gauss(3 * 24 * 60, 14 * 24 * 60)))
+        completed = rng.random() < 0.4
+        completed_date = None
+        if completed:
+            completed_date = min(now, created + timedelta(minutes=rng.randint(0, 60 * 24 * 90)))
+        tasks.append(Task(task_id, " ".join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                          completed=completed,
+                          created=created,
+                          priority=rng.choice(priorities),
+                          deadline=deadline,
+                          reminded=bool(deadline) and deadline < now,
+                          completed_date=completed_date))
+    return tasks
+
+
+def write_task_file(path, tasks):
+    """Write ``tasks`` as a JSON snapshot the way the app itself does."""
+    store = TaskStore()
+    store.extend(tasks)
+    TaskJournal(path).write_snapshot(store.snapshot())
+
+
+def best_of(repeat, fn, setup=None):
+    """Return the fastest of ``repeat`` timed calls of ``fn(setup())``."""
+    best = None
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def first_batch(path):
+    for kind, _ in open_storage(path).stream():
+        if kind == 'active':
+            return
+
+
+def load_store(path, mapped=False):
+    store = TaskStore(open_storage(path, mapped=mapped))
+    store.load()
+    return store
+
+
+def run_engine(size, workdir, repeat):
+    """Time the engine operations on one synthetic list of ``size`` tasks."""
+    results = {}
+    now = datetime.now()
+    json_path = os.path.join(workdir, f"tasks_{size}.json")
+    db_path = os.path.join(workdir, f"tasks_{size}.db")
+    binary_path = os.path.join(workdir, f"tasks_{size}.todo")
+    raw_path = os.path.join(workdir, f"tasks_{size}_raw.todo")
+    write_task_file(json_path, synthetic_tasks(size))
+    convert_task_file(json_path, db_path)
+    convert_task_file(json_path, binary_path)
+    convert_task_file(json_path, raw_path, compression='none')
+
+    results["load_json"] = best_of(repeat, lambda: load_store(json_path).storage.close())
+    results["stream_first_batch_json"] = best_of(repeat, lambda: first_batch(json_path))
+    results["load_binary"] = best_of(repeat, lambda: load_store(binary_path).storage.close())
+    results["stream_first_batch_binary"] = best_of(repeat, lambda: first_batch(binary_path))
+    results["load_mapped"] = best_of(
+        repeat, lambda: load_store(raw_path, mapped=True).storage.close())
+    results["load_sqlite"] = best_of(repeat, lambda: load_store(db_path).storage.close())
+
+    store = load_store(json_path)
+    store.storage.close()
+    snapshot_path = os.path.join(workdir, "snapshot.json")
+    results["save_snapshot"] = best_of(
+        repeat, lambda: TaskJournal(snapshot_path).write_snapshot(store.snapshot()))
+
+    def journal_store():
+        path = os.path.join(workdir, "batch.json")
+        for suffix in ("", ".journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        batch_store = TaskStore(TaskJournal(path))
+        batch_store.extend(synthetic_tasks(size, seed=1))
+        return batch_store
+    results["save_batch_1000"] = best_of(
+        repeat,
+        lambda s: s.update_many({i: {'priority': Priority.HIGH} for i in range(1, 1001)}),
+        setup=journal_store)
+
+    for filter_type in FILTERS:
+        results[f"filter:{filter_type}"] = best_of(repeat, lambda: store.filter(filter_type, now))
+
+    sqlite_store = load_store(db_path)
+    for filter_type in FILTERS:
+        results[f"filter_sqlite:{filter_type}"] = best_of(
+            repeat, lambda: sqlite_store.filter(filter_type, now))
+    sqlite_store.storage.close()
+
+    results["search_build"] = best_of(
+        repeat, lambda index: index.match("report"), setup=lambda: SearchIndex(store))
+    index = SearchIndex(store)
+    index.match("report")
+    for query in SEARCHES:
+        def search(query=query):
+            index.last_query = None  # time a cold query, not the narrowing cache
+            index.search(query)
+        results[f"search:{query}"] = best_of(repeat, search)
+
+    # The list refresh reads the order SortedOrders maintains: time building
+    # it once, from loaded tasks and from a mapped file, then keeping it
+    # current across an edit
+    def sort_urgency(orders):
+        orders.sorted('urgency')
+        orders.store.unsubscribe(orders.on_change)
+    results["sort:urgency"] = best_of(repeat, sort_urgency, setup=lambda: SortedOrders(store))
+    mapped_store = load_store(raw_path, mapped=True)
+    results["sort:urgency_mapped"] = best_of(
+        repeat, sort_urgency, setup=lambda: SortedOrders(mapped_store))
+    mapped_store.storage.close()
+    edited = TaskStore()
+    edited.extend(synthetic_tasks(size))
+    orders = SortedOrders(edited)
+    orders.sorted('urgency')
+    pending = sorted(edited.by_status[False])
+
+    def sort_update():
+        edited.update(random.choice(pending), priority=random.choice(list(Priority)))
+        orders.sorted('urgency')
+    results["sort:urgency_update"] = best_of(repeat, sort_update)
+    tasks = list(store)
+    results["sort:id"] = best_of(repeat, lambda: sorted(tasks, key=lambda t: t.id))
+
+    def reminder_scan():
+        scheduler = ReminderScheduler(store, lambda due: None)
+        scheduler.pop_due(now + timedelta(days=1))
+    results["reminder_scan"] = best_of(repeat, reminder_scan)
+    results["counters"] = best_of(repeat, lambda: TaskCounters(store))
+    return results
+
+
+def start_xvfb():
+    """Start a private Xvfb server if there is no display; return it or None."""
+    if os.environ.get("DISPLAY") or not shutil.which("Xvfb"):
+        return None
+    display = ":%d" % (90 + os.getpid() % 100)
+    server = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1)
+    os.environ["DISPLAY"] = display
+    return server
+
+
+def run_tk(size, workdir, repeat):
+    """Time GUI startup and list refreshes on a real (possibly virtual) display."""
+    import tkinter as tk
+
+    spec = importlib.util.spec_from_file_location("todo_gui", os.path.join(ROOT, "To-Do List GUI.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    gui.TodoGUI.show_reminders = lambda self, reminders: None  # no modal popups
+
+    path = os.path.join(workdir, f"tk_{size}.json")
+    write_task_file(path, synthetic_tasks(size))
+    results = {}
+    root = tk.Tk()
+    start = time.perf_counter()
+    app = gui.TodoGUI(root, path)
+    while app.store.loading:
+        root.update()
+    results["tk_startup"] = time.perf_counter() - start
+
+    def refresh():
+        app.refresh_task_list()
+        root.update_idletasks()
+    results["tk_refresh"] = best_of(repeat, refresh)
+
+    def scroll():
+        app.task_list.yview('moveto', random.random())
+        root.update_idletasks()
+    results["tk_scroll_jump"] = best_of(repeat, scroll)
+
+    app.search_var.set("client meeting")
+    results["tk_search_refresh"] = best_of(repeat, refresh)
+    app.on_closing()
+    return results
+
+
+def compare(results, baseline, threshold, noise):
+    """Print a comparison table and return the list of failed benchmarks."""
+    failures = []
+    for size, timings in results.items():
+        for name, seconds in sorted(timings.items()):
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                print(f"{size:>8}  {name:<36} {seconds:10.4f}s   (no baseline)")
+                continue
+            ratio = seconds / base if base else float('inf')
+            failed = ratio > threshold and seconds - base > noise
+            print(f"{size:>8}  {name:<36} {seconds:10.4f}s  {ratio:6.2f}x  "
+                  f"{'FAIL' if failed else 'ok'}")
+            if failed:
+                failures.append(f"{size}/{name}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the to-do list engine")
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="comma-separated task counts (default 10000,100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, best kept")
+    parser.add_argument("--tk", action="store_true",
+                        help="also time the Treeview (starts Xvfb when there is no display)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="fail when this many times slower than the baseline")
+    parser.add_argument("--noise", type=float, default=0.005,
+                        help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {}
+    xvfb = start_xvfb() if args.tk else None
+    workdir = tempfile.mkdtemp(prefix="todo-bench-")
+    try:
+        for size in sizes:
+            print(f"Benchmarking {size} tasks...", file=sys.stderr)
+            results[str(size)] = run_engine(size, workdir, args.repeat)
+            if args.tk:
+                if os.environ.get("DISPLAY"):
+                    results[str(size)].update(run_tk(size, workdir, args.repeat))
+                else:
+                    print("Skipping Tk benchmarks: no display and no Xvfb", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+    failures = compare(results, baseline, args.threshold, args.noise)
+    if failures:
+        print(f"{len(failures)} benchmark(s) regressed: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
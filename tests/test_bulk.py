@@ -0,0 +1,38 @@
+"""CSV import and export on the process pool."""
+
+import io
+import multiprocessing
+
+import pytest
+
+from todo_engine import Task, export_tasks, read_import
+
+CSV = ('description,priority\r\n'
+       '"first line\r\nsecond line\r\nthird line",high\r\n'
+       'bad priority,7\r\n'
+       '"two\r\nlines",low\r\n'
+       '"also\r\nbad",sometimes\r\n')
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_csv_errors_name_the_line_the_row_starts_on(tmp_path, workers):
+    path = tmp_path / "tasks.csv"
+    path.write_bytes(CSV.encode() * 3)  # later copies land in other blocks
+    result = read_import(str(path), workers=workers, block_size=40,
+                         mp_context=multiprocessing.get_context('spawn'))
+    assert [task.description for task in result.tasks] == [
+        "first line\r\nsecond line\r\nthird line", "two\r\nlines"]
+    assert result.duplicates == 4
+    # The header repeats in each copy and is itself a row with a bad priority
+    assert [error.split(':')[0] for error in result.errors] == [
+        "Line 5", "Line 8", "Line 10", "Line 14", "Line 17", "Line 19", "Line 23", "Line 26"]
+
+
+def test_export_on_a_spawned_pool():
+    tasks = [Task(i, f"task {i}") for i in range(1, 8)]
+    out = io.StringIO(newline='')
+    count = export_tasks(tasks, out, 'csv', workers=2, chunk_size=2,
+                         mp_context=multiprocessing.get_context('spawn'))
+    assert count == 7
+    lines = out.getvalue().split("\r\n")
+    assert [line.split(',')[1] for line in lines[1:-1]] == [f"task {i}" for i in range(1, 8)]
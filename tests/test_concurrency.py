@@ -0,0 +1,173 @@
+"""Stress the store from several threads at once, the way the reminder
+thread, loader and Tk thread do, then check that every index and running
+aggregate still agrees with the tasks themselves."""
+
+import queue
+import random
+import threading
+from datetime import datetime, timedelta
+
+from todo_engine import (AsyncStorage, FILTERS, ChangeTracker, Priority, SearchIndex,
+                         SortedOrders, Task, TaskCounters, TaskJournal, TaskStore)
+
+THREADS = 4
+ROUNDS = 400
+
+
+def mutate_once(store, rng, label, now):
+    """Make one random add, batch add, update or remove."""
+    action = rng.random()
+    with store.lock:
+        ids = list(store.tasks)
+    if action < 0.4 or not ids:
+        deadline = now + timedelta(hours=rng.randint(-48, 48)) if rng.random() < 0.7 else None
+        store.add(Task(None, f"task {label} {rng.randint(0, 999)}", deadline=deadline,
+                       priority=rng.choice(list(Priority))))
+    elif action < 0.55:
+        store.add_many([Task(None, f"batch {label} {i}") for i in range(rng.randint(1, 5))])
+    else:
+        task_id = rng.choice(ids)
+        with store.lock:
+            if task_id not in store.tasks:
+                return  # another thread removed it first
+            if action < 0.8:
+                store.update(task_id, completed=not store.tasks[task_id].completed,
+                             priority=rng.choice(list(Priority)),
+                             description=f"edited {label} {rng.randint(0, 999)}")
+            elif action < 0.9:
+                store.update(task_id, deadline=now + timedelta(hours=rng.randint(-48, 48)))
+            else:
+                store.remove(task_id)
+
+
+def mutate(store, seed, posted, errors):
+    """Mutate from a worker thread, handing some edits to the UI thread
+    the way the reminder worker posts through ``post_to_ui``."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    try:
+        for _ in range(ROUNDS):
+            if rng.random() < 0.25:
+                posted.put(seed)
+            else:
+                mutate_once(store, rng, seed, now)
+    except Exception as e:  # surfaced by the test thread
+        errors.append(e)
+
+
+def read(store, stop, errors):
+    now = datetime.now()
+    try:
+        while not stop.is_set():
+            for filter_type in FILTERS:
+                for task in store.filter(filter_type, now):
+                    assert task.id is not None
+            with store.lock:
+                check_indexes(store)
+            store.snapshot()
+    except Exception as e:
+        errors.append(e)
+
+
+def check_indexes(store):
+    tasks = list(store.tasks.values())
+    assert store.by_status[False] == {task.id for task in tasks if not task.completed}
+    assert store.by_status[True] == {task.id for task in tasks if task.completed}
+    for priority in Priority:
+        assert store.by_priority[priority] == {task.id for task in tasks
+                                               if task.priority == priority}
+    assert store.by_deadline == sorted((task.deadline, task.id) for task in tasks if task.deadline)
+    assert all(task_id < store.next_id for task_id in store.tasks)
+
+
+def check_counters(store, counters):
+    pending = [task for task in store if not task.completed]
+    assert counters.total == len(store)
+    assert counters.pending == len(pending)
+    assert counters.completed == len(store) - len(pending)
+    for priority in Priority:
+        assert counters.by_priority[priority] == sum(1 for task in pending
+                                                     if task.priority == priority)
+    assert counters.overdue == sum(1 for task in pending
+                                   if task.deadline and task.deadline < counters.as_of)
+
+
+def check_changes(store, tracker, first_id):
+    added, modified, removed = tracker.drain()
+    assert added == {task_id for task_id in store.tasks if task_id >= first_id}
+    assert modified <= set(store.tasks) and not modified & added
+    assert not removed & set(store.tasks)
+
+
+def hammer(store):
+    orders = SortedOrders(store)
+    index = SearchIndex(store)
+    counters = TaskCounters(store)
+    tracker = ChangeTracker(store)
+    orders.sorted('urgency')
+    index.match('task')
+    first_id = store.next_id
+    errors = []
+    posted = queue.Queue()
+    stop = threading.Event()
+    writers = [threading.Thread(target=mutate, args=(store, seed, posted, errors))
+               for seed in range(THREADS)]
+    readers = [threading.Thread(target=read, args=(store, stop, errors)) for _ in range(2)]
+    for thread in writers + readers:
+        thread.start()
+    # This thread stands in for the Tk thread: it runs what the workers
+    # post and makes edits of its own while they keep going
+    rng = random.Random(THREADS)
+    now = datetime.now()
+    while any(thread.is_alive() for thread in writers) or not posted.empty():
+        try:
+            seed = posted.get(timeout=0.001)
+        except queue.Empty:
+            seed = 'ui'
+        mutate_once(store, rng, seed, now)
+    stop.set()
+    for thread in writers + readers:
+        thread.join()
+    assert errors == []
+
+    check_indexes(store)
+    check_counters(store, counters)
+    check_changes(store, tracker, first_id)
+    assert orders.sorted('urgency') == sorted(orders.entry('urgency', task) for task in store)
+    fresh = SearchIndex(store)
+    for query in ('task', 'edited', 'batch 2', '1'):
+        assert index.match(query) == fresh.match(query)
+    return store
+
+
+def saved_tasks(storage):
+    next_id, tasks = storage.load_tasks()
+    return next_id, {task.id: task.to_dict() for task in tasks}
+
+
+def test_concurrent_mutations_in_memory():
+    hammer(TaskStore())
+
+
+def test_concurrent_mutations_journal(tmp_path):
+    path = str(tmp_path / "todos.json")
+    store = TaskStore(TaskJournal(path, compact_every=50))
+    store.load()
+    hammer(store)
+    store.storage.close()
+    reopened = TaskJournal(path)
+    next_id, tasks = saved_tasks(reopened)
+    assert tasks == {task.id: task.to_dict() for task in store}
+    assert next_id == store.next_id
+    reopened.close()
+
+
+def test_concurrent_mutations_async(tmp_path):
+    path = str(tmp_path / "todos.todo")
+    store = TaskStore(AsyncStorage(TaskJournal(path, compact_every=50, snapshot_format='binary')))
+    store.load()
+    hammer(store)
+    store.storage.close()
+    reopened = TaskJournal(path)
+    assert saved_tasks(reopened)[1] == {task.id: task.to_dict() for task in store}
+    reopened.close()
@@ -0,0 +1,86 @@
+"""Several processes writing one task file at the same time."""
+
+import multiprocessing
+import random
+import time
+
+import pytest
+
+from todo_engine import AsyncStorage, Priority, Task, TaskJournal, TaskStore, open_storage
+
+pytest.importorskip('fcntl')
+
+WRITERS = 3
+STEPS = 150
+
+
+def write(n, path, write_behind, done, results):
+    rng = random.Random(n)
+    journal = TaskJournal(path, compact_every=25)
+    storage = AsyncStorage(journal, delay=0.001) if write_behind else journal
+    store = TaskStore(storage)
+    store.load()
+    mine = []
+    for i in range(STEPS):
+        action = rng.random()
+        if action < 0.6 or not mine:
+            mine.append(store.add(Task(None, f"writer {n} task {i}")).id)
+        elif action < 0.8:
+            task_id = rng.choice(mine)
+            store.update(task_id, description=store.get(task_id).description + " edited")
+        elif action < 0.85:
+            store.remove(mine.pop(rng.randrange(len(mine))))
+        else:
+            # Only the owner touches a task, so a removal cannot be undone by
+            # another writer's update arriving after it
+            store.update(rng.choice(mine), priority=rng.choice(list(Priority)))
+        if rng.random() < 0.3:
+            changes = storage.poll_changes()
+            if changes:
+                store.merge(*changes)
+    if write_behind:
+        storage.flush()
+    if journal.compaction_thread:
+        journal.compaction_thread.join()
+    done.wait()  # nobody writes from here on
+
+    quiet = 0
+    while quiet < 10:
+        changes = storage.poll_changes()
+        if changes:
+            store.merge(*changes)
+            quiet = 0
+        else:
+            quiet += 1
+        time.sleep(0.02)
+    results.put((n, {task.id: task.to_dict() for task in store}, mine))
+    storage.close()
+
+
+@pytest.mark.parametrize('write_behind', [False, True], ids=['sync', 'async'])
+@pytest.mark.parametrize('extension', ['json', 'todo'])
+def test_writers_lose_nothing(tmp_path, extension, write_behind):
+    path = str(tmp_path / f"todos.{extension}")
+    context = multiprocessing.get_context('spawn')
+    done = context.Barrier(WRITERS)
+    results = context.Queue()
+    writers = [context.Process(target=write, args=(n, path, write_behind, done, results))
+               for n in range(WRITERS)]
+    for writer in writers:
+        writer.start()
+    states = [results.get(timeout=120) for _ in writers]
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    store = TaskStore(open_storage(path))
+    store.load()
+    saved = {task.id: task.to_dict() for task in store}
+    store.storage.close()
+    assert len(saved) == sum(len(mine) for _, _, mine in states)
+    for n, state, mine in states:
+        # Every task a writer kept is saved under the id it was given, which
+        # no other writer was handed
+        for task_id in mine:
+            assert saved[task_id]['description'].startswith(f"writer {n} ")
+        assert state == saved, f"writer {n} missed changes the others saved"
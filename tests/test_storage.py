@@ -0,0 +1,197 @@
+"""Storage backends faced with damaged task files."""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from todo_engine import (FILTERS, SORT_KEYS, STORAGE_ERRORS, BinarySnapshot, MappedSnapshot,
+                         MappedTasks, Priority, SortedOrders, Task, TaskJournal, TaskStore,
+                         open_storage)
+
+
+def streamed_ids(storage):
+    return sorted(task.id for kind, batch in storage.stream(batch_size=3)
+                  if kind in ('active', 'history') for task in batch)
+
+
+def write_tasks(path, count=10):
+    store = TaskStore(open_storage(path))
+    store.load()
+    for i in range(count):
+        store.add(Task(None, f"task {i}", completed=i >= 7))
+    store.storage.compact(store.snapshot())
+    store.storage.close()
+
+
+def append_journal(path, *records):
+    with open(path + ".journal", 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.mark.parametrize('extension', ['json', 'todo'])
+def test_bad_records_are_skipped(tmp_path, extension):
+    path = str(tmp_path / f"todos.{extension}")
+    write_tasks(path)
+    if extension == 'json':
+        with open(path) as f:
+            data = json.load(f)
+        data['tasks'][2]['priority'] = 'bogus'
+        data['tasks'][4] = {'description': 'no id'}
+        with open(path, 'w') as f:
+            json.dump(data, f)
+    else:
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        for position in (2, 4):
+            flags = (len(BinarySnapshot.MAGIC) + BinarySnapshot.HEADER.size +
+                     position * BinarySnapshot.RECORD.size + 8)
+            data[flags] |= 3 << 2  # no such priority
+        with open(path, 'wb') as f:
+            f.write(data)
+    append_journal(path, {'op': 'put', 'task': {'id': 11, 'description': 'journaled'}},
+                   {'op': 'unknown'}, {'no op': True},
+                   {'op': 'put', 'task': {'id': 12, 'priority': 'medium'}},
+                   {'op': 'put', 'task': {'id': 13, 'description': 'after the bad ones'}})
+
+    storage = open_storage(path)
+    expected = [1, 2, 4, 6, 7, 8, 9, 10, 11, 13]
+    assert sorted(task.id for task in storage.load_tasks()[1]) == expected
+    assert streamed_ids(storage) == expected
+    storage.close()
+
+
+def test_bad_journal_record_keeps_snapshot_copy(tmp_path):
+    path = str(tmp_path / "todos.json")
+    write_tasks(path)
+    append_journal(path, {'op': 'put', 'task': {'id': 3, 'description': 'x', 'priority': 'zzz'}})
+    storage = open_storage(path)
+    assert 3 in streamed_ids(storage)
+    storage.close()
+
+
+def test_bad_sqlite_rows_are_skipped(tmp_path):
+    path = str(tmp_path / "todos.db")
+    store = TaskStore(open_storage(path))
+    store.load()
+    for i in range(5):
+        store.add(Task(None, f"task {i}"))
+    store.storage.conn.execute("UPDATE tasks SET priority = 'bogus' WHERE id = 2")
+    store.storage.conn.commit()
+    assert streamed_ids(store.storage) == [1, 3, 4, 5]
+    store.storage.close()
+
+
+def damage(path, how):
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    if how == 'truncated header':
+        data = data[:20]
+    elif how == 'truncated body':
+        data = data[:len(data) // 2]
+    else:  # flip bits in the description block at the end
+        for i in range(len(data) - 12, len(data) - 2):
+            data[i] ^= 0xA5
+    with open(path, 'wb') as f:
+        f.write(bytes(data))
+
+
+@pytest.mark.parametrize('compression', ['none', 'zlib', 'lzma'])
+@pytest.mark.parametrize('how', ['truncated header', 'truncated body', 'corrupt block'])
+def test_damaged_binary_snapshot_raises_value_error(tmp_path, compression, how):
+    if compression == 'none' and how == 'corrupt block':
+        pytest.skip("an uncompressed block has no checksum to fail")
+    path = str(tmp_path / "todos.todo")
+    snapshot = {'next_id': 4, 'tasks': [{'id': i, 'description': f"task number {i}"}
+                                        for i in range(1, 4)]}
+    with open(path, 'wb') as f:
+        f.write(BinarySnapshot.encode(snapshot, compression))
+    damage(path, how)
+    with open(path, 'rb') as f, pytest.raises(ValueError):
+        BinarySnapshot.decode(f.read())
+
+
+@pytest.mark.parametrize('name,mapped', [('todos.json', False), ('todos.todo', False),
+                                         ('todos.todo', True)])
+@pytest.mark.parametrize('how', ['truncated header', 'truncated body', 'corrupt block'])
+def test_damaged_snapshot_keeps_journaled_tasks(tmp_path, name, mapped, how):
+    path = str(tmp_path / name)
+    if mapped:
+        storage = TaskJournal(path, snapshot_format='binary', compression='none')
+        store = TaskStore(storage)
+        store.load()
+        store.add_many([Task(None, f"task {i}") for i in range(10)])
+        storage.compact(store.snapshot())
+        storage.close()
+    else:
+        write_tasks(path)
+    damage(path, how)
+    append_journal(path, {'op': 'put', 'task': {'id': 20, 'description': 'journaled'}})
+
+    storage = open_storage(path, mapped=mapped)
+    tasks = storage.load_tasks()[1]
+    assert 20 in (tasks if isinstance(tasks, MappedTasks) else {task.id for task in tasks})
+    assert 20 in streamed_ids(storage)
+    storage.close()
+
+
+def test_damaged_sqlite_file_raises_storage_error(tmp_path):
+    path = str(tmp_path / "todos.db")
+    store = TaskStore(open_storage(path))
+    store.load()
+    store.add(Task(None, "task"))
+    store.storage.close()
+    damage(path, 'truncated body')
+    with pytest.raises(STORAGE_ERRORS):
+        open_storage(path).load_tasks()
+
+
+@pytest.mark.skipif(not hasattr(time, 'tzset'), reason="needs time.tzset")
+def test_binary_timestamps_ignore_time_zone(monkeypatch):
+    snapshot = {'next_id': 2, 'tasks': [{'id': 1, 'description': 'dst gap',
+                                         'created': '1969-06-01 00:00:01',
+                                         'deadline': '2026-03-08 02:30:00'}]}
+    encoded = set()
+    for zone in ('UTC', 'America/New_York', 'Asia/Kolkata'):
+        monkeypatch.setenv('TZ', zone)
+        time.tzset()
+        data = BinarySnapshot.encode(snapshot)
+        encoded.add(data)
+        task = next(BinarySnapshot.decode(data)[2])
+        assert task.created == datetime(1969, 6, 1, 0, 0, 1)
+        assert task.deadline == datetime(2026, 3, 8, 2, 30)
+    monkeypatch.delenv('TZ')
+    time.tzset()
+    assert len(encoded) == 1
+
+
+def test_mapped_store_sorts_without_building_tasks(tmp_path, monkeypatch):
+    path = str(tmp_path / "todos.todo")
+    storage = TaskJournal(path, snapshot_format='binary', compression='none')
+    store = TaskStore(storage)
+    store.load()
+    now = datetime(2026, 1, 1, 12)
+    store.add_many([Task(None, f"task {i}", completed=i % 3 == 0,
+                         completed_date=now - timedelta(days=i) if i % 3 == 0 else None,
+                         created=now - timedelta(hours=i) if i % 4 else None,
+                         priority=list(Priority)[i % 3],
+                         deadline=now + timedelta(hours=i - 20) if i % 2 else None)
+                    for i in range(60)])
+    storage.compact(store.snapshot())
+    storage.close()
+
+    loaded = TaskStore(open_storage(path))
+    loaded.load()
+    mapped = TaskStore(open_storage(path, mapped=True))
+    mapped.load()
+    assert isinstance(mapped.tasks, MappedTasks)
+    monkeypatch.setattr(MappedSnapshot, 'get', lambda self, task_id: pytest.fail("built a task"))
+    for order in SORT_KEYS:
+        assert SortedOrders(mapped).sorted(order) == SortedOrders(loaded).sorted(order)
+    for filter_type in FILTERS:
+        assert (sorted(mapped.filter_ids(filter_type, now)) ==
+                sorted(task.id for task in loaded.filter(filter_type, now)))
+    mapped.storage.close()
+    loaded.storage.close()
@@ -0,0 +1,31 @@
+"""Cross-list deadline summaries kept by the workspace manifest."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from todo_engine import Task, TaskStore, Workspace, open_storage
+
+
+@pytest.mark.parametrize('extension', ['json', 'todo', 'db'])
+def test_summary_follows_changes_made_elsewhere(tmp_path, extension):
+    now = datetime.now()
+    workspace = Workspace(str(tmp_path / "todos.lists.json"), str(tmp_path / f"todos.{extension}"),
+                          max_open=1)
+    workspace.create('Work')
+    workspace.open('Work').add(Task(None, "first", deadline=now - timedelta(hours=1)))
+    workspace.open('Default')  # closes Work and saves its summary
+    assert [task.description for _, task in workspace.due('Overdue', now)] == ["first"]
+
+    # Another process, e.g. the CLI, adds to the closed list
+    other = TaskStore(open_storage(workspace.file('Work')))
+    other.load()
+    other.add(Task(None, "second", deadline=now - timedelta(hours=2)))
+    other.storage.close()
+    assert [task.description for _, task in workspace.due('Overdue', now)] == ["second", "first"]
+
+    opened = []
+    workspace.make_storage = lambda path: opened.append(path) or open_storage(path)
+    workspace.due('Overdue', now)
+    assert opened == []  # nothing changed, so the summary answers
+    workspace.close_all()
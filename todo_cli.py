@@ -0,0 +1,242 @@
+"""Command-line interface to the to-do list, for scripts and cron jobs.
+
+Works on the same task files as the GUI:
+
+    python todo_cli.py add "Write report" --priority high --due 2024-05-01 --at 17:00
+    python todo_cli.py add "Stand-up" --due 2024-05-01 --at 09:30 --repeat daily
+    python todo_cli.py list --filter overdue
+    python todo_cli.py complete 12 13
+    python todo_cli.py search report
+    python todo_cli.py export tasks.json
+    python todo_cli.py export tasks.ics
+    python todo_cli.py import tasks.json
+    python todo_cli.py import backlog.csv
+    python todo_cli.py archive --days 30
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from todo_engine import (FILTERS, IMPORT_FORMATS, STORAGE_ERRORS, Priority, Recurrence,
+                         SearchIndex, Task, TaskArchive, TaskStore, bulk_format,
+                         completion_changes, export_tasks, format_timestamp, import_tasks,
+                         open_storage, parse_deadline, time_remaining)
+
+
+FILTER_NAMES = dict(zip(["all", "pending", "completed", "overdue", "today", "week"], FILTERS))
+FORMATS = ["json"] + sorted(set(IMPORT_FORMATS.values()))
+REPEAT_UNITS = {"daily": "day", "weekly": "week", "monthly": "month"}
+
+
+def format_task(task, now):
+    """Render one task as a line of ``list`` output."""
+    status = "x" if task.completed else " "
+    deadline = format_timestamp(task.deadline)[:16] if task.deadline else ""
+    left = "" if task.completed else time_remaining(task.deadline, now)
+    repeat = f" ({task.recurrence.label.lower()})" if task.recurrence else ""
+    return (f"{task.id:>5}  [{status}] {task.priority.label:<6}  "
+            f"{deadline:<16}  {left:<12}  {task.description}{repeat}")
+
+
+def cmd_add(store, args):
+    deadline = parse_deadline(args.due, args.at) if args.due else None
+    recurrence = None
+    if args.repeat:
+        recurrence = Recurrence(args.every, REPEAT_UNITS[args.repeat], deadline)
+    task = store.add(Task(None, args.description,
+                          created=datetime.now().replace(microsecond=0),
+                          priority=Priority(args.priority),
+                          deadline=deadline,
+                          recurrence=recurrence))
+    print(f"Added task {task.id}")
+    return 0
+
+
+def open_archive(args):
+    return TaskArchive(args.file + ".archive.gz")
+
+
+def cmd_list(store, args):
+    now = datetime.now()
+    tasks = store.filter(FILTER_NAMES[args.filter], now)
+    if args.archived:
+        tasks += [Task.from_dict(record) for record in open_archive(args).load()
+                  if record['id'] not in store.tasks]
+    for task in sorted(tasks, key=lambda t: t.id):
+        print(format_task(task, now))
+    return 0
+
+
+def cmd_archive(store, args):
+    cutoff = datetime.now() - timedelta(days=args.days)
+    tasks = store.archive_completed_before(cutoff, open_archive(args))
+    print(f"Archived {len(tasks)} tasks")
+    return 0
+
+
+def cmd_complete(store, args):
+    status = 0
+    completed_date = datetime.now().replace(microsecond=0)
+    changes = {}
+    for task_id in args.ids:
+        task = store.get(task_id)
+        if task is None:
+            print(f"No task with id {task_id}", file=sys.stderr)
+            status = 1
+        elif not task.completed:
+            changes[task_id] = completion_changes(task, completed_date)
+    for task in store.update_many(changes):
+        if task.recurrence:
+            print(f"Completed task {task.id}, next due {format_timestamp(task.deadline)[:16]}")
+        else:
+            print(f"Completed task {task.id}")
+    return status
+
+
+def cmd_search(store, args):
+    now = datetime.now()
+    for task_id in SearchIndex.scan(store, args.query, args.limit):
+        print(format_task(store.get(task_id), now))
+    return 0
+
+
+def file_format(args, path):
+    """The --format given, else the one the file name implies (JSON by default)."""
+    if args.format:
+        return args.format
+    if path != "-" and os.path.splitext(path)[1].lower() in IMPORT_FORMATS:
+        return bulk_format(path)
+    return "json"
+
+
+def cmd_export(store, args):
+    fmt = file_format(args, args.output)
+    if fmt != "json":
+        tasks = sorted(store, key=lambda t: t.id)
+        if args.output == "-":
+            export_tasks(tasks, sys.stdout, fmt, args.workers)
+        else:
+            with open(args.output, 'w', encoding='utf-8', newline='') as f:
+                export_tasks(tasks, f, fmt, args.workers)
+            print(f"Exported {len(tasks)} tasks to {args.output}", file=sys.stderr)
+        return 0
+    tasks = [task.to_dict() for task in sorted(store, key=lambda t: t.id)]
+    if args.output == "-":
+        json.dump(tasks, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(tasks, f, indent=2)
+        print(f"Exported {len(tasks)} tasks to {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_import(store, args):
+    """Add the tasks from a task list, task file, CSV, JSON Lines or iCalendar file.
+
+    Everything gets fresh ids. CSV, JSON Lines and iCalendar rows that
+    repeat a task already in the list are skipped, and invalid rows are
+    reported without stopping the import.
+    """
+    fmt = file_format(args, args.input)
+    if fmt != "json":
+        result = import_tasks(store, args.input, fmt, args.workers)
+        for error in result.errors:
+            print(error, file=sys.stderr)
+        if result.skipped > len(result.errors):
+            print(f"... and {result.skipped - len(result.errors)} more invalid rows",
+                  file=sys.stderr)
+        print(f"Imported {len(result.tasks)} tasks ({result.duplicates} duplicates, "
+              f"{result.skipped} invalid rows skipped)")
+        return 1 if result.skipped else 0
+    with open(args.input, 'r') as f:
+        data = json.load(f)
+    records = data['tasks'] if isinstance(data, dict) else data
+    tasks = store.add_many([Task.from_dict(dict(record, id=None)) for record in records])
+    print(f"Imported {len(tasks)} tasks")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Manage the to-do list from the command line")
+    parser.add_argument("--file", default="todos_gui.json",
+                        help="task file to use (.json, .todo for binary, or .db for SQLite)")
+    parser.add_argument("--mapped", action="store_true",
+                        help="memory-map an uncompressed .todo file instead of loading it")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a task")
+    add.add_argument("description")
+    add.add_argument("--priority", choices=[p.value for p in Priority], default="medium")
+    add.add_argument("--due", metavar="YYYY-MM-DD", help="deadline date")
+    add.add_argument("--at", metavar="HH:MM", help="deadline time (default 23:59)")
+    add.add_argument("--repeat", choices=list(REPEAT_UNITS),
+                     help="repeat from the deadline; completing the task moves it on")
+    add.add_argument("--every", type=int, default=1, metavar="N",
+                     help="with --repeat, repeat every N days, weeks or months")
+    add.set_defaults(handler=cmd_add)
+
+    list_ = commands.add_parser("list", help="list tasks")
+    list_.add_argument("--filter", choices=list(FILTER_NAMES), default="all")
+    list_.add_argument("--archived", action="store_true", help="include archived tasks")
+    list_.set_defaults(handler=cmd_list)
+
+    complete = commands.add_parser("complete", help="mark tasks completed")
+    complete.add_argument("ids", nargs="+", type=int, metavar="ID")
+    complete.set_defaults(handler=cmd_complete)
+
+    search = commands.add_parser("search", help="search task descriptions")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int)
+    search.set_defaults(handler=cmd_search)
+
+    export = commands.add_parser("export", help="write all tasks to a file or stdout")
+    export.add_argument("output", nargs="?", default="-", help="output file (default stdout)")
+    import_ = commands.add_parser("import", help="add tasks from a file")
+    import_.add_argument("input")
+    for command in (export, import_):
+        command.add_argument("--format", choices=FORMATS,
+                             help="json, csv, jsonl (JSON Lines) or ics (iCalendar); "
+                                  "default from the file extension, else json")
+        command.add_argument("--workers", type=int, metavar="N",
+                             help="processes parsing or writing csv, jsonl and ics "
+                                  "(default one per CPU, 0 for none)")
+    export.set_defaults(handler=cmd_export)
+    import_.set_defaults(handler=cmd_import)
+
+    archive = commands.add_parser("archive", help="archive tasks completed a while ago")
+    archive.add_argument("--days", type=int, default=30,
+                         help="archive tasks completed more than this many days ago")
+    archive.set_defaults(handler=cmd_archive)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "add" and args.at and not args.due:
+        parser.error("--at needs --due")
+    if args.command == "add" and args.repeat and not args.due:
+        parser.error("--repeat needs --due")
+
+    try:
+        store = TaskStore(open_storage(args.file, mapped=args.mapped))
+        store.load()
+    except STORAGE_ERRORS as e:
+        print(f"Could not open {args.file}: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        return args.handler(store, args)
+    except (ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.storage.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3523 @@
+"""Tk-free task engine shared by the GUI and the command-line tool.
+
+Everything here works without a display, and importing it does not load
+tkinter.
+"""
+
+import bisect
+import calendar
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+
+try:
+    import fcntl
+except ImportError:  # Windows: task files are not locked between processes
+    fcntl = None
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FILTERS = ["All Tasks", "Pending", "Completed", "Overdue", "Due Today", "Due This Week"]
+STORAGE_ERRORS = (IOError, OSError, sqlite3.Error)
+# What a malformed task record raises while being turned into a Task
+RECORD_ERRORS = (LookupError, TypeError, ValueError, AttributeError, ArithmeticError)
+
+
+def batches(items, size):
+    """Split a list into consecutive slices of at most ``size`` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class TaskStorage:
+    """Interface between a ``TaskStore`` and its on-disk representation.
+
+    ``load`` returns ``{'next_id': ..., 'tasks': [task dicts]}`` and ``put``
+    and ``delete`` persist single mutations in the JSON task schema;
+    ``load_tasks`` and ``stream`` hand over ``Task`` objects instead, which
+    backends with a typed on-disk form can build without the dicts;
+    ``write_batch`` persists many at once, atomically where the backend
+    can. Backends that can answer the list filters themselves override
+    ``query_ids``; returning None leaves filtering to the store's indexes.
+    Backends whose files other processes may change at the same time
+    override ``reserve_ids`` and ``poll_changes``.
+    """
+
+    needs_compaction = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def load_tasks(self):
+        """Return ``(next_id, tasks)`` with every stored task as a ``Task``."""
+        data = self.load()
+        return data['next_id'], list(tasks_from_records(data['tasks']))
+
+    def stream(self, batch_size=1000):
+        """Yield the stored tasks as a sequence of loader events.
+
+        Events are ``('next_id', n)``, ``('active', tasks)``,
+        ``('ready', None)`` and ``('history', tasks)``. The id counter
+        and the pending tasks arrive before ``'ready'``, nearest deadline
+        first where the backend can manage it; completed tasks follow.
+        Once ``'ready'`` has been seen the store may be mutated. Backends
+        that can read incrementally override this default, which loads
+        everything up front.
+        """
+        next_id, tasks = self.load_tasks()
+        yield 'next_id', next_id
+        for batch in batches([t for t in tasks if not t.completed], batch_size):
+            yield 'active', batch
+        yield 'ready', None
+        for batch in batches([t for t in tasks if t.completed], batch_size):
+            yield 'history', batch
+
+    def put(self, record):
+        raise NotImplementedError
+
+    def delete(self, task_id):
+        raise NotImplementedError
+
+    def write_batch(self, records, deleted_ids):
+        for record in records:
+            self.put(record)
+        for task_id in deleted_ids:
+            self.delete(task_id)
+
+    def compact(self, snapshot):
+        pass
+
+    def query_ids(self, filter_type, now):
+        return None
+
+    def reserve_ids(self, next_id, count):
+        """Return the first of ``count`` fresh ids, no lower than ``next_id``."""
+        return next_id
+
+    def poll_changes(self):
+        """Return changes saved by other processes since the last call, or None.
+
+        Changes come as ``(records, complete)``: ``records`` maps task ids
+        to their record, or None for deleted tasks, and with ``complete``
+        set it holds every task, so tasks missing from it are gone.
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class TaskJournal(TaskStorage):
+    """Append-only write-ahead journal layered over a JSON snapshot.
+
+    Each mutation appends a single JSON record to ``<snapshot>.journal``
+    instead of rewriting the whole task file. Once the journal holds
+    ``compact_every`` records the owner calls ``compact``, which rotates
+    the journal aside and folds the current tasks into a fresh snapshot on
+    a background thread. ``load`` replays any rotated and live journal
+    records over the last good snapshot, so a crash at any point loses at
+    most the record being written.
+
+    Snapshots list pending tasks in deadline order ahead of completed ones,
+    so ``stream`` can hand over the active tasks while the history is still
+    being parsed.
+
+    The snapshot is JSON or, with ``snapshot_format='binary'``, a
+    ``BinarySnapshot`` whose description block uses ``compression``.
+    Reading sniffs the format of the file actually on disk and later
+    compactions keep writing that format. With ``mapped`` set an
+    uncompressed binary snapshot is memory-mapped rather than read, see
+    ``load_tasks``.
+
+    Several processes can share the files. Reads, appends and compactions
+    hold an ``fcntl`` lock on ``<snapshot>.lock``, and a compaction keeps it
+    until the new snapshot is in place. Before appending, a journal first
+    reads the records other processes appended since it last looked and
+    keeps them for ``poll_changes``, which otherwise costs two ``stat``
+    calls. A compaction ends the journal it folds in with a record naming
+    the snapshot that journal applied to, and keeps it as
+    ``<snapshot>.journal.prev``, so a process that was part way through it
+    reads just the rest from there. Only if another compaction has
+    replaced that too does the next poll return the whole task list.
+    Ids come from a counter in ``<snapshot>.ids`` so processes never hand
+    out the same one. Reading a task file that does not exist yet takes
+    no lock and so creates no files.
+    """
+
+    SNAPSHOT_HEADER = re.compile(r'\s*(?:\{\s*"next_id"\s*:\s*(\d+)\s*,\s*"tasks"\s*:\s*)?\[')
+
+    def __init__(self, snapshot_path, compact_every=500, snapshot_format='json',
+                 compression='zlib', mapped=False):
+        self.snapshot_path = snapshot_path
+        self.snapshot_format = snapshot_format
+        self.compression = compression
+        self.mapped = mapped
+        self.mapping = None
+        self.journal_path = snapshot_path + ".journal"
+        self.rotated_path = snapshot_path + ".journal.old"
+        self.previous_path = snapshot_path + ".journal.prev"
+        self.lock_path = snapshot_path + ".lock"
+        self.ids_path = snapshot_path + ".ids"
+        self.compact_every = compact_every
+        self.records = 0
+        self.journal = None
+        self.lock = threading.Lock()
+        self.lock_file = None
+        self.ids_lock = threading.Lock()
+        self.compaction_thread = None
+        self.journal_seen = (None, 0)  # inode of the live journal and bytes read of it
+        self.snapshot_seen = None      # file_state of the snapshot last read or written
+        self.external = {}             # id -> record or None, saved by other processes
+        self.stale = False             # another process compacted records we never read
+
+    @property
+    def needs_compaction(self):
+        return self.records >= self.compact_every
+
+    def load(self):
+        """Load the snapshot and replay journal records over it.
+
+        Returns a ``{'next_id': ..., 'tasks': [...]}`` dict. Snapshots from
+        before the id counter was persisted are plain task lists.
+        """
+        if not self.exists():
+            return {'next_id': 1, 'tasks': []}
+        self.acquire()
+        try:
+            return self.load_locked()
+        finally:
+            self.release()
+
+    def load_locked(self):
+        self.snapshot_seen = self.file_state(self.snapshot_path)
+        tasks = {}
+        next_id = 1
+        if os.path.exists(self.snapshot_path):
+            try:
+                if self.sniff_format() == 'binary':
+                    with open(self.snapshot_path, 'rb') as f:
+                        next_id, self.compression, snapshot = BinarySnapshot.decode(f.read())
+                    data = {'next_id': next_id, 'tasks': [task.to_dict() for task in snapshot]}
+                else:
+                    with open(self.snapshot_path, 'r') as f:
+                        data = json.load(f)
+                if isinstance(data, list):
+                    data = {'tasks': data}
+                for task in data['tasks']:
+                    try:
+                        tasks[task['id']] = task
+                    except RECORD_ERRORS as e:
+                        print(f"Skipping bad task record in {self.snapshot_path}: {e!r}")
+                next_id = data.get('next_id', next_id)
+            except (ValueError, KeyError, IOError, zlib.error):
+                tasks = {}
+
+        self.replay_journals(tasks)
+        if tasks:
+            next_id = max(next_id, max(tasks) + 1)
+        return {'next_id': next_id,
+                'tasks': [task for task in tasks.values() if task is not None]}
+
+    def load_tasks(self):
+        """Load ``Task`` objects, straight from the records for binary snapshots.
+
+        With ``mapped`` set and an uncompressed binary snapshot the tasks
+        come back as a ``MappedTasks`` mapping instead of a list.
+        """
+        if not os.path.exists(self.snapshot_path) or self.sniff_format() != 'binary':
+            return super().load_tasks()
+        overrides = {}
+        tasks = {}
+        next_id = 1
+        self.acquire()
+        try:
+            self.snapshot_seen = self.file_state(self.snapshot_path)
+            self.replay_journals(overrides)
+            if self.mapped:
+                try:
+                    self.mapping = MappedSnapshot(self.snapshot_path)
+                except ValueError as e:
+                    print(f"Cannot map {self.snapshot_path} ({e}); reading it whole")
+            try:
+                if self.mapping is not None:
+                    self.compression = 'none'
+                    next_id, tasks = self.mapping.next_id, MappedTasks(self.mapping)
+                    last_id = self.mapping.ids[-1] if len(self.mapping) else 0
+                else:
+                    next_id, tasks, _ = self.open_snapshot()
+                    tasks = {task.id: task for task in tasks}
+                    last_id = max(tasks, default=0)
+            except (ValueError, KeyError, IOError, zlib.error):
+                tasks = {}
+                last_id = 0
+        finally:
+            self.release()
+        for task_id, record in overrides.items():
+            if record is None:
+                tasks.pop(task_id, None)
+        journaled = (record for record in overrides.values() if record is not None)
+        for task in tasks_from_records(journaled, self.journal_path):
+            tasks[task.id] = task
+        next_id = max(next_id, last_id + 1, max(overrides, default=0) + 1)
+        if isinstance(tasks, MappedTasks):
+            return next_id, tasks
+        return next_id, list(tasks.values())
+
+    def stream(self, batch_size=1000):
+        """Yield loader events while parsing the snapshot incrementally.
+
+        Journal records are read first and win over the snapshot copy of a
+        task. Completed tasks are held back until every pending task has
+        been passed on, which for current snapshots happens as soon as the
+        first completed task is reached. Malformed records are skipped and
+        reported rather than ending the stream, so the tasks after them
+        still load and survive the next compaction.
+        """
+        if not self.exists():
+            yield from super().stream(batch_size)
+            return
+        overrides = {}
+        f = tasks = None
+        self.acquire()
+        try:
+            # Open the snapshot together with reading the journal, so a
+            # compaction by another process cannot come in between
+            self.snapshot_seen = self.file_state(self.snapshot_path)
+            self.replay_journals(overrides)
+            if self.snapshot_seen is not None:
+                saved_next_id, tasks, f = self.open_snapshot()
+        except (ValueError, KeyError, zlib.error) as e:
+            print(f"Snapshot read error: {e}")
+        finally:
+            self.release()
+        next_id = max(overrides, default=0) + 1
+        known = ready = False
+        journaled = list(tasks_from_records(
+            (record for record in overrides.values() if record is not None), self.journal_path))
+        # A journal record too broken to load leaves the snapshot copy in place
+        overridden = {task.id for task in journaled}
+        overridden.update(task_id for task_id, record in overrides.items() if record is None)
+        history = [task for task in journaled if task.completed]
+        for batch in batches([task for task in journaled if not task.completed], batch_size):
+            yield 'active', batch
+
+        active = []
+        try:
+            if tasks is not None:
+                if saved_next_id is not None:
+                    next_id = max(next_id, saved_next_id)
+                    known = True
+                    yield 'next_id', next_id
+                for task in tasks:
+                    next_id = max(next_id, task.id + 1)
+                    if task.id in overridden:
+                        continue
+                    if not task.completed:
+                        active.append(task)
+                        if len(active) >= batch_size:
+                            yield 'active', active
+                            active = []
+                        continue
+                    if known and not ready:
+                        if active:
+                            yield 'active', active
+                            active = []
+                        yield 'ready', None
+                        ready = True
+                    history.append(task)
+                    if ready and len(history) >= batch_size:
+                        yield 'history', history
+                        history = []
+        except (ValueError, KeyError, zlib.error) as e:
+            print(f"Snapshot read error: {e}")
+        finally:
+            if f is not None:
+                f.close()
+
+        if active:
+            yield 'active', active
+        if not ready:
+            if not known:
+                yield 'next_id', next_id
+            yield 'ready', None
+        for batch in batches(history, batch_size):
+            yield 'history', batch
+
+    def open_snapshot(self):
+        """Start reading the snapshot; return ``(next_id, tasks, file)``.
+
+        ``tasks`` yields ``Task`` objects as the snapshot is read and the
+        caller closes ``file`` once done with it (it is None for binary
+        snapshots, which are read in one go).
+        """
+        if self.sniff_format() == 'binary':
+            with open(self.snapshot_path, 'rb') as f:
+                next_id, self.compression, tasks = BinarySnapshot.decode(f.read())
+            return next_id, tasks, None
+        f = open(self.snapshot_path, 'r')
+        next_id, records = self.parse_snapshot(f)
+        return next_id, tasks_from_records(records, self.snapshot_path), f
+
+    def sniff_format(self):
+        """Detect the snapshot's format and keep writing it from now on."""
+        self.snapshot_format = 'binary' if BinarySnapshot.is_binary(self.snapshot_path) else 'json'
+        return self.snapshot_format
+
+    def parse_snapshot(self, f, chunk_size=1 << 16):
+        """Start parsing a snapshot file without reading all of it.
+
+        Returns ``(next_id, records)``: ``next_id`` is None for legacy list
+        snapshots, and ``records`` yields task dicts as the file is read.
+        """
+        buf = f.read(chunk_size)
+        header = self.SNAPSHOT_HEADER.match(buf)
+        if header is None:
+            # Not laid out the way write_snapshot does it; parse it whole
+            data = json.loads(buf + f.read())
+            if isinstance(data, list):
+                return None, iter(data)
+            return data.get('next_id'), iter(data['tasks'])
+        next_id = int(header.group(1)) if header.group(1) else None
+
+        def records(buf, pos):
+            decoder = json.JSONDecoder()
+            separator = re.compile(r'[\s,]*')
+            while True:
+                pos = separator.match(buf, pos).end()
+                if pos < len(buf) and buf[pos] == ']':
+                    return
+                try:
+                    if pos >= len(buf):
+                        raise ValueError("need more input")
+                    record, pos = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        raise ValueError("Snapshot ends inside the task list")
+                    buf, pos = buf[pos:] + chunk, 0
+                    continue
+                yield record
+
+        return next_id, records(buf, header.end())
+
+    def replay_journals(self, tasks):
+        """Replay the rotated and live journals; call with the lock held."""
+        self.replay(self.rotated_path, tasks)
+        self.records = self.replay(self.journal_path, tasks)
+        journal = self.file_state(self.journal_path)
+        self.journal_seen = (journal[0], journal[2]) if journal else (None, 0)
+        self.external = {}
+        self.stale = False
+
+    def replay(self, path, tasks):
+        """Apply the records in a journal file and return how many tasks
+        they touched.
+
+        Deleted tasks are left in ``tasks`` as None so the caller can tell
+        them apart from tasks the journal never mentioned. A torn record at
+        the tail (from a crash mid-append) is discarded and truncated away
+        so later appends start on a clean line.
+        """
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        good_offset = 0
+        with open(path, 'rb+') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                try:
+                    count += self.apply_record(record, tasks)
+                except RECORD_ERRORS as e:
+                    print(f"Skipping bad journal record in {path}: {e!r}")
+                good_offset += len(line)
+            f.truncate(good_offset)
+        return count
+
+    @staticmethod
+    def apply_record(record, tasks):
+        """Apply one journal record to ``tasks``; return how many tasks it touched."""
+        if record['op'] == 'put':
+            task = record['task']
+            tasks[task['id']] = task
+            return 1
+        elif record['op'] == 'delete':
+            tasks[record['id']] = None
+            return 1
+        elif record['op'] == 'batch':
+            for task in record['tasks']:
+                tasks[task['id']] = task
+            for task_id in record['deleted']:
+                tasks[task_id] = None
+            return len(record['tasks']) + len(record['deleted'])
+        return 0
+
+    @staticmethod
+    def file_state(path):
+        """Return ``(inode, mtime, size)`` of a file, or None if it is missing."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def exists(self):
+        """Return whether the snapshot or a journal is on disk."""
+        return any(os.path.exists(path)
+                   for path in (self.snapshot_path, self.journal_path, self.rotated_path))
+
+    def acquire(self, blocking=True):
+        """Take ``lock`` and the file lock that other processes take too.
+
+        Returns False, holding neither, if ``blocking`` is off and either
+        is taken.
+        """
+        if not self.lock.acquire(blocking):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            if self.lock_file is None:
+                self.lock_file = open(self.lock_path, 'a')
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            self.lock.release()
+            return False
+        except BaseException:
+            self.lock.release()
+            raise
+        return True
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock.release()
+
+    def catch_up(self):
+        """Read the journal records other processes appended since we last looked.
+
+        Call with the lock held. The records are collected in ``external``
+        until ``poll_changes`` hands them over. If the journal we were
+        reading has been compacted away, the rest of it is read from the
+        copy the compaction kept; when that is gone too ``stale`` is set.
+        """
+        inode, offset = self.journal_seen
+        journal = self.file_state(self.journal_path)
+        # A new snapshot means the journal was compacted, whatever its inode
+        compacted = self.file_state(self.snapshot_path) != self.snapshot_seen
+        if compacted or (journal[0] if journal else None) != inode:
+            if (compacted or inode is not None) and not self.catch_up_compacted(inode, offset):
+                self.stale = True
+                self.snapshot_seen = self.file_state(self.snapshot_path)  # the poll reloads
+            offset = 0
+            self.records = 0  # only the new journal is left to compact
+        if journal is None:
+            self.journal_seen = (None, 0)
+            return
+        if journal[2] > offset:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn by a crash; the next load truncates it
+                    self.records += self.apply_record(json.loads(line), self.external)
+                    offset += len(line)
+        self.journal_seen = (journal[0], offset)
+
+    def catch_up_compacted(self, inode, offset):
+        """Read the rest of a journal another process compacted away.
+
+        The rotated journal, or the copy a finished compaction kept, ends
+        with a record naming the snapshot it applied to. If that is the
+        snapshot we last read, the records after ``offset`` are all we
+        missed. Returns False if no such journal is left.
+        """
+        seen = list(self.snapshot_seen) if self.snapshot_seen else None
+        for path in (self.rotated_path, self.previous_path):
+            state = self.file_state(path)
+            if state is None or (inode is not None and state[0] != inode) or state[2] < offset:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                lines = f.read().splitlines()
+            try:
+                trailer = json.loads(lines[-1])
+            except (IndexError, ValueError):
+                continue
+            if trailer.get('op') != 'compacted' or trailer.get('over') != seen:
+                continue
+            for line in lines[:-1]:
+                self.apply_record(json.loads(line), self.external)
+            self.snapshot_seen = self.file_state(self.snapshot_path)
+            return True
+        return False
+
+    def poll_changes(self):
+        """Return task changes other processes saved since the last call, or None.
+
+        Costs two ``stat`` calls when nothing changed, and never waits for
+        the lock: while another thread or process holds it this returns
+        None and the changes come with a later poll.
+        """
+        journal = self.file_state(self.journal_path)
+        journal_seen = (journal[0], journal[2]) if journal else (None, 0)
+        if (journal_seen == self.journal_seen and not self.external and not self.stale and
+                self.file_state(self.snapshot_path) == self.snapshot_seen):
+            return None
+        if not self.acquire(blocking=False):
+            return None
+        try:
+            self.catch_up()
+            if self.stale or self.file_state(self.snapshot_path) != self.snapshot_seen:
+                # Compacted by another process: compare against everything
+                data = self.load_locked()
+                return {task['id']: task for task in data['tasks']}, True
+            records, self.external = self.external, {}
+            return (records, False) if records else None
+        finally:
+            self.release()
+
+    def reserve_ids(self, next_id, count):
+        """Take ids from the counter in ``<snapshot>.ids`` shared between processes."""
+        if fcntl is None:
+            return next_id
+        with self.ids_lock:
+            fd = os.open(self.ids_path, os.O_RDWR | os.O_CREAT, 0o644)
+            with open(fd, 'r+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                saved = f.read().strip()
+                first = max(next_id, int(saved) if saved.isdigit() else 1)
+                f.seek(0)
+                f.truncate()
+                f.write(str(first + count))
+            return first
+
+    def put(self, task):
+        """Record the current state of a task."""
+        self.append({'op': 'put', 'task': task})
+
+    def delete(self, task_id):
+        """Record the removal of a task."""
+        self.append({'op': 'delete', 'id': task_id})
+
+    def write_batch(self, records, deleted_ids):
+        """Record many changes as one journal line, so they apply all or none."""
+        self.append({'op': 'batch', 'tasks': records, 'deleted': list(deleted_ids)},
+                    weight=len(records) + len(deleted_ids))
+
+    def append(self, record, weight=1):
+        """Append one record to the journal and make it durable.
+
+        ``weight`` is how many tasks the record touches, which is what the
+        compaction threshold counts.
+        """
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        self.acquire()
+        try:
+            self.catch_up()
+            # Our record is newer than what others saved for the same tasks
+            written = {}
+            self.apply_record(record, written)
+            for task_id in written:
+                self.external.pop(task_id, None)
+            if (self.journal is not None and
+                    os.fstat(self.journal.fileno()).st_ino != self.journal_seen[0]):
+                # Another process rotated the journal we had open
+                self.journal.close()
+                self.journal = None
+            if self.journal is None:
+                self.journal = open(self.journal_path, 'a')
+            self.journal.write(line)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.records += weight
+            st = os.fstat(self.journal.fileno())
+            self.journal_seen = (st.st_ino, st.st_size)
+        finally:
+            self.release()
+
+    def compact(self, snapshot):
+        """Rotate the journal and write ``snapshot`` in the background.
+
+        ``snapshot`` must already include every record journaled so far.
+        Changes other processes saved that it has not seen are folded in
+        first. The lock is held until the new snapshot is in place.
+        """
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            return
+
+        self.acquire()
+        try:
+            seen = self.snapshot_seen
+            self.catch_up()
+            if (self.snapshot_seen != seen and not self.needs_compaction
+                    and not os.path.exists(self.rotated_path)):
+                # Another process compacted just now; what is left is short
+                self.release()
+                return
+            if self.stale:
+                # Records we never read were compacted away; the files have it all
+                snapshot = self.load_locked()
+                self.stale = True  # so the next poll compares every task
+            elif self.external:
+                snapshot = self.fold(snapshot, self.external)
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if os.path.exists(self.journal_path):
+                if os.path.exists(self.rotated_path):
+                    # A previous compaction never finished; keep its records.
+                    with open(self.journal_path, 'rb') as src, \
+                         open(self.rotated_path, 'ab') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.rotated_path)
+                # Tell processes part way through it which snapshot it applies to
+                with open(self.rotated_path, 'a') as f:
+                    f.write(json.dumps({'op': 'compacted',
+                                        'over': self.file_state(self.snapshot_path)}) + "\n")
+            self.records = 0
+            self.journal_seen = (None, 0)
+            self.compaction_thread = threading.Thread(
+                target=self.finish_compaction, args=(snapshot,), daemon=True)
+            self.compaction_thread.start()
+        except BaseException:
+            self.release()
+            raise
+
+    @staticmethod
+    def fold(snapshot, changes):
+        """Return ``snapshot`` with ``changes`` applied, in snapshot order."""
+        tasks = {task['id']: task for task in snapshot['tasks']}
+        tasks.update(changes)
+        records = [task for task in tasks.values() if task is not None]
+        records.sort(key=lambda task: (bool(task.get('completed')), task.get('deadline') is None,
+                                       task.get('deadline') or '', task['id']))
+        return {'next_id': max([snapshot['next_id']] + [task_id + 1 for task_id in changes]),
+                'tasks': records}
+
+    def finish_compaction(self, snapshot):
+        try:
+            self.write_snapshot(snapshot)
+        except (IOError, OSError) as e:
+            print(f"Snapshot compaction error: {e}")
+        finally:
+            self.release()
+
+    def write_snapshot(self, snapshot):
+        """Atomically replace the snapshot, then drop the rotated journal."""
+        if self.snapshot_format == 'binary':
+            data = BinarySnapshot.encode(snapshot, self.compression)
+        else:
+            data = json.dumps(snapshot, indent=2).encode('utf-8')
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.snapshot_seen = self.file_state(self.snapshot_path)
+        if os.path.exists(self.rotated_path):
+            # Kept for processes still part way through it, see catch_up
+            os.replace(self.rotated_path, self.previous_path)
+
+    def close(self):
+        """Close the journal and wait for any running compaction."""
+        if self.compaction_thread:
+            self.compaction_thread.join()
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+
+class Priority(Enum):
+    HIGH = 'high'
+    MEDIUM = 'medium'
+    LOW = 'low'
+
+    @property
+    def label(self):
+        return self.value.title()
+
+
+def parse_timestamp(value):
+    """Parse a stored ``YYYY-MM-DD HH:MM:SS`` string, passing through None."""
+    return datetime.fromisoformat(value) if value else None
+
+
+def format_timestamp(value):
+    """Format a datetime for storage, passing through None."""
+    return value.strftime(DATETIME_FORMAT) if value else None
+
+
+def parse_deadline(date_str, time_str=None):
+    """Parse a ``YYYY-MM-DD`` date and optional ``HH:MM`` time.
+
+    A date without a time means the end of that day. Raises ValueError for
+    anything else.
+    """
+    if time_str:
+        return datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+    return datetime.strptime(date_str, "%Y-%m-%d").replace(hour=23, minute=59)
+
+
+def time_remaining(deadline, now=None):
+    """Describe the time left until ``deadline``, e.g. ``3d left``."""
+    if not deadline:
+        return ""
+    return time_remaining_until(deadline, now)[0]
+
+
+def time_remaining_until(deadline, now=None):
+    """Return the ``time_remaining`` label and when it next changes.
+
+    The label stays the same up to and including the returned moment and
+    may read differently any time after it.
+    """
+    diff = deadline - (now or datetime.now())
+
+    if diff.total_seconds() < 0:
+        days_overdue = abs(diff.days)
+        return f"OVERDUE {days_overdue}d", deadline + timedelta(days=days_overdue)
+    elif diff.days > 0:
+        return f"{diff.days}d left", deadline - timedelta(days=diff.days)
+    elif diff.seconds > 3600:
+        hours = diff.seconds // 3600
+        # "1h left" needs more than 3600 whole seconds left
+        changes_at = deadline - timedelta(seconds=3601 if hours == 1 else hours * 3600)
+        return f"{hours}h left", changes_at
+    else:
+        minutes = diff.seconds // 60
+        return f"{minutes}m left", deadline - timedelta(minutes=minutes)
+
+
+class Recurrence:
+    """Repeat rule of a recurring task: every ``interval`` days, weeks or months.
+
+    A series is stored once, as a task whose deadline is its current
+    occurrence. Later occurrences are worked out from the rule when the
+    current one is completed and are never stored, so a series costs one
+    record, one deadline index entry and one reminder however long it
+    runs. Occurrences are counted from ``start`` so a monthly series on
+    the 31st returns to the 31st after shorter months.
+    """
+
+    __slots__ = ('interval', 'unit', 'start')
+
+    UNITS = ('day', 'week', 'month')
+    LABELS = {'day': "Daily", 'week': "Weekly", 'month': "Monthly"}
+    PATTERN = re.compile(r'every (\d+) (day|week|month)s? from (.+)$')
+
+    def __init__(self, interval, unit, start):
+        if unit not in self.UNITS or interval < 1:
+            raise ValueError(f"Invalid repeat rule: every {interval} {unit}")
+        self.interval = interval
+        self.unit = unit
+        self.start = start
+
+    @classmethod
+    def parse(cls, text):
+        """Parse the stored form, e.g. ``every 2 weeks from 2024-05-01 09:00:00``."""
+        match = cls.PATTERN.match(text)
+        if not match:
+            raise ValueError(f"Invalid repeat rule: {text!r}")
+        return cls(int(match[1]), match[2], parse_timestamp(match[3]))
+
+    def __str__(self):
+        plural = "s" if self.interval > 1 else ""
+        return f"every {self.interval} {self.unit}{plural} from {format_timestamp(self.start)}"
+
+    @property
+    def label(self):
+        if self.interval == 1:
+            return self.LABELS[self.unit]
+        return f"Every {self.interval} {self.unit}s"
+
+    def starting(self, start):
+        """Return the same rule counted from a new first occurrence."""
+        return Recurrence(self.interval, self.unit, start)
+
+    def occurrence(self, n):
+        """Return the ``n``-th occurrence, counting ``start`` as the 0th."""
+        if self.unit == 'month':
+            months = self.start.month - 1 + n * self.interval
+            year, month = self.start.year + months // 12, months % 12 + 1
+            day = min(self.start.day, calendar.monthrange(year, month)[1])
+            return self.start.replace(year=year, month=month, day=day)
+        days = self.interval * (7 if self.unit == 'week' else 1)
+        return self.start + timedelta(days=n * days)
+
+    def next_after(self, when):
+        """Return the first occurrence later than ``when``."""
+        if when < self.start:
+            return self.start
+        if self.unit == 'month':
+            months = (when.year - self.start.year) * 12 + when.month - self.start.month
+            n = months // self.interval
+        else:
+            days = self.interval * (7 if self.unit == 'week' else 1)
+            n = (when - self.start) // timedelta(days=days)
+        while self.occurrence(n) <= when:
+            n += 1
+        return self.occurrence(n)
+
+
+class Task:
+    """A single to-do item with typed fields.
+
+    Timestamps are ``datetime`` objects, the priority is a ``Priority`` and
+    the status is a plain bool. Strings only exist at the storage boundary,
+    in ``from_dict`` and ``to_dict``, so rendering, filtering and reminders
+    never parse dates. A recurring task carries a ``Recurrence`` and its
+    deadline is the series' current occurrence.
+    """
+
+    __slots__ = ('id', 'description', 'completed', 'created', 'priority',
+                 'deadline', 'reminded', 'completed_date', 'recurrence')
+
+    def __init__(self, id, description, completed=False, created=None,
+                 priority=Priority.MEDIUM, deadline=None, reminded=False,
+                 completed_date=None, recurrence=None):
+        self.id = id
+        self.description = description
+        self.completed = completed
+        self.created = created
+        self.priority = priority
+        self.deadline = deadline
+        self.reminded = reminded
+        self.completed_date = completed_date
+        self.recurrence = recurrence
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a task from its JSON representation."""
+        return cls(data['id'], data['description'],
+                   completed=bool(data.get('completed', False)),
+                   created=parse_timestamp(data.get('created')),
+                   priority=Priority(data.get('priority', 'medium')),
+                   deadline=parse_timestamp(data.get('deadline')),
+                   reminded=bool(data.get('reminded', False)),
+                   completed_date=parse_timestamp(data.get('completed_date')),
+                   recurrence=Recurrence.parse(data['recurrence'])
+                   if data.get('recurrence') else None)
+
+    def to_dict(self):
+        """Return the JSON representation used in the task file."""
+        data = {
+            "id": self.id,
+            "description": self.description,
+            "completed": self.completed,
+            "created": format_timestamp(self.created),
+            "priority": self.priority.value,
+            "deadline": format_timestamp(self.deadline),
+            "reminded": self.reminded
+        }
+        if self.completed_date:
+            data["completed_date"] = format_timestamp(self.completed_date)
+        if self.recurrence:
+            data["recurrence"] = str(self.recurrence)
+        return data
+
+    def __repr__(self):
+        return f"Task({self.id!r}, {self.description!r})"
+
+
+def tasks_from_records(records, source="task file"):
+    """Build a ``Task`` from each record, skipping and reporting malformed
+    ones so a single bad record does not cost the tasks after it."""
+    for record in records:
+        try:
+            yield Task.from_dict(record)
+        except RECORD_ERRORS as e:
+            print(f"Skipping bad task record in {source}: {e!r}")
+
+def matches_filter(task, filter_type, now):
+    """Return whether a single task is shown under one of the ``FILTERS``."""
+    if filter_type == "Pending":
+        return not task.completed
+    elif filter_type == "Completed":
+        return task.completed
+    elif task.completed or not task.deadline:
+        return filter_type == "All Tasks"
+    elif filter_type == "Overdue":
+        return task.deadline < now
+    elif filter_type == "Due Today":
+        return task.deadline.date() == now.date()
+    elif filter_type == "Due This Week":
+        return task.deadline <= now + timedelta(days=7)
+    return True
+
+
+def completion_changes(task, now):
+    """Return the ``update`` changes that complete ``task`` at ``now``.
+
+    For a recurring task only the current occurrence is done: the series
+    moves on to its first occurrence after both that one and ``now``.
+    """
+    if task.recurrence is not None and task.deadline is not None:
+        return {'deadline': task.recurrence.next_after(max(task.deadline, now)),
+                'reminded': False}
+    return {'completed': True, 'completed_date': now}
+
+
+def deadline_changes(task, deadline):
+    """Return the ``update`` changes that move ``task`` to a new deadline.
+
+    The reminder is re-armed, and a recurring series is counted from the
+    new deadline; removing the deadline ends the series.
+    """
+    changes = {'deadline': deadline, 'reminded': False}
+    if task.recurrence is not None:
+        changes['recurrence'] = task.recurrence.starting(deadline) if deadline else None
+    return changes
+
+
+PRIORITY_RANK = {Priority.HIGH: 0, Priority.MEDIUM: 1, Priority.LOW: 2}
+
+
+def urgency_key(task):
+    """Pending tasks by deadline (overdue ones come first by nature), then
+    undated pending tasks, then completed tasks by completion date."""
+    if task.completed:
+        return (2, task.completed_date or datetime.min)
+    if task.deadline is None:
+        return (1, datetime.max)
+    return (0, task.deadline)
+
+
+# Task list orders; every key depends on the task alone, never on the clock
+SORT_KEYS = {
+    'urgency': urgency_key,
+    'priority': lambda task: (PRIORITY_RANK[task.priority], urgency_key(task)),
+    'created': lambda task: task.created or datetime.min,
+    'deadline': lambda task: task.deadline or datetime.max,
+}
+
+
+class BinarySnapshot:
+    """Compact binary snapshot layout, an alternative to the JSON task file.
+
+    An 8-byte magic and a header are followed by one fixed-width record
+    per task and then a single block holding every description, which may
+    be compressed with zlib or lzma. Timestamps are whole seconds from
+    ``EPOCH`` to the stored naive wall-clock time, so a file reads back the
+    same in any time zone and across DST changes. The completed, reminded
+    and recurring flags share a byte with the priority, and each record
+    finds its description by offset and length. A recurring task's rule
+    follows its description in the block, after a unit separator. Records
+    keep the snapshot's order, pending tasks first, so
+    ``TaskJournal.stream`` can still hand them over early. A damaged
+    snapshot raises ValueError.
+    """
+
+    MAGIC = b'TODOBIN1'
+    # compression, next_id, task count, stored description block size
+    HEADER = struct.Struct('<BQQQ')
+    # id, flags, created, deadline, completed_date, description offset and length
+    RECORD = struct.Struct('<QBqqqQI')
+    COMPRESSIONS = ('none', 'zlib', 'lzma')
+    PRIORITIES = tuple(Priority)
+    PRIORITY_CODES = {priority.value: code for code, priority in enumerate(PRIORITIES)}
+    COMPLETED = 1
+    REMINDED = 2
+    RECURRING = 16  # bits 2-3 hold the priority
+    RULE_SEPARATOR = '\x1f'
+    NO_TIME = -1 << 63
+    EPOCH = datetime(1970, 1, 1)
+
+    @classmethod
+    def is_binary(cls, path):
+        """Sniff whether the file at ``path`` is a binary snapshot."""
+        with open(path, 'rb') as f:
+            return f.read(len(cls.MAGIC)) == cls.MAGIC
+
+    @classmethod
+    def encode(cls, snapshot, compression='zlib'):
+        """Return a ``{'next_id': ..., 'tasks': [...]}`` snapshot as bytes."""
+        records = []
+        descriptions = []
+        offset = 0
+        for task in snapshot['tasks']:
+            description = task['description']
+            flags = cls.PRIORITY_CODES[task.get('priority', 'medium')] << 2
+            if task.get('completed'):
+                flags |= cls.COMPLETED
+            if task.get('reminded'):
+                flags |= cls.REMINDED
+            if task.get('recurrence'):
+                flags |= cls.RECURRING
+                description += cls.RULE_SEPARATOR + task['recurrence']
+            description = description.encode('utf-8')
+            records.append(cls.RECORD.pack(
+                task['id'], flags, cls.to_seconds(task.get('created')),
+                cls.to_seconds(task.get('deadline')),
+                cls.to_seconds(task.get('completed_date')), offset, len(description)))
+            descriptions.append(description)
+            offset += len(description)
+        block = cls.compress(b''.join(descriptions), compression)
+        header = cls.HEADER.pack(cls.COMPRESSIONS.index(compression),
+                                 snapshot['next_id'], len(records), len(block))
+        return b''.join([cls.MAGIC, header] + records + [block])
+
+    @classmethod
+    def decode(cls, data):
+        """Parse snapshot bytes into ``(next_id, compression, tasks)``.
+
+        ``tasks`` is an iterator of ``Task`` objects built straight from the
+        records, without going through JSON dicts.
+        """
+        if data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError("Not a binary task snapshot")
+        start = len(cls.MAGIC) + cls.HEADER.size
+        code, next_id, count, block_size = cls.read_header(data)
+        block_start = start + count * cls.RECORD.size
+        if block_start + block_size > len(data):
+            raise ValueError("Binary snapshot is truncated")
+        compression = cls.COMPRESSIONS[code]
+        block = cls.decompress(data[block_start:block_start + block_size], compression)
+        rows = cls.RECORD.iter_unpack(memoryview(data)[start:block_start])
+        return next_id, compression, cls.tasks(rows, block)
+
+    @classmethod
+    def read_header(cls, data):
+        """Unpack the header after the magic, raising ValueError if it is damaged."""
+        try:
+            code, next_id, count, block_size = cls.HEADER.unpack_from(data, len(cls.MAGIC))
+        except struct.error:
+            raise ValueError("Binary snapshot is truncated") from None
+        if code >= len(cls.COMPRESSIONS):
+            raise ValueError(f"Unknown snapshot compression {code}")
+        return code, next_id, count, block_size
+
+    @classmethod
+    def tasks(cls, rows, block):
+        none, priorities = cls.NO_TIME, cls.PRIORITIES
+        completed_bit, reminded_bit = cls.COMPLETED, cls.REMINDED
+        epoch, seconds = cls.EPOCH, timedelta  # from_seconds, inlined
+        for task_id, flags, created, deadline, completed_date, offset, length in rows:
+            try:
+                task = Task(task_id, str(block[offset:offset + length], 'utf-8'),
+                            flags & completed_bit != 0,
+                            None if created == none else epoch + seconds(0, created),
+                            priorities[(flags >> 2) & 3],
+                            None if deadline == none else epoch + seconds(0, deadline),
+                            flags & reminded_bit != 0,
+                            None if completed_date == none else
+                            epoch + seconds(0, completed_date))
+                if flags & cls.RECURRING:
+                    task.description, rule = task.description.rsplit(cls.RULE_SEPARATOR, 1)
+                    task.recurrence = Recurrence.parse(rule)
+            except RECORD_ERRORS as e:
+                print(f"Skipping bad task record {task_id}: {e!r}")
+                continue
+            yield task
+
+    @classmethod
+    def to_seconds(cls, value):
+        if not value:
+            return cls.NO_TIME
+        return calendar.timegm(parse_timestamp(value).timetuple())
+
+    @classmethod
+    def from_seconds(cls, seconds):
+        return cls.EPOCH + timedelta(0, seconds)
+
+    @staticmethod
+    def compress(data, compression):
+        if compression == 'zlib':
+            return zlib.compress(data, 6)
+        if compression == 'lzma':
+            import lzma
+            return lzma.compress(data)
+        return data
+
+    @staticmethod
+    def decompress(data, compression):
+        if compression == 'zlib':
+            try:
+                return zlib.decompress(data)
+            except zlib.error as e:
+                raise ValueError(f"Description block is corrupt: {e}") from None
+        if compression == 'lzma':
+            import lzma
+            try:
+                return lzma.decompress(data)
+            except lzma.LZMAError as e:
+                raise ValueError(f"Description block is corrupt: {e}") from None
+        return bytes(data)
+
+
+# Everything the indexes and ``SORT_KEYS`` read, i.e. all but the text fields
+TaskFields = namedtuple('TaskFields', 'id completed priority deadline created completed_date')
+
+
+class MappedSnapshot:
+    """Read-only, memory-mapped view of an uncompressed ``BinarySnapshot``.
+
+    Opening one parses nothing but an offset index: the task ids in sorted
+    order beside the record position of each. ``get`` builds a ``Task``
+    from its record on request and ``fields`` scans the fixed-width part
+    of the records without touching descriptions, so the size of the file
+    costs address space and page cache rather than Python objects.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic = BinarySnapshot.MAGIC
+            if self.map[:len(magic)] != magic:
+                raise ValueError("Not a binary task snapshot")
+            code, self.next_id, count, block_size = BinarySnapshot.read_header(self.map)
+            if BinarySnapshot.COMPRESSIONS[code] != 'none':
+                raise ValueError("Only uncompressed snapshots can be memory-mapped")
+            self.records_start = len(magic) + BinarySnapshot.HEADER.size
+            block_start = self.records_start + count * BinarySnapshot.RECORD.size
+            if block_start + block_size > len(self.map):
+                raise ValueError("Binary snapshot is truncated")
+        except ValueError:
+            self.close()
+            raise
+        self.view = memoryview(self.map)
+        self.records = self.view[self.records_start:block_start]
+        self.block = self.view[block_start:block_start + block_size]
+
+        ids = [row[0] for row in BinarySnapshot.RECORD.iter_unpack(self.records)]
+        order = sorted(range(count), key=ids.__getitem__)
+        self.ids = array('Q', [ids[position] for position in order])
+        self.positions = array('L', order)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, task_id):
+        return self.position(task_id) is not None
+
+    def position(self, task_id):
+        """Return the record number holding ``task_id``, or None."""
+        i = bisect.bisect_left(self.ids, task_id)
+        if i < len(self.ids) and self.ids[i] == task_id:
+            return self.positions[i]
+        return None
+
+    def get(self, task_id):
+        """Build the ``Task`` stored under ``task_id``, or return None."""
+        position = self.position(task_id)
+        if position is None:
+            return None
+        row = BinarySnapshot.RECORD.unpack_from(self.records,
+                                                position * BinarySnapshot.RECORD.size)
+        return next(BinarySnapshot.tasks([row], self.block), None)
+
+    def fields(self):
+        """Yield the indexed and sort fields of every record as ``TaskFields``."""
+        priorities, none = BinarySnapshot.PRIORITIES, BinarySnapshot.NO_TIME
+        epoch, seconds = BinarySnapshot.EPOCH, timedelta
+        rows = BinarySnapshot.RECORD.iter_unpack(self.records)
+        for task_id, flags, created, deadline, completed_date, _, _ in rows:
+            yield TaskFields(task_id, flags & BinarySnapshot.COMPLETED != 0,
+                             priorities[(flags >> 2) & 3],
+                             None if deadline == none else epoch + seconds(0, deadline),
+                             None if created == none else epoch + seconds(0, created),
+                             None if completed_date == none else
+                             epoch + seconds(0, completed_date))
+
+    def close(self):
+        for name in ('block', 'records', 'view'):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self.map.close()
+        self.file.close()
+
+
+class MappedTasks(MutableMapping):
+    """Id -> ``Task`` mapping that reads tasks from a ``MappedSnapshot``.
+
+    Tasks are built from the map when looked up, and only the
+    ``cache_size`` most recently used are kept. Added and changed tasks
+    live in ``changed`` (removed ones as None) on top of the map, so the
+    owner must store a task back after changing it.
+    """
+
+    def __init__(self, snapshot, cache_size=4096):
+        self.snapshot = snapshot
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.changed = {}
+        self.size = len(snapshot)
+        self.lock = threading.Lock()
+
+    def __getitem__(self, task_id):
+        with self.lock:
+            if task_id in self.changed:
+                task = self.changed[task_id]
+            elif task_id in self.cache:
+                task = self.cache[task_id]
+                self.cache.move_to_end(task_id)
+            else:
+                task = self.snapshot.get(task_id)
+                if task is not None:
+                    self.cache[task_id] = task
+                    if len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __contains__(self, task_id):
+        if task_id in self.changed:
+            return self.changed[task_id] is not None
+        return task_id in self.snapshot
+
+    def __setitem__(self, task_id, task):
+        with self.lock:
+            if task_id not in self:
+                self.size += 1
+            self.changed[task_id] = task
+            self.cache.pop(task_id, None)
+
+    def __delitem__(self, task_id):
+        with self.lock:
+            if task_id not in self:
+                raise KeyError(task_id)
+            self.size -= 1
+            self.cache.pop(task_id, None)
+            if task_id in self.snapshot:
+                self.changed[task_id] = None
+            else:
+                del self.changed[task_id]
+
+    def __iter__(self):
+        for task_id in self.snapshot.ids:
+            if task_id not in self.changed:
+                yield task_id
+        for task_id, task in list(self.changed.items()):
+            if task is not None:
+                yield task_id
+
+    def __len__(self):
+        return self.size
+
+    def fields(self):
+        """Yield the ``TaskFields`` of every task, without building tasks from the map.
+
+        Tasks changed since the snapshot come as themselves, which have the
+        same attributes.
+        """
+        for fields in self.snapshot.fields():
+            if fields.id not in self.changed:
+                yield fields
+        for task in list(self.changed.values()):
+            if task is not None:
+                yield task
+
+
+class SqliteStorage(TaskStorage):
+    """SQLite task storage using WAL mode and indexed filter queries.
+
+    Each mutation is a single-row upsert or delete. The list filters
+    (Pending, Completed, Overdue, Due Today, Due This Week) run as SQL over
+    indexes on ``completed``/``deadline`` and ``priority`` rather than
+    scanning tasks in Python. Timestamps keep the JSON string format, which
+    sorts chronologically.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            created TEXT,
+            priority TEXT NOT NULL DEFAULT 'medium',
+            deadline TEXT,
+            reminded INTEGER NOT NULL DEFAULT 0,
+            completed_date TEXT,
+            recurrence TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed, deadline);
+        CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline);
+        CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority);
+    """
+
+    COLUMNS = ('id', 'description', 'completed', 'created', 'priority',
+               'deadline', 'reminded', 'completed_date', 'recurrence')
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+        if 'recurrence' not in columns:
+            # Databases created before recurring tasks existed
+            with self.conn:
+                self.conn.execute("ALTER TABLE tasks ADD COLUMN recurrence TEXT")
+
+    def load(self):
+        """Return every task row plus the persisted id counter."""
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM tasks ORDER BY id")
+        tasks = [self.row_to_record(row) for row in rows]
+        if tasks:
+            self.bump_next_id(tasks[-1]['id'] + 1)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        return {'next_id': row[0] if row else 1, 'tasks': tasks}
+
+    def stream(self, batch_size=1000):
+        """Yield loader events from indexed queries, pending tasks first.
+
+        Reads through a connection of its own so it can run on a worker
+        thread while the main connection keeps serving writes.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute(
+                "SELECT max((SELECT max(id) + 1 FROM tasks), "
+                "(SELECT value FROM meta WHERE key = 'next_id'))").fetchone()
+            yield 'next_id', row[0] or 1
+            columns = ', '.join(self.COLUMNS)
+            queries = (
+                ('active', "completed = 0 AND deadline IS NOT NULL ORDER BY deadline"),
+                ('active', "completed = 0 AND deadline IS NULL ORDER BY id"),
+                ('history', "completed = 1 ORDER BY id"),
+            )
+            for kind, where in queries:
+                if kind == 'history':
+                    yield 'ready', None
+                rows = conn.execute(f"SELECT {columns} FROM tasks WHERE {where}")
+                while True:
+                    batch = rows.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    records = map(self.row_to_record, batch)
+                    yield kind, list(tasks_from_records(records, self.path))
+        finally:
+            conn.close()
+
+    def row_to_record(self, row):
+        record = dict(zip(self.COLUMNS, row))
+        record['completed'] = bool(record['completed'])
+        record['reminded'] = bool(record['reminded'])
+        for column in ('completed_date', 'recurrence'):
+            if record[column] is None:
+                del record[column]
+        return record
+
+    BUMP_NEXT_ID = ("INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = max(value, excluded.value)")
+
+    def bump_next_id(self, next_id):
+        """Raise the persisted id counter to at least ``next_id``."""
+        with self.conn:
+            self.conn.execute(self.BUMP_NEXT_ID, (next_id,))
+
+    def put(self, record):
+        self.put_many([record])
+
+    def put_many(self, records):
+        """Upsert task records in one transaction."""
+        self.write_batch(records, ())
+
+    def delete(self, task_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def write_batch(self, records, deleted_ids):
+        """Apply upserts and deletes in a single transaction."""
+        rows = [tuple(record.get(column) for column in self.COLUMNS) for record in records]
+        with self.conn:
+            if rows:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO tasks ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+                self.conn.execute(self.BUMP_NEXT_ID, (max(row[0] for row in rows) + 1,))
+            self.conn.executemany("DELETE FROM tasks WHERE id = ?",
+                                  [(task_id,) for task_id in deleted_ids])
+
+    def query_ids(self, filter_type, now):
+        """Answer a list filter with an indexed query; None means all tasks."""
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        queries = {
+            "Pending": ("completed = 0", ()),
+            "Completed": ("completed = 1", ()),
+            "Overdue": ("completed = 0 AND deadline < ?", (now,)),
+            "Due Today": ("completed = 0 AND deadline >= ? AND deadline < ?",
+                          (today, today + timedelta(days=1))),
+            "Due This Week": ("completed = 0 AND deadline <= ?",
+                              (now + timedelta(days=7),)),
+        }
+        if filter_type not in queries:
+            return None
+        where, params = queries[filter_type]
+        params = tuple(format_timestamp(value) for value in params)
+        rows = self.conn.execute(f"SELECT id FROM tasks WHERE {where}", params)
+        return {row[0] for row in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+class TaskArchive:
+    """Compressed, append-only file holding tasks moved out of the list.
+
+    Each ``append`` adds one gzip member of JSON lines, so the file stays
+    readable with ``zcat`` and old members are never rewritten. Archived
+    tasks are not loaded at startup; ``load`` reads them back on request.
+    """
+
+    GZIP_MAGIC = b'\x1f\x8b\x08'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, records):
+        """Append task records as one gzip member and make them durable."""
+        if not records:
+            return
+        data = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+        with self.lock, open(self.path, 'ab') as f:
+            f.write(gzip.compress(data.encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        """Return every archived task record, latest copy of each id."""
+        if not os.path.exists(self.path):
+            return []
+        with self.lock, open(self.path, 'rb') as f:
+            raw = f.read()
+        data = memoryview(raw)
+
+        records = {}
+        pos = 0
+        while pos < len(data):
+            member = zlib.decompressobj(wbits=31)
+            try:
+                text = member.decompress(data[pos:])
+            except zlib.error:
+                text = b''
+            if not member.eof:
+                # A member torn by a crash mid-append; skip to the next one
+                pos = raw.find(self.GZIP_MAGIC, pos + 1)
+                if pos < 0:
+                    break
+                continue
+            for line in text.splitlines():
+                record = json.loads(line)
+                records[record['id']] = record
+            pos = len(data) - len(member.unused_data)
+        return list(records.values())
+
+
+class AsyncStorage(TaskStorage):
+    """Write-behind wrapper that moves a backend's writes off the caller's thread.
+
+    ``put``, ``delete`` and ``write_batch`` only queue the change. A worker
+    thread waits ``delay`` seconds for a burst of edits to settle, then
+    writes everything queued as one ``write_batch``; repeated changes to
+    one task collapse into its latest state, so ten quick edits cost one
+    journal line and one fsync. ``compact`` is queued too and acts as a
+    barrier: the writes before it land first, the writes after it follow.
+
+    A failed write stays queued and is retried every ``retry_delay``
+    seconds, and ``on_error`` is called from the worker thread. ``flush``
+    waits for the queue to drain and ``close`` flushes before closing the
+    backend, so every change made before a clean exit is on disk.
+
+    ``poll_changes`` lays the changes still queued over what the backend
+    reports, so a local edit that has not reached the disk yet is never
+    undone by an older copy saved elsewhere.
+    """
+
+    def __init__(self, storage, on_error=None, delay=0.05, retry_delay=5):
+        self.storage = storage
+        self.on_error = on_error
+        self.delay = delay
+        self.retry_delay = retry_delay
+        self.queue = deque()  # ('write', {id: record or None}) and ('compact', snapshot)
+        self.in_flight = []   # items taken off the queue by the current write
+        self.write_lock = threading.Lock()  # keeps writes out of a poll
+        self.writing = False
+        self.closing = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def needs_compaction(self):
+        with self.condition:
+            if any(kind == 'compact' for kind, _ in self.queue):
+                return False
+        return self.storage.needs_compaction
+
+    def load(self):
+        return self.storage.load()
+
+    def load_tasks(self):
+        return self.storage.load_tasks()
+
+    def stream(self, batch_size=1000):
+        return self.storage.stream(batch_size)
+
+    def put(self, record):
+        self.enqueue({record['id']: record})
+
+    def delete(self, task_id):
+        self.enqueue({task_id: None})
+
+    def write_batch(self, records, deleted_ids):
+        changes = {record['id']: record for record in records}
+        changes.update((task_id, None) for task_id in deleted_ids)
+        self.enqueue(changes)
+
+    def compact(self, snapshot):
+        with self.condition:
+            self.queue.append(('compact', snapshot))
+            self.condition.notify_all()
+
+    def enqueue(self, changes):
+        with self.condition:
+            if self.queue and self.queue[-1][0] == 'write':
+                self.queue[-1][1].update(changes)
+            else:
+                self.queue.append(('write', changes))
+            self.condition.notify_all()
+
+    def query_ids(self, filter_type, now):
+        # The backend lags behind the store until the queue drains
+        with self.condition:
+            if self.queue or self.writing:
+                return None
+        return self.storage.query_ids(filter_type, now)
+
+    def reserve_ids(self, next_id, count):
+        return self.storage.reserve_ids(next_id, count)
+
+    def poll_changes(self):
+        # A write landing between the backend's answer and the overlay
+        # would be in neither, so skip this poll while one is under way.
+        # A queued compaction's snapshot predates what this poll would
+        # hand over, so leave those changes for the compaction to fold in.
+        if not self.write_lock.acquire(blocking=False):
+            return None
+        try:
+            with self.condition:
+                if any(kind == 'compact' for kind, _ in self.in_flight + list(self.queue)):
+                    return None
+            changes = self.storage.poll_changes()
+            if changes is None:
+                return None
+            records, complete = changes
+            with self.condition:
+                for kind, item in self.in_flight + list(self.queue):
+                    if kind == 'write':
+                        records.update(item)
+            return records, complete
+        finally:
+            self.write_lock.release()
+
+    @property
+    def pending(self):
+        """Number of queued task changes not yet written."""
+        with self.condition:
+            return sum(len(item) for kind, item in self.queue if kind == 'write')
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.closing:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                closing = self.closing
+            if not closing:
+                time.sleep(self.delay)  # let the rest of a burst of edits join this write
+            with self.condition:
+                items = self.in_flight = list(self.queue)
+                self.queue.clear()
+                self.writing = True
+            with self.write_lock:
+                failed = self.write(items)
+            with self.condition:
+                if failed:
+                    self.requeue(failed)
+                self.in_flight = []
+                self.writing = False
+                self.condition.notify_all()
+                if failed:
+                    if self.closing:
+                        return
+                    self.condition.wait_for(lambda: self.closing, self.retry_delay)
+
+    def write(self, items):
+        """Write queued items in order; return those not written."""
+        for position, (kind, item) in enumerate(items):
+            try:
+                if kind == 'compact':
+                    self.storage.compact(item)
+                else:
+                    self.storage.write_batch(
+                        [record for record in item.values() if record is not None],
+                        [task_id for task_id, record in item.items() if record is None])
+            except STORAGE_ERRORS as e:
+                if self.on_error:
+                    self.on_error(e)
+                else:
+                    print(f"Could not save tasks: {e}")
+                return items[position:]
+        return []
+
+    def requeue(self, items):
+        """Put failed items back ahead of anything queued since."""
+        if self.queue and self.queue[0][0] == 'write' and items[-1][0] == 'write':
+            items[-1][1].update(self.queue.popleft()[1])
+        self.queue.extendleft(reversed(items))
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written; False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.queue and not self.writing or not self.thread.is_alive(),
+                timeout)
+
+    def close(self):
+        """Write out the queue, stop the worker and close the backend."""
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.storage.close()
+
+
+BINARY_EXTENSIONS = ('.todo',)
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def open_storage(path, mapped=False):
+    """Pick a storage backend from the file extension.
+
+    ``.db`` files are SQLite databases and ``.todo`` files use binary
+    snapshots; anything else is a JSON snapshot with a journal. ``mapped``
+    memory-maps uncompressed binary snapshots instead of reading them.
+    """
+    extension = os.path.splitext(path)[1]
+    if extension in SQLITE_EXTENSIONS:
+        return SqliteStorage(path)
+    if extension in BINARY_EXTENSIONS:
+        return TaskJournal(path, snapshot_format='binary', mapped=mapped)
+    return TaskJournal(path, mapped=mapped)
+
+
+def convert_task_file(src_path, dst_path, compression='zlib'):
+    """Copy a task file (and its journal) into a new file of another format.
+
+    The destination format follows ``open_storage``; ``compression``
+    applies to binary snapshots. Returns the number of tasks copied.
+    """
+    if os.path.exists(dst_path):
+        raise FileExistsError(f"{dst_path} already exists")
+    source = open_storage(src_path)
+    try:
+        data = source.load()
+    finally:
+        source.close()
+    storage = open_storage(dst_path)
+    try:
+        if isinstance(storage, SqliteStorage):
+            storage.put_many(data['tasks'])
+            storage.bump_next_id(data['next_id'])
+        else:
+            storage.compression = compression
+            storage.write_snapshot(data)
+    finally:
+        storage.close()
+    return len(data['tasks'])
+
+
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.ics': 'ics'}
+IMPORT_BLOCK_SIZE = 1 << 20  # characters of CSV or JSON Lines per process-pool job
+IMPORT_CHUNK_SIZE = 5000  # tasks or VTODOs per process-pool job
+IMPORT_ERROR_LIMIT = 20  # row errors kept for the report; the rest are only counted
+CSV_COLUMNS = ('id', 'description', 'priority', 'deadline', 'completed',
+               'created', 'completed_date', 'recurrence')
+CSV_ALIASES = {'title': 'description', 'task': 'description', 'summary': 'description',
+               'due': 'deadline', 'due date': 'deadline', 'done': 'completed'}
+PRIORITY_NAMES = {'': Priority.MEDIUM,
+                  'high': Priority.HIGH, 'h': Priority.HIGH, 'urgent': Priority.HIGH,
+                  '1': Priority.HIGH,
+                  'medium': Priority.MEDIUM, 'med': Priority.MEDIUM, 'm': Priority.MEDIUM,
+                  'normal': Priority.MEDIUM, '2': Priority.MEDIUM,
+                  'low': Priority.LOW, 'l': Priority.LOW, '3': Priority.LOW}
+FLAG_WORDS = {'': False, '0': False, 'false': False, 'no': False, 'n': False, 'pending': False,
+              '1': True, 'true': True, 'yes': True, 'y': True, 'x': True, 'done': True,
+              'completed': True}
+REPEAT_WORDS = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}
+ICAL_PRIORITY = {Priority.HIGH: 1, Priority.MEDIUM: 5, Priority.LOW: 9}
+ICAL_FREQUENCIES = {'DAILY': ('day', 1), 'WEEKLY': ('week', 1),
+                    'MONTHLY': ('month', 1), 'YEARLY': ('month', 12)}
+ICAL_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//To-Do List//EN\r\n"
+ICAL_FOOTER = "END:VCALENDAR\r\n"
+
+ImportResult = namedtuple('ImportResult', 'tasks duplicates skipped errors')
+
+
+def bulk_format(path):
+    """Return the import/export format for a file name: csv, jsonl or ics."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import/export format {extension!r}; "
+                         "use .csv, .jsonl or .ics")
+    return IMPORT_FORMATS[extension]
+
+
+def chunked(items, size):
+    """Split any iterable into lists of at most ``size`` items, lazily."""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_chunks(fn, jobs, workers=None, mp_context=None):
+    """Yield ``fn(*job)`` for each job, in order, computed on a process pool.
+
+    At most two jobs per worker are submitted ahead of the one being
+    collected, so however long ``jobs`` is only a few chunks are in memory.
+    A single job, or ``workers=0``, runs in this process instead: starting
+    a pool costs more than it saves on a small file. ``mp_context`` picks
+    how the pool starts its workers; a threaded caller should pass a
+    "spawn" context rather than fork a copy of its threads' locks.
+    """
+    jobs = iter(jobs)
+    head = list(itertools.islice(jobs, 2))
+    if workers == 0 or len(head) < 2:
+        for job in itertools.chain(head, jobs):
+            yield fn(*job)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, mp_context=mp_context) as pool:
+        pending = deque()
+        for job in itertools.chain(head, jobs):
+            pending.append(pool.submit(fn, *job))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def normalize_priority(value):
+    """Read a priority written as high/medium/low, h/m/l or 1-3; blank is Medium."""
+    priority = PRIORITY_NAMES.get(value)
+    if priority is not None:
+        return priority
+    key = str(value if value is not None else '').strip().lower()
+    if key not in PRIORITY_NAMES:
+        raise ValueError(f"Unknown priority {value!r}")
+    return PRIORITY_NAMES[key]
+
+
+def parse_flag(value):
+    """Read a yes/no column such as ``completed``; blank is no."""
+    flag = FLAG_WORDS.get(value)
+    if flag is not None:
+        return flag
+    key = str(value if value is not None else '').strip().lower()
+    if key not in FLAG_WORDS:
+        raise ValueError(f"Expected yes or no, got {value!r}")
+    return FLAG_WORDS[key]
+
+
+def parse_import_time(value, deadline=False):
+    """Parse an imported date or timestamp, passing through blanks as None.
+
+    Deadlines follow ``parse_deadline``: a bare ``YYYY-MM-DD`` means the end
+    of that day and ``YYYY-MM-DD HH:MM`` is taken as it is. Anything else
+    must be an ISO timestamp; one with a UTC offset is converted to local
+    time, since task files have no time zones.
+    """
+    text = str(value).strip() if value else ''
+    if not text:
+        return None
+    if len(text) == 19:  # the task file's own format
+        return datetime.fromisoformat(text)
+    if deadline and len(text) in (10, 16):  # the forms parse_deadline takes, parsed faster
+        when = datetime.fromisoformat(text)
+        return when if len(text) == 16 else when.replace(hour=23, minute=59)
+    date, _, time_of_day = text.replace('T', ' ', 1).partition(' ')
+    if deadline and len(time_of_day) in (0, 5):
+        return parse_deadline(date, time_of_day)
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    when = datetime.fromisoformat(text)
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when.replace(microsecond=0)
+
+
+def parse_import_recurrence(value, deadline):
+    """Read a repeat rule: daily/weekly/monthly or the stored ``every ...`` form."""
+    if not value:
+        return None
+    text = str(value).strip().lower()
+    if deadline is None:
+        raise ValueError("A repeating task needs a deadline")
+    if text in REPEAT_WORDS:
+        return Recurrence(1, REPEAT_WORDS[text], deadline)
+    return Recurrence.parse(text)
+
+
+def task_from_fields(fields):
+    """Validate one imported row, given as a dict of task fields, into a task.
+
+    Accepts the field names of ``Task.to_dict``; the id is ignored because
+    imported tasks get fresh ones. Raises ValueError for a bad row.
+    """
+    description = str(fields.get('description') or '')
+    if not description.strip():
+        raise ValueError("Missing description")
+    deadline = parse_import_time(fields.get('deadline'), deadline=True)
+    completed = parse_flag(fields.get('completed'))
+    return Task(None, description,
+                completed=completed,
+                created=parse_import_time(fields.get('created')),
+                priority=normalize_priority(fields.get('priority')),
+                deadline=deadline,
+                reminded=parse_flag(fields.get('reminded')),
+                completed_date=parse_import_time(fields.get('completed_date'))
+                if completed else None,
+                recurrence=parse_import_recurrence(fields.get('recurrence'), deadline))
+
+
+def content_hash(task):
+    """Return a 64-bit hash of what a task says, for spotting duplicates.
+
+    The id, creation and completion times and reminder state are left out,
+    so a task exported and imported again matches the original.
+    """
+    key = (f"{task.description}\x1f{task.deadline or ''}\x1f{task.priority.value}"
+           f"\x1f{'x' if task.completed else ''}\x1f{task.recurrence or ''}")
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+def task_fields(task):
+    """Return a task's fields as a tuple; ``Task(*fields)`` rebuilds it.
+
+    Plain tuples cross a process boundary several times faster than task
+    objects, which is what the bulk import and export pools send.
+    """
+    return (task.id, task.description, task.completed, task.created, task.priority,
+            task.deadline, task.reminded, task.completed_date, task.recurrence)
+
+
+def content_hashes(tasks):
+    """Return the set of ``content_hash`` values of ``tasks``."""
+    return {content_hash(task) for task in tasks}
+
+
+def unfold_ical(lines):
+    """Join iCalendar content lines that were folded over several lines."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def read_ical_todos(lines):
+    """Yield the content lines of each VTODO, without nested alarms."""
+    todo, nested = None, 0
+    for line in unfold_ical(lines):
+        keyword = line[:6].upper()
+        if keyword == 'BEGIN:':
+            if todo is not None:
+                nested += 1
+            elif line[6:].strip().upper() == 'VTODO':
+                todo = []
+        elif keyword[:4] == 'END:':
+            if nested:
+                nested -= 1
+            elif todo is not None:
+                yield todo
+                todo = None
+        elif todo is not None and not nested:
+            todo.append(line)
+
+
+def split_ical_line(line):
+    """Split ``NAME;PARAMS:VALUE`` into upper-cased name, params and value."""
+    colon = line.find(':')
+    if colon < 0:
+        raise ValueError(f"Malformed line {line[:40]!r}")
+    if '"' in line[:colon]:  # quoted parameters may contain ':'
+        quoted = False
+        for colon, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ':' and not quoted:
+                break
+    name, _, params = line[:colon].partition(';')
+    return name.upper(), params.upper(), line[colon + 1:]
+
+
+def ical_escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\n', '\\n'))
+
+
+def ical_unescape(text):
+    if '\\' not in text:
+        return text
+    return re.sub(r'\\(.)', lambda m: '\n' if m[1] in 'nN' else m[1], text)
+
+
+def parse_ical_time(value, deadline=False):
+    """Parse a DATE or DATE-TIME value; UTC times become local, others are taken as local.
+
+    A date-only deadline means the end of that day, as in ``parse_deadline``.
+    """
+    value = value.strip()
+    if len(value) == 8:
+        day = datetime.strptime(value, '%Y%m%d')
+        return day.replace(hour=23, minute=59) if deadline else day
+    if value.endswith('Z'):
+        when = datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+        return when.astimezone().replace(tzinfo=None)
+    return datetime.strptime(value, '%Y%m%dT%H%M%S')
+
+
+def format_ical_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def parse_rrule(value, start):
+    """Turn an RRULE into a ``Recurrence``; only FREQ and INTERVAL can be kept."""
+    parts = dict(part.partition('=')[::2] for part in value.upper().split(';') if part)
+    unit, months = ICAL_FREQUENCIES.get(parts.pop('FREQ', None), (None, 0))
+    parts.pop('WKST', None)
+    interval = parts.pop('INTERVAL', '1')
+    if unit is None or parts or not interval.isdigit():
+        raise ValueError(f"Unsupported repeat rule {value!r}")
+    return Recurrence(int(interval) * months, unit, start)
+
+
+def format_rrule(recurrence):
+    freq = {'day': 'DAILY', 'week': 'WEEKLY', 'month': 'MONTHLY'}[recurrence.unit]
+    return f"FREQ={freq};INTERVAL={recurrence.interval}"
+
+
+def ical_task(lines):
+    """Build a task from a VTODO's content lines (SUMMARY, DUE, PRIORITY, ...).
+
+    iCalendar priorities 1-4 are High, 5 (or none) Medium and 6-9 Low.
+    """
+    props = {}
+    for line in lines:
+        name, _, value = split_ical_line(line)
+        props[name] = value
+    description = ical_unescape(props.get('SUMMARY', ''))
+    if not description.strip():
+        raise ValueError("Missing SUMMARY")
+    deadline = parse_ical_time(props['DUE'], deadline=True) if 'DUE' in props else None
+    level = int(props.get('PRIORITY') or 0)
+    priority = (Priority.MEDIUM if level in (0, 5) else
+                Priority.HIGH if level < 5 else Priority.LOW)
+    completed_date = parse_ical_time(props['COMPLETED']) if 'COMPLETED' in props else None
+    completed = props.get('STATUS', '').upper() == 'COMPLETED' or completed_date is not None
+    recurrence = None
+    if 'RRULE' in props:
+        if deadline is None:
+            raise ValueError("A repeating task needs a DUE date")
+        start = parse_ical_time(props['DTSTART']) if 'DTSTART' in props else deadline
+        recurrence = parse_rrule(props['RRULE'], start)
+    return Task(None, description,
+                completed=completed,
+                created=parse_ical_time(props['CREATED']) if 'CREATED' in props else None,
+                priority=priority,
+                deadline=deadline,
+                completed_date=completed_date,
+                recurrence=recurrence)
+
+
+def ical_lines(task, stamp):
+    """Return the content lines of a task's VTODO."""
+    created = f"-{format_ical_time(task.created)}" if task.created else ""
+    lines = ["BEGIN:VTODO",
+             f"UID:task-{task.id}{created}@to-do-list",
+             f"DTSTAMP:{stamp}",
+             f"SUMMARY:{ical_escape(task.description)}",
+             f"PRIORITY:{ICAL_PRIORITY[task.priority]}",
+             f"STATUS:{'COMPLETED' if task.completed else 'NEEDS-ACTION'}"]
+    if task.created:
+        lines.append(f"CREATED:{format_ical_time(task.created)}")
+    if task.deadline:
+        lines.append(f"DUE:{format_ical_time(task.deadline)}")
+    if task.completed_date:
+        lines.append(f"COMPLETED:{format_ical_time(task.completed_date)}")
+    if task.recurrence:
+        lines.append(f"DTSTART:{format_ical_time(task.recurrence.start)}")
+        lines.append(f"RRULE:{format_rrule(task.recurrence)}")
+    lines.append("END:VTODO")
+    return lines
+
+
+def fold_ical(line):
+    """Fold a content line into physical lines of at most 75 octets (RFC 5545)."""
+    if len(line) <= 75 and (line.isascii() or len(line.encode()) <= 75):
+        return line + "\r\n"
+    parts, current, size = [], [], 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            parts.append(''.join(current))
+            current, size = [], 1  # the continuation's leading space
+        current.append(char)
+        size += width
+    parts.append(''.join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def line_blocks(f, size, quoted=False):
+    """Read a text file in blocks of about ``size`` characters ending at a line break.
+
+    With ``quoted`` set (CSV), a block only ends where it holds an even
+    number of quote characters, so a quoted field with a line break in it
+    is never cut in two.
+    """
+    rest = ''
+    while True:
+        data = f.read(size)
+        if not data:
+            if rest:
+                yield rest
+            return
+        block = rest + data
+        cut = block.rfind('\n') + 1
+        if quoted:
+            while cut and block.count('"', 0, cut) % 2:
+                cut = block.rfind('\n', 0, cut - 1) + 1
+        block, rest = block[:cut], block[cut:]
+        if block:
+            yield block
+
+
+def import_jobs(f, fmt, block_size):
+    """Split an open import file into ``parse_import_chunk`` jobs, lazily.
+
+    CSV and JSON Lines files are handed over as blocks of raw text, so the
+    workers do the parsing; iCalendar files are split into VTODOs first.
+    """
+    columns, first = None, 1
+    if fmt == 'csv':
+        header = next(csv.reader([f.readline()]), [])
+        columns = [CSV_ALIASES.get(name.strip().lower(), name.strip().lower())
+                   for name in header]
+        if 'description' not in columns:
+            raise ValueError("The CSV file needs a description column")
+        chunks, first = line_blocks(f, block_size, quoted=True), 2
+    elif fmt == 'jsonl':
+        chunks = line_blocks(f, block_size)
+    else:
+        chunks = chunked(read_ical_todos(f), IMPORT_CHUNK_SIZE)
+    for chunk in chunks:
+        yield fmt, columns, first, chunk
+        first += len(chunk) if fmt == 'ics' else chunk.count('\n')
+
+
+def numbered_rows(reader, first):
+    """Yield ``(line number, row)`` from a CSV reader, numbering each row by
+    the line it starts on: a quoted field can run over several lines."""
+    while True:
+        number = first + reader.line_num
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        yield number, row
+
+
+def parse_import_chunk(fmt, columns, first, chunk):
+    """Parse and validate one chunk of an import file (runs in a pool worker).
+
+    Returns ``(parsed, errors)``: ``(content_hash, task_fields)`` pairs
+    for good rows and a message for each bad one.
+    """
+    if fmt == 'csv':
+        rows = numbered_rows(csv.reader(io.StringIO(chunk)), first)
+    elif fmt == 'jsonl':
+        rows = enumerate(chunk.split('\n'), first)
+    else:
+        rows = enumerate(chunk, first)
+    parsed, errors = [], []
+    for number, row in rows:
+        try:
+            if fmt == 'csv':
+                if not any(row):
+                    continue
+                task = task_from_fields(dict(zip(columns, row)))
+            elif fmt == 'jsonl':
+                if not row.strip():
+                    continue
+                fields = json.loads(row)
+                if not isinstance(fields, dict):
+                    raise ValueError("Expected a JSON object")
+                task = task_from_fields(fields)
+            else:
+                task = ical_task(row)
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append(f"{'Task' if fmt == 'ics' else 'Line'} {number}: {e}")
+            continue
+        parsed.append((content_hash(task), task_fields(task)))
+    return parsed, errors
+
+
+def format_export_chunk(fmt, chunk):
+    """Render ``task_fields`` tuples as export text (runs in a pool worker)."""
+    tasks = [Task(*fields) for fields in chunk]
+    if fmt == 'csv':
+        out = io.StringIO()
+        csv.writer(out).writerows(
+            [task.id, task.description, task.priority.value,
+             format_timestamp(task.deadline) or '', 'yes' if task.completed else 'no',
+             format_timestamp(task.created) or '', format_timestamp(task.completed_date) or '',
+             str(task.recurrence or '')] for task in tasks)
+        return out.getvalue()
+    if fmt == 'jsonl':
+        return ''.join(json.dumps(task.to_dict(), ensure_ascii=False) + "\n" for task in tasks)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return ''.join(fold_ical(line) for task in tasks for line in ical_lines(task, stamp))
+
+
+def read_import(path, fmt=None, existing=(), workers=None, block_size=IMPORT_BLOCK_SIZE,
+                mp_context=None):
+    """Parse a CSV, JSON Lines or iCalendar file into new tasks.
+
+    The file is streamed and parsed in chunks on a process pool, so the
+    raw rows in memory at any time are a few chunks' worth. Bad rows are
+    skipped and reported. A row whose ``content_hash`` is in ``existing``
+    or repeats an earlier row is dropped as a duplicate. Returns an
+    ``ImportResult`` whose tasks do not have ids yet.
+    """
+    fmt = fmt or bulk_format(path)
+    seen = set(existing)
+    tasks, duplicates, skipped, errors = [], 0, 0, []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for parsed, failures in map_chunks(parse_import_chunk,
+                                           import_jobs(f, fmt, block_size), workers,
+                                           mp_context):
+            for digest, fields in parsed:
+                if digest in seen:
+                    duplicates += 1
+                else:
+                    seen.add(digest)
+                    tasks.append(Task(*fields))
+            skipped += len(failures)
+            errors += failures[:IMPORT_ERROR_LIMIT - len(errors)]
+    return ImportResult(tasks, duplicates, skipped, errors)
+
+
+def import_tasks(store, path, fmt=None, workers=None):
+    """Add the new tasks from an import file to ``store`` as one batch."""
+    with store.lock:
+        existing = content_hashes(store)
+    result = read_import(path, fmt, existing, workers)
+    store.add_many(result.tasks)
+    return result
+
+
+def export_tasks(tasks, f, fmt, workers=None, chunk_size=IMPORT_CHUNK_SIZE, mp_context=None):
+    """Write ``tasks`` to an open text file as CSV, JSON Lines or iCalendar.
+
+    Chunks are rendered on a process pool and written back in order as
+    they finish. Open files with ``newline=''``: CSV and iCalendar lines
+    end in CRLF. Returns how many tasks were written.
+    """
+    count = 0
+
+    def jobs():
+        nonlocal count
+        for chunk in chunked(tasks, chunk_size):
+            count += len(chunk)
+            yield fmt, [task_fields(task) for task in chunk]
+
+    if fmt == 'csv':
+        f.write(','.join(CSV_COLUMNS) + "\r\n")
+    elif fmt == 'ics':
+        f.write(ICAL_HEADER)
+    for text in map_chunks(format_export_chunk, jobs(), workers, mp_context):
+        f.write(text)
+    if fmt == 'ics':
+        f.write(ICAL_FOOTER)
+    return count
+
+
+class TaskStore:
+    """Task collection with O(1) id lookup and maintained secondary indexes.
+
+    Tasks are kept in an id -> task dict alongside indexes on completion
+    status, priority and deadline, all updated on every mutation. The id
+    counter only ever moves forward and is persisted with the snapshot, so
+    ids are never reused after a delete. Every mutation is persisted when a
+    ``TaskStorage`` backend is attached.
+
+    All access goes through ``lock``, and listeners run while it is held, so
+    a mutation, its storage write and its listener updates happen as one
+    step with respect to other threads. Storage writes are therefore made
+    by one thread at a time, in mutation order.
+
+    ``add_many``, ``update_many`` and ``remove_many`` apply a batch as one
+    step with a single storage write.
+
+    When other processes share the task file, new ids come from the
+    storage's ``reserve_ids`` so they never collide, and ``merge`` applies
+    what the others saved (from ``poll_changes``) without writing it back.
+
+    A store can also be filled progressively with ``extend``. While
+    ``loading`` is set the snapshot would be missing tasks, so compaction
+    is put off until the load finishes.
+
+    Loaded from a memory-mapped snapshot, ``tasks`` is a ``MappedTasks``:
+    the indexes are built from the records' fixed-width fields and task
+    objects are only created when looked up.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.lock = threading.RLock()
+        self.tasks = {}
+        self.next_id = 1
+        self.by_status = {False: set(), True: set()}
+        self.by_priority = {priority: set() for priority in Priority}
+        self.by_deadline = []  # sorted (deadline, id) pairs
+        self.on_save_error = None
+        self.listeners = []
+        self.loading = False
+
+    def subscribe(self, listener):
+        """Call ``listener(kind, task)`` after every add, update and remove.
+
+        ``kind`` is one of ``'added'``, ``'modified'`` or ``'removed'``.
+        An update also sends ``'modifying'`` just before the change, while
+        the task still holds its old values, for listeners that keep
+        aggregates; others can ignore it.
+        """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def notify(self, kind, task):
+        for listener in self.listeners:
+            listener(kind, task)
+
+    def load(self):
+        """Populate the store from the attached storage."""
+        with self.lock:
+            self.load_locked()
+
+    def load_locked(self):
+        next_id, tasks = self.storage.load_tasks() if self.storage else (1, [])
+        self.tasks = {}
+        self.by_status = {False: set(), True: set()}
+        self.by_priority = {priority: set() for priority in Priority}
+        self.by_deadline = []
+        if isinstance(tasks, MappedTasks):
+            # Index from the fixed-width fields; tasks are built on lookup
+            self.tasks = tasks
+            for fields in tasks.fields():
+                self.index(fields, sort_deadlines=False)
+        else:
+            for task in tasks:
+                self.tasks[task.id] = task
+                self.index(task, sort_deadlines=False)
+        self.by_deadline.sort()
+        self.next_id = next_id
+
+    def extend(self, tasks):
+        """Insert tasks that are already persisted, e.g. from a streaming load."""
+        with self.lock:
+            for task in tasks:
+                self.tasks[task.id] = task
+                self.index(task, sort_deadlines=False)
+                self.next_id = max(self.next_id, task.id + 1)
+            self.by_deadline.sort()
+            for task in tasks:
+                self.notify('added', task)
+
+    def allocate_ids(self, count):
+        """Take ``count`` consecutive ids, reserved with the storage if it is shared."""
+        first = self.next_id
+        if self.storage and count:
+            first = self.storage.reserve_ids(first, count)
+        self.next_id = first + count
+        return first
+
+    def merge(self, records, complete=False):
+        """Apply changes another process saved, without writing them back.
+
+        ``records`` and ``complete`` are as returned by the storage's
+        ``poll_changes``. Tasks whose record already matches are skipped,
+        so listeners only hear about real changes. Returns how many tasks
+        changed.
+        """
+        with self.lock:
+            if complete:
+                records = dict(records)
+                for task_id in self.tasks:
+                    records.setdefault(task_id, None)
+            changed = 0
+            for task_id, record in records.items():
+                task = self.tasks.get(task_id)
+                if record is None:
+                    if task is None:
+                        continue
+                    del self.tasks[task_id]
+                    self.unindex(task)
+                    self.notify('removed', task)
+                elif task is None:
+                    task = Task.from_dict(record)
+                    self.tasks[task_id] = task
+                    self.index(task)
+                    self.next_id = max(self.next_id, task_id + 1)
+                    self.notify('added', task)
+                elif task.to_dict() != record:
+                    self.notify('modifying', task)
+                    self.unindex(task)
+                    saved = Task.from_dict(record)
+                    for field in Task.__slots__:
+                        setattr(task, field, getattr(saved, field))
+                    self.tasks[task_id] = task
+                    self.index(task)
+                    self.notify('modified', task)
+                else:
+                    continue
+                changed += 1
+            return changed
+
+    def advance_next_id(self, next_id):
+        """Move the id counter forward to at least ``next_id``."""
+        with self.lock:
+            self.next_id = max(self.next_id, next_id)
+
+    def snapshot(self):
+        """Return the store in its on-disk JSON form.
+
+        Pending tasks come first in deadline order, then undated pending
+        tasks, then completed ones, which is the order ``stream`` wants.
+        """
+        with self.lock:
+            pending = self.by_status[False]
+            order = [task_id for _, task_id in self.by_deadline if task_id in pending]
+            order += [task_id for task_id in pending if self.tasks[task_id].deadline is None]
+            order += sorted(self.by_status[True])
+            return {'next_id': self.next_id,
+                    'tasks': [self.tasks[task_id].to_dict() for task_id in order]}
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.tasks.values()))
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def pending(self):
+        with self.lock:
+            return [self.tasks[i] for i in self.by_status[False]]
+
+    def completed(self):
+        with self.lock:
+            return [self.tasks[i] for i in self.by_status[True]]
+
+    def with_priority(self, priority):
+        with self.lock:
+            return [self.tasks[i] for i in self.by_priority[priority]]
+
+    def deadline_range(self, start=None, end=None, inclusive=False):
+        """Return tasks whose deadline falls in ``[start, end)`` in deadline order.
+
+        With ``inclusive`` the end bound is included as well.
+        """
+        with self.lock:
+            return [self.tasks[task_id] for _, task_id in
+                    self.deadline_entries(start, end, inclusive)]
+
+    def deadline_entries(self, start=None, end=None, inclusive=False):
+        """Return the ``(deadline, id)`` index entries that ``deadline_range`` covers."""
+        lo = 0
+        if start is not None:
+            lo = bisect.bisect_left(self.by_deadline, (start,))
+        hi = len(self.by_deadline)
+        if end is not None:
+            key = (end, float('inf') if inclusive else 0)
+            hi = bisect.bisect_left(self.by_deadline, key)
+        return self.by_deadline[lo:hi]
+
+    def filter(self, filter_type, now):
+        """Return the tasks shown under one of the ``FILTERS``.
+
+        The storage backend answers the query when it can; otherwise the
+        in-memory indexes do.
+        """
+        with self.lock:
+            return [self.tasks[task_id] for task_id in self.filter_ids(filter_type, now)]
+
+    def filter_ids(self, filter_type, now):
+        """Return the ids of the tasks ``filter`` would return.
+
+        Only the indexes are read, so a memory-mapped store builds no tasks.
+        """
+        with self.lock:
+            ids = self.storage.query_ids(filter_type, now) if self.storage else None
+            if ids is not None:
+                return [task_id for task_id in ids if task_id in self.tasks]
+
+            if filter_type == "Pending":
+                return list(self.by_status[False])
+            elif filter_type == "Completed":
+                return list(self.by_status[True])
+            elif filter_type == "Overdue":
+                entries = self.deadline_entries(end=now)
+            elif filter_type == "Due Today":
+                today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+                entries = self.deadline_entries(today, today + timedelta(days=1))
+            elif filter_type == "Due This Week":
+                entries = self.deadline_entries(end=now + timedelta(days=7), inclusive=True)
+            else:
+                return list(self.tasks)
+            pending = self.by_status[False]
+            return [task_id for _, task_id in entries if task_id in pending]
+
+    def add(self, task):
+        """Assign the next id to ``task`` and store it."""
+        with self.lock:
+            task.id = self.allocate_ids(1)
+            self.tasks[task.id] = task
+            self.index(task)
+            self.persist(task)
+            self.notify('added', task)
+            return task
+
+    def update(self, task_id, **changes):
+        """Apply ``changes`` to a task, keeping the indexes current."""
+        with self.lock:
+            task = self.tasks[task_id]
+            self.notify('modifying', task)
+            self.unindex(task)
+            for field, value in changes.items():
+                setattr(task, field, value)
+            self.tasks[task_id] = task  # pins tasks read from a MappedTasks
+            self.index(task)
+            self.persist(task)
+            self.notify('modified', task)
+            return task
+
+    def remove(self, task_id):
+        """Remove a task by id and return it."""
+        with self.lock:
+            task = self.tasks.pop(task_id)
+            self.unindex(task)
+            self.persist(task, deleted=True)
+            self.notify('removed', task)
+            return task
+
+    def add_many(self, tasks):
+        """Assign ids to and store several tasks with one storage write."""
+        with self.lock:
+            first = self.allocate_ids(len(tasks))
+            for task_id, task in enumerate(tasks, first):
+                task.id = task_id
+                self.tasks[task.id] = task
+                self.index(task, sort_deadlines=False)
+            self.by_deadline.sort()
+            self.persist_batch(tasks)
+            for task in tasks:
+                self.notify('added', task)
+            return tasks
+
+    def update_many(self, changes):
+        """Apply ``{task_id: {field: value}}`` changes with one storage write."""
+        with self.lock:
+            tasks = [self.tasks[task_id] for task_id in changes]
+            for task in tasks:
+                self.notify('modifying', task)
+            self.unindex_many(tasks)
+            for task in tasks:
+                for field, value in changes[task.id].items():
+                    setattr(task, field, value)
+                self.tasks[task.id] = task
+                self.index(task, sort_deadlines=False)
+            self.by_deadline.sort()
+            self.persist_batch(tasks)
+            for task in tasks:
+                self.notify('modified', task)
+            return tasks
+
+    def remove_many(self, task_ids):
+        """Remove several tasks with one storage write and return them."""
+        with self.lock:
+            tasks = [self.tasks.pop(task_id) for task_id in task_ids]
+            self.unindex_many(tasks)
+            self.persist_batch((), [task.id for task in tasks])
+            for task in tasks:
+                self.notify('removed', task)
+            return tasks
+
+    def archive(self, task_ids, archive):
+        """Move tasks into a ``TaskArchive`` and out of the store.
+
+        The archive is written first, so a crash in between can leave a
+        task in both places but never in neither.
+        """
+        if not task_ids:
+            return []
+        with self.lock:
+            archive.append([self.tasks[task_id].to_dict() for task_id in task_ids])
+            return self.remove_many(task_ids)
+
+    def archive_completed_before(self, cutoff, archive):
+        """Archive the tasks completed before ``cutoff`` and return them."""
+        with self.lock:
+            task_ids = sorted(task_id for task_id in self.by_status[True]
+                              if self.tasks[task_id].completed_date and
+                              self.tasks[task_id].completed_date < cutoff)
+            return self.archive(task_ids, archive)
+
+    def index(self, task, sort_deadlines=True):
+        self.by_status[task.completed].add(task.id)
+        self.by_priority[task.priority].add(task.id)
+        if task.deadline:
+            entry = (task.deadline, task.id)
+            if sort_deadlines:
+                bisect.insort(self.by_deadline, entry)
+            else:
+                self.by_deadline.append(entry)
+
+    def unindex(self, task):
+        self.by_status[task.completed].discard(task.id)
+        self.by_priority[task.priority].discard(task.id)
+        if task.deadline:
+            entry = (task.deadline, task.id)
+            i = bisect.bisect_left(self.by_deadline, entry)
+            if i < len(self.by_deadline) and self.by_deadline[i] == entry:
+                del self.by_deadline[i]
+
+    def unindex_many(self, tasks):
+        for task in tasks:
+            self.by_status[task.completed].discard(task.id)
+            self.by_priority[task.priority].discard(task.id)
+        dated = {task.id for task in tasks if task.deadline}
+        if dated:
+            self.by_deadline = [entry for entry in self.by_deadline if entry[1] not in dated]
+
+    def persist(self, task, deleted=False):
+        """Persist a single mutation, compacting first when due."""
+        if self.storage is None:
+            return
+        try:
+            if self.storage.needs_compaction and not self.loading:
+                self.storage.compact(self.snapshot())
+            if deleted:
+                self.storage.delete(task.id)
+            else:
+                self.storage.put(task.to_dict())
+        except STORAGE_ERRORS as e:
+            self.report_save_error(e)
+
+    def persist_batch(self, tasks, deleted_ids=()):
+        """Persist a batch of mutations as one storage write."""
+        if self.storage is None:
+            return
+        try:
+            if self.storage.needs_compaction and not self.loading:
+                self.storage.compact(self.snapshot())
+            self.storage.write_batch([task.to_dict() for task in tasks], list(deleted_ids))
+        except STORAGE_ERRORS as e:
+            self.report_save_error(e)
+
+    def report_save_error(self, error):
+        if self.on_save_error:
+            self.on_save_error(error)
+        else:
+            print(f"Could not save tasks: {error}")
+
+
+TASK_MEMORY_ESTIMATE = 1024  # rough bytes per loaded task, indexes included
+
+
+class Workspace:
+    """Named task lists, each in its own task file, with only a few open.
+
+    The manifest at ``path`` maps list names to task files and keeps a
+    deadline summary per list: the pending tasks due before its ``until``
+    (overdue ones included), taken when the list was last closed, along
+    with the modification time and size of the list's files then. The
+    cross-list ``due`` view is answered from these summaries, so a list
+    that is not open is only loaded for it once its summary has run out
+    or its files were changed from elsewhere, e.g. by the CLI.
+
+    ``open`` returns a list's ``TaskStore``, loading it on first use. Open
+    lists are kept in least-recently-used order, and ``trim`` closes the
+    oldest ones (never the newest) until at most ``max_open`` remain and
+    their estimated size fits in ``budget`` bytes. Closing a list
+    refreshes its summary and closes its storage, which writes out
+    anything still queued.
+    """
+
+    # A list's task file plus the journals or WAL its storage appends to
+    TRACKED_SUFFIXES = ('', '.journal', '.journal.old', '-wal')
+
+    def __init__(self, path, default_file, make_storage=open_storage, budget=256 << 20,
+                 max_open=4, horizon=timedelta(days=14)):
+        self.path = path
+        self.default_file = default_file
+        self.make_storage = make_storage
+        self.budget = budget
+        self.max_open = max_open
+        self.horizon = horizon
+        self.open_lists = OrderedDict()  # name -> TaskStore, least recent first
+        self.manifest = {'active': 'Default', 'lists': {'Default': {'file': default_file}}}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    @property
+    def names(self):
+        return list(self.manifest['lists'])
+
+    @property
+    def active(self):
+        return self.manifest['active']
+
+    def create(self, name):
+        """Add an empty list stored next to the default task file."""
+        name = name.strip()
+        if not name:
+            raise ValueError("List name is empty")
+        if name in self.manifest['lists']:
+            raise ValueError(f"There is already a list called {name!r}")
+        stem, extension = os.path.splitext(self.default_file)
+        slug = re.sub(r'[^\w-]+', '-', name.lower()).strip('-') or 'list'
+        files = {entry['file'] for entry in self.manifest['lists'].values()}
+        path = f"{stem}.{slug}{extension}"
+        suffix = 1
+        while path in files or os.path.exists(path):
+            suffix += 1
+            path = f"{stem}.{slug}-{suffix}{extension}"
+        self.manifest['lists'][name] = {'file': path}
+        self.save()
+
+    def file(self, name):
+        return self.manifest['lists'][name]['file']
+
+    def open(self, name, load=True):
+        """Return the store of list ``name``, opening it if needed.
+
+        With ``load`` false a newly opened store is left empty for the
+        caller to fill, e.g. by streaming its storage.
+        """
+        store = self.open_lists.get(name)
+        if store is None:
+            store = TaskStore(self.make_storage(self.file(name)))
+            if load:
+                store.load()
+            self.open_lists[name] = store
+        self.open_lists.move_to_end(name)
+        if self.manifest['active'] != name:
+            self.manifest['active'] = name
+            self.save()
+        self.trim()
+        return store
+
+    def estimate(self):
+        """Rough memory held by the open lists, in bytes."""
+        return sum(len(store) for store in self.open_lists.values()) * TASK_MEMORY_ESTIMATE
+
+    def trim(self):
+        """Close least recently used lists until the open ones fit the limits."""
+        while len(self.open_lists) > 1 and (len(self.open_lists) > self.max_open or
+                                            self.estimate() > self.budget):
+            self.close(next(iter(self.open_lists)))
+
+    def close(self, name):
+        """Close an open list, saving its summary."""
+        store = self.open_lists.pop(name)
+        summary = None if store.loading else self.summarize(store)
+        store.storage.close()
+        if summary is not None:
+            summary['files'] = self.file_state(name)
+            self.manifest['lists'][name]['summary'] = summary
+        self.save()
+
+    def close_all(self):
+        for name in list(self.open_lists):
+            self.close(name)
+
+    def summarize(self, store, now=None):
+        """Return the deadline summary of a loaded store."""
+        until = (now or datetime.now()) + self.horizon
+        tasks = [task for task in store.deadline_range(end=until) if not task.completed]
+        return {'until': format_timestamp(until),
+                'tasks': [[task.id, format_timestamp(task.deadline), task.priority.value,
+                           task.description] for task in tasks]}
+
+    def file_state(self, name):
+        """Return ``[mtime_ns, size]`` (None if missing) of each of a list's files."""
+        path = self.file(name)
+        state = []
+        for suffix in self.TRACKED_SUFFIXES:
+            try:
+                st = os.stat(path + suffix)
+            except FileNotFoundError:
+                state.append(None)
+            else:
+                state.append([st.st_mtime_ns, st.st_size])
+        return state
+
+    def due(self, filter_type, now):
+        """Return ``(list name, task)`` pairs for a deadline filter across all lists.
+
+        ``filter_type`` is "Overdue", "Due Today" or "Due This Week". Open
+        lists answer from their store; the others from their summary while
+        it still covers the filter, and are loaded otherwise.
+        """
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = {"Overdue": now, "Due Today": today + timedelta(days=1),
+               "Due This Week": now + timedelta(days=7)}[filter_type]
+        results = []
+        for name, entry in list(self.manifest['lists'].items()):
+            store = self.open_lists.get(name)
+            summary = entry.get('summary')
+            if store is None and (summary is None or parse_timestamp(summary['until']) <= end or
+                                  summary.get('files') != self.file_state(name)):
+                # Load it without making it the active list
+                store = TaskStore(self.make_storage(self.file(name)))
+                store.load()
+                summary = self.summarize(store, now)
+                store.storage.close()
+                summary['files'] = self.file_state(name)
+                entry['summary'] = summary
+                self.save()
+                store = None
+            if store is not None:
+                results += [(name, task) for task in store.filter(filter_type, now)]
+                continue
+            for task_id, deadline, priority, description in entry['summary']['tasks']:
+                task = Task(task_id, description, priority=Priority(priority),
+                            deadline=parse_timestamp(deadline))
+                if matches_filter(task, filter_type, now):
+                    results.append((name, task))
+        results.sort(key=lambda pair: (pair[1].deadline, pair[0]))
+        return results
+
+    def save(self):
+        """Atomically rewrite the manifest."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class Probes:
+    """Rolling latency samples for named hot paths.
+
+    ``instrument`` wraps chosen methods of an object so each call records
+    its duration. When the probes are disabled nothing is wrapped, so they
+    cost nothing at all; enable them before instrumenting. The last
+    ``window`` samples of each probe feed ``summary``, which can be
+    exported as JSON. A cProfile session can be recorded alongside.
+    """
+
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self, enabled=False, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}  # probe name -> deque of durations in seconds
+        self.calls = {}    # probe name -> calls since the last reset
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def instrument(self, obj, names, prefix=""):
+        """Replace ``obj.<name>`` for each name with a timed wrapper."""
+        if not self.enabled:
+            return
+        for name in names:
+            setattr(obj, name, self.wrap(prefix + name, getattr(obj, name)))
+
+    def wrap(self, name, fn):
+        record = self.record
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return timed
+
+    def record(self, name, seconds):
+        """Add one sample; safe to call from any thread."""
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.calls[name] = 0
+            self.samples[name].append(seconds)
+            self.calls[name] += 1
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}
+            self.calls = {}
+
+    def summary(self):
+        """Return per-probe statistics over the rolling window, in ms.
+
+        ``histogram`` counts samples per upper bound in ``BUCKETS_MS``,
+        with slower samples under ``'inf'``.
+        """
+        with self.lock:
+            snapshot = {name: (self.calls[name], sorted(samples))
+                        for name, samples in self.samples.items()}
+        summary = {}
+        for name, (calls, samples) in sorted(snapshot.items()):
+            ms = [sample * 1000 for sample in samples]
+            histogram = dict.fromkeys([str(bound) for bound in self.BUCKETS_MS] + ['inf'], 0)
+            for value in ms:
+                i = bisect.bisect_left(self.BUCKETS_MS, value)
+                histogram[str(self.BUCKETS_MS[i]) if i < len(self.BUCKETS_MS) else 'inf'] += 1
+            summary[name] = {
+                'calls': calls,
+                'window': len(ms),
+                'mean_ms': sum(ms) / len(ms),
+                'p50_ms': ms[len(ms) // 2],
+                'p90_ms': ms[min(len(ms) - 1, len(ms) * 9 // 10)],
+                'p99_ms': ms[min(len(ms) - 1, len(ms) * 99 // 100)],
+                'max_ms': ms[-1],
+                'histogram': histogram,
+            }
+        return summary
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_profile(self):
+        """Start recording a cProfile session of the calling thread."""
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_profile(self, path):
+        """Stop the cProfile session and dump it for ``pstats``/snakeviz."""
+        self.profiler.disable()
+        self.profiler.dump_stats(path)
+        self.profiler = None
+
+
+class ChangeTracker:
+    """Collect the ids of tasks added, modified or removed in a store.
+
+    ``drain`` hands back the net changes since the previous drain, so a
+    view can patch just those rows instead of rebuilding everything. A task
+    that is added and then removed before a drain disappears entirely.
+    """
+
+    def __init__(self, store):
+        self.added = set()
+        self.modified = set()
+        self.removed = set()
+        self.lock = threading.Lock()
+        store.subscribe(self.record)
+
+    def record(self, kind, task):
+        with self.lock:
+            self.record_locked(kind, task)
+
+    def record_locked(self, kind, task):
+        if kind == 'added':
+            self.removed.discard(task.id)
+            self.added.add(task.id)
+        elif kind == 'modified':
+            if task.id not in self.added:
+                self.modified.add(task.id)
+        elif kind == 'removed':
+            self.modified.discard(task.id)
+            if task.id in self.added:
+                self.added.discard(task.id)
+            else:
+                self.removed.add(task.id)
+
+    def drain(self):
+        """Return ``(added, modified, removed)`` id sets and reset them."""
+        with self.lock:
+            changes = (self.added, self.modified, self.removed)
+            self.added, self.modified, self.removed = set(), set(), set()
+        return changes
+
+
+class SortedOrders:
+    """Every task's ``(key, id)`` entry kept sorted under each of ``SORT_KEYS``.
+
+    An order is sorted once, the first time it is asked for, and from then
+    on kept current through the store listener with bisect, so switching
+    between orders or changing a task never re-sorts the list. Adding
+    tasks while the store is loading drops the built orders instead, as
+    re-sorting once is cheaper than thousands of insertions.
+    """
+
+    def __init__(self, store, sort_keys=SORT_KEYS):
+        self.store = store
+        self.sort_keys = sort_keys
+        self.entries = {}  # order -> sorted (key, id) pairs
+        self.before = {}   # task id -> {order: entry} announced by 'modifying'
+        store.subscribe(self.on_change)
+
+    def entry(self, order, task):
+        return (self.sort_keys[order](task), task.id)
+
+    def sorted(self, order):
+        """Return the sorted ``(key, id)`` entries of ``order``.
+
+        The list is live; read it on the thread that mutates the store.
+        """
+        with self.store.lock:
+            entries = self.entries.get(order)
+            if entries is None:
+                tasks = self.store.tasks
+                # Mapped records carry every sort field, so no task is built
+                source = tasks.fields() if isinstance(tasks, MappedTasks) else tasks.values()
+                entries = self.entries[order] = sorted(self.entry(order, task)
+                                                       for task in source)
+            return entries
+
+    def on_change(self, kind, task):
+        if kind == 'modifying':
+            self.before[task.id] = {order: self.entry(order, task) for order in self.entries}
+            return
+        if kind == 'added' and self.store.loading:
+            self.entries.clear()
+            return
+        before = self.before.pop(task.id, {})
+        for order, entries in self.entries.items():
+            entry = self.entry(order, task)
+            old = before.get(order, entry) if kind != 'added' else None
+            if old == entry and kind == 'modified':
+                continue
+            if old is not None:
+                i = bisect.bisect_left(entries, old)
+                if i < len(entries) and entries[i] == old:
+                    del entries[i]
+            if kind != 'removed':
+                bisect.insort(entries, entry)
+
+
+class SearchIndex:
+    """Token and trigram inverted index over task descriptions.
+
+    Substring terms of three or more characters are answered by
+    intersecting trigram posting sets and verifying the few candidates;
+    shorter terms filter whatever the longer terms left. A sorted token list
+    answers prefix lookups for ranking. The index follows the store through
+    its listener, and a query that extends the previous one narrows the
+    previous result instead of starting over.
+
+    Nothing is indexed until the first query, so startup never pays for
+    the index if the search box goes unused. With ``background`` set the
+    first query never builds it either: ``build_in_background`` indexes
+    on a worker thread, and until it is done queries scan the store.
+    """
+
+    def __init__(self, store, background=False):
+        self.store = store
+        self.texts = {}     # task id -> lowercased description
+        self.trigrams = {}  # trigram -> set of task ids
+        self.tokens = {}    # token -> set of task ids
+        self.sorted_tokens = []
+        self.last_query = None
+        self.last_result = None
+        self.built = False
+        self.background = background
+        self.dirty = None  # ids changed while a background build runs
+        store.subscribe(self.on_change)
+
+    def build(self):
+        """Index every task in the store (call with ``store.lock`` held)."""
+        self.install(self.index_items([(task.id, task.description) for task in self.store]))
+
+    def build_in_background(self):
+        """Index the store on a worker thread, holding the lock only to copy
+        the descriptions and to install the result."""
+        with self.store.lock:
+            if self.built or self.dirty is not None:
+                return
+            self.dirty = set()
+
+        def worker():
+            with self.store.lock:
+                items = [(task.id, task.description) for task in self.store]
+            index = self.index_items(items)
+            with self.store.lock:
+                self.install(index)
+                for task_id in self.dirty:
+                    self.discard(task_id)
+                    task = self.store.get(task_id)
+                    if task is not None:
+                        self.add(task.id, task.description)
+                self.dirty = None
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    @staticmethod
+    def index_items(items):
+        """Build the texts, trigram and token postings for ``(id, description)`` pairs."""
+        texts, trigrams, tokens = {}, {}, {}
+        for task_id, description in items:
+            text = description.lower()
+            texts[task_id] = text
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                trigrams.setdefault(gram, set()).add(task_id)
+            for token in set(re.findall(r'\w+', text)):
+                tokens.setdefault(token, set()).add(task_id)
+        return texts, trigrams, tokens
+
+    def install(self, index):
+        self.texts, self.trigrams, self.tokens = index
+        self.sorted_tokens = sorted(self.tokens)
+        self.last_query = self.last_result = None
+        self.built = True
+
+    @staticmethod
+    def terms(query):
+        return query.lower().split()
+
+    def on_change(self, kind, task):
+        if kind == 'modifying':
+            return
+        if not self.built:
+            if self.dirty is not None:
+                self.dirty.add(task.id)
+            return
+        old = self.texts.get(task.id)
+        if kind == 'removed':
+            self.discard(task.id)
+        elif old != task.description.lower():
+            self.discard(task.id)
+            self.add(task.id, task.description)
+        else:
+            return
+        self.last_query = self.last_result = None
+
+    def add(self, task_id, description):
+        text = description.lower()
+        self.texts[task_id] = text
+        for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+            self.trigrams.setdefault(gram, set()).add(task_id)
+        for token in set(re.findall(r'\w+', text)):
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                bisect.insort(self.sorted_tokens, token)
+            self.tokens[token].add(task_id)
+
+    def discard(self, task_id):
+        text = self.texts.pop(task_id, None)
+        if text is None:
+            return
+        for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+            postings = self.trigrams[gram]
+            postings.discard(task_id)
+            if not postings:
+                del self.trigrams[gram]
+        for token in set(re.findall(r'\w+', text)):
+            postings = self.tokens[token]
+            postings.discard(task_id)
+            if not postings:
+                del self.tokens[token]
+                del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+
+    @staticmethod
+    def matches_text(text, terms):
+        return all(term in text for term in terms)
+
+    def match(self, query):
+        """Return the set of ids whose description contains every term."""
+        with self.store.lock:
+            return self.match_locked(query)
+
+    def match_locked(self, query):
+        terms = self.terms(query)
+        if not self.built:
+            if self.background:
+                return {task.id for task in self.store
+                        if self.matches_text(task.description.lower(), terms)}
+            self.build()
+        query = " ".join(terms)
+        if not terms:
+            return set(self.texts)
+
+        if (self.last_query is not None and query.startswith(self.last_query)):
+            # Extending the previous query can only narrow its result
+            candidates = self.last_result
+        else:
+            candidates = None
+            for term in terms:
+                if len(term) < 3:
+                    continue
+                for gram in {term[i:i + 3] for i in range(len(term) - 2)}:
+                    postings = self.trigrams.get(gram, set())
+                    candidates = set(postings) if candidates is None else candidates & postings
+                    if not candidates:
+                        break
+            if candidates is None:
+                candidates = self.texts.keys()
+
+        result = {task_id for task_id in candidates
+                  if self.matches_text(self.texts[task_id], terms)}
+        self.last_query, self.last_result = query, result
+        return result
+
+    def matches(self, task, query):
+        """Return whether a single task matches ``query``."""
+        return self.matches_text(task.description.lower(), self.terms(query))
+
+    def prefixed(self, prefix):
+        """Return the ids of tasks with a word starting with ``prefix``."""
+        ids = set()
+        i = bisect.bisect_left(self.sorted_tokens, prefix)
+        while i < len(self.sorted_tokens) and self.sorted_tokens[i].startswith(prefix):
+            ids |= self.tokens[self.sorted_tokens[i]]
+            i += 1
+        return ids
+
+    def search(self, query, limit=None):
+        """Return matching ids ranked best first.
+
+        Each term scores 3 for a whole-word hit, 2 for a word-prefix hit
+        and 1 for a plain substring hit; ties keep id order.
+        """
+        with self.store.lock:
+            result = self.match_locked(query)
+            terms = [(self.tokens.get(term, set()), self.prefixed(term))
+                     for term in self.terms(query)]
+        scores = dict.fromkeys(result, 0)
+        for exact, prefixed in terms:
+            for task_id in result:
+                if task_id in exact:
+                    scores[task_id] += 3
+                elif task_id in prefixed:
+                    scores[task_id] += 2
+                else:
+                    scores[task_id] += 1
+        ranked = sorted(result, key=lambda task_id: (-scores[task_id], task_id))
+        return ranked[:limit] if limit is not None else ranked
+
+    @classmethod
+    def scan(cls, tasks, query, limit=None):
+        """Rank ``tasks`` like ``search`` but with one linear pass and no index.
+
+        For a one-off query, such as from the command line, this is cheaper
+        than building the index first.
+        """
+        terms = cls.terms(query)
+        scores = {}
+        for task in tasks:
+            text = task.description.lower()
+            if not cls.matches_text(text, terms):
+                continue
+            words = set(re.findall(r'\w+', text))
+            scores[task.id] = sum(3 if term in words else
+                                  2 if any(word.startswith(term) for word in words) else 1
+                                  for term in terms)
+        ranked = sorted(scores, key=lambda task_id: (-scores[task_id], task_id))
+        return ranked[:limit] if limit is not None else ranked
+
+
+class ReminderScheduler:
+    """Fire reminders from a heap keyed on each task's reminder time.
+
+    A task's reminder is due ``lead`` before its deadline. The heap is
+    seeded from the store and re-armed through the store listener whenever
+    a deadline is added or changed. The worker thread sleeps until the
+    earliest entry is due; the wait is capped at ``max_wait`` seconds so
+    wall-clock jumps (suspend, DST) are noticed.
+
+    The worker never reads the store. It hands due ``(task_id, deadline)``
+    pairs to ``on_due``, and the receiver uses ``is_current`` to drop
+    entries for tasks that were completed, removed, rescheduled or already
+    reminded in the meantime.
+
+    ``call_at`` schedules plain timer callbacks on the same thread, for
+    anything else that needs to act when a deadline passes.
+    """
+
+    def __init__(self, store, on_due, lead=timedelta(hours=2), max_wait=60):
+        self.store = store
+        self.on_due = on_due
+        self.lead = lead
+        self.max_wait = max_wait
+        self.heap = []
+        self.timers = []  # (when, sequence, callback)
+        self.timer_sequence = 0
+        self.before = {}  # task id -> reminder state announced by 'modifying'
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        for task in store.pending():
+            if self.wants_reminder(task):
+                self.heap.append((task.deadline - lead, task.id, task.deadline))
+        heapq.heapify(self.heap)
+        store.subscribe(self.on_change)
+
+    @staticmethod
+    def wants_reminder(task):
+        return bool(task.deadline) and not task.completed and not task.reminded
+
+    def on_change(self, kind, task):
+        if kind == 'modifying':
+            self.before[task.id] = (task.deadline, self.wants_reminder(task))
+            return
+        before = self.before.pop(task.id, None)
+        if kind != 'removed' and self.wants_reminder(task):
+            # Only re-arm when the reminder actually changed
+            if kind == 'added' or before != (task.deadline, True):
+                self.arm(task)
+
+    def arm(self, task):
+        """Schedule a reminder for ``task`` and wake the worker if it is sooner."""
+        with self.condition:
+            entry = (task.deadline - self.lead, task.id, task.deadline)
+            heapq.heappush(self.heap, entry)
+            if self.heap[0] is entry:
+                self.condition.notify()
+
+    def is_current(self, task_id, deadline):
+        """Return the task if a reminder for ``deadline`` is still wanted."""
+        task = self.store.get(task_id)
+        if task is not None and self.wants_reminder(task) and task.deadline == deadline:
+            return task
+        return None
+
+    def claim(self, due):
+        """Mark the still-current tasks among ``due`` reminded and return them.
+
+        ``due`` is what ``on_due`` received. Call this from the thread that
+        owns store mutations.
+        """
+        reminders = []
+        for task_id, deadline in due:
+            task = self.is_current(task_id, deadline)
+            if task and task not in reminders:
+                reminders.append(task)
+                self.store.update(task.id, reminded=True)
+        return reminders
+
+    def pop_due(self, now):
+        """Pop and return the ``(task_id, deadline)`` pairs due by ``now``."""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, task_id, deadline = heapq.heappop(self.heap)
+            due.append((task_id, deadline))
+        return due
+
+    def call_at(self, when, callback):
+        """Run ``callback()`` on the scheduler thread once ``when`` has passed."""
+        with self.condition:
+            self.timer_sequence += 1
+            entry = (when, self.timer_sequence, callback)
+            heapq.heappush(self.timers, entry)
+            if self.timers[0] is entry:
+                self.condition.notify()
+
+    def pop_timers(self, now):
+        callbacks = []
+        while self.timers and self.timers[0][0] <= now:
+            callbacks.append(heapq.heappop(self.timers)[2])
+        return callbacks
+
+    def next_wait(self, now):
+        upcoming = [heap[0][0] for heap in (self.heap, self.timers) if heap]
+        if not upcoming:
+            return self.max_wait
+        wait = (min(upcoming) - now).total_seconds()
+        return max(0, min(wait, self.max_wait))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                now = datetime.now()
+                due = self.pop_due(now)
+                callbacks = self.pop_timers(now)
+                if not due and not callbacks:
+                    self.condition.wait(self.next_wait(now))
+                    continue
+            try:
+                for callback in callbacks:
+                    callback()
+                if due:
+                    self.on_due(due)
+            except Exception as e:
+                print(f"Reminder system error: {e}")
+
+
+class TaskCounters:
+    """Running task aggregates for the status bar and other summaries.
+
+    Totals, per-status and per-priority (pending) counts change by one on
+    each store notification. The time-based ``overdue`` and ``due_today``
+    counts are exact as of ``as_of``. ``roll`` moves them forward by looking
+    only at deadlines passed since then, plus the new day's deadlines at
+    midnight. With a scheduler attached, ``roll`` runs on its own at the
+    next pending deadline or midnight, whichever is first, and then calls
+    ``on_rollover``.
+    """
+
+    def __init__(self, store, scheduler=None, on_rollover=None):
+        self.store = store
+        self.scheduler = scheduler
+        self.on_rollover = on_rollover
+        self.lock = threading.Lock()
+        self.total = self.pending = self.completed = 0
+        self.by_priority = {priority: 0 for priority in Priority}
+        self.overdue = self.due_today = 0
+        self.next_boundary = None
+        with store.lock:
+            self.set_clock(datetime.now())
+            for task in store.pending():
+                self.count(task, 1)
+            # Completed tasks only add to two totals, so they need not be read
+            self.total += len(store.by_status[True])
+            self.completed += len(store.by_status[True])
+            store.subscribe(self.on_change)
+            self.arm()
+
+    def set_clock(self, now):
+        self.as_of = now
+        self.today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.tomorrow = self.today + timedelta(days=1)
+
+    def on_change(self, kind, task):
+        with self.lock:
+            self.count(task, 1 if kind in ('added', 'modified') else -1)
+        if kind != 'modifying' and self.due_sooner(task):
+            self.arm()
+
+    def count(self, task, sign):
+        self.total += sign
+        if task.completed:
+            self.completed += sign
+            return
+        self.pending += sign
+        self.by_priority[task.priority] += sign
+        if task.deadline:
+            if task.deadline < self.as_of:
+                self.overdue += sign
+            if self.today <= task.deadline < self.tomorrow:
+                self.due_today += sign
+
+    def due_sooner(self, task):
+        return (self.scheduler is not None and not task.completed and
+                task.deadline is not None and task.deadline >= self.as_of and
+                (self.next_boundary is None or task.deadline < self.next_boundary))
+
+    def roll(self, now=None):
+        """Bring ``overdue`` and ``due_today`` up to ``now``."""
+        now = now or datetime.now()
+        with self.store.lock, self.lock:
+            if now <= self.as_of:
+                return
+            for task in self.store.deadline_range(self.as_of, now):
+                if not task.completed:
+                    self.overdue += 1
+            if now >= self.tomorrow:
+                self.set_clock(now)
+                self.due_today = sum(
+                    1 for task in self.store.deadline_range(self.today, self.tomorrow)
+                    if not task.completed)
+            else:
+                self.as_of = now
+
+    def arm(self):
+        """Schedule a roll at the next pending deadline or midnight."""
+        if self.scheduler is None:
+            return
+        boundary = self.tomorrow
+        with self.store.lock:
+            for task in self.store.deadline_range(self.as_of, boundary):
+                if not task.completed:
+                    boundary = task.deadline + timedelta(microseconds=1)
+                    break
+        self.next_boundary = boundary
+        self.scheduler.call_at(boundary, self.on_boundary)
+
+    def on_boundary(self):
+        if self.next_boundary is None or datetime.now() < self.next_boundary:
+            return  # superseded by an earlier boundary
+        self.roll()
+        self.arm()
+        if self.on_rollover:
+            self.on_rollover()